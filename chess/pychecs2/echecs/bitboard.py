@@ -0,0 +1,575 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the BitboardChessboard class, an alternative to the Chessboard class which stores the
+position in 64-bit integers ("bitboards", one bit per box) in addition to the list of the boxes. The moves, the
+attacks, the checks and the pins are computed on the bitboards, a whole set of boxes at a time, and the positions
+('e4') are only built for the moves returned.
+
+The boxes are numbered as in the tables module, and the box number n is represented by the bit 1 << n.
+
+"""
+from pychecs2.echecs.chess_board import Chessboard
+from pychecs2.echecs.piece import Pawn, Knight, Bishop, Rook, Queen, King
+from pychecs2.echecs.tables import SQUARE_NAMES, SQUARE_INDEX, KNIGHT_TARGETS, KING_TARGETS, PAWN_PUSHES, \
+    PAWN_CAPTURES, ROOK_TARGETS, BISHOP_TARGETS, BETWEEN, RAYS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, QUEEN_DIRECTIONS
+
+# Indexes of the colors and of the types of pieces in the bitboard lists.
+WHITE, BLACK = 0, 1
+COLORS = ('white', 'black')
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+PIECE_TYPES = (Pawn, Knight, Bishop, Rook, Queen, King)
+KIND_OF_TYPE = {piece_type: kind for kind, piece_type in enumerate(PIECE_TYPES)}
+
+# The (color, kind) of each piece, one of the shared instances of the piece module.
+PIECE_KINDS = {piece_type(color): (color_index, kind)
+               for color_index, color in enumerate(COLORS) for kind, piece_type in enumerate(PIECE_TYPES)}
+
+# MOVES[source][target]: the move between two boxes, as a (source position, target position) tuple, built once.
+MOVES = [[(SQUARE_NAMES[source], SQUARE_NAMES[target]) for target in range(64)] for source in range(64)]
+
+
+def _mask(boxes):
+    """
+    Returns the bitboard whose bits are the boxes received as argument.
+
+    """
+    mask = 0
+    for index in boxes:
+        mask |= 1 << index
+    return mask
+
+
+# The tables of the tables module, converted into bitboards.
+KNIGHT_MASKS = [_mask(targets) for targets in KNIGHT_TARGETS]
+KING_MASKS = [_mask(targets) for targets in KING_TARGETS]
+PAWN_CAPTURE_MASKS = tuple([_mask(targets) for targets in PAWN_CAPTURES[color]] for color in COLORS)
+ROOK_LINE_MASKS = [_mask(targets) for targets in ROOK_TARGETS]
+BISHOP_LINE_MASKS = [_mask(targets) for targets in BISHOP_TARGETS]
+BETWEEN_MASKS = [[_mask(boxes) for boxes in row] for row in BETWEEN]
+RAY_MASKS = [[_mask(ray) for ray in rays] for rays in RAYS]
+
+# For each direction, whether the numbers of the boxes increase along its rays (north, east, north-east and
+# north-west). On these rays, the first piece met is the lowest bit of the blockers, otherwise the highest.
+INCREASING_DIRECTIONS = (True, False, True, False, True, True, False, False)
+SLIDER_DIRECTIONS = {BISHOP: BISHOP_DIRECTIONS, ROOK: ROOK_DIRECTIONS, QUEEN: QUEEN_DIRECTIONS}
+
+# PAWN_PUSH_BITS[color][box]: the bits of the boxes where a pawn moves forward, one box then two boxes (0 if it
+# cannot).
+PAWN_PUSH_BITS = tuple([tuple(1 << target for target in pushes) + (0, 0)[len(pushes):] for pushes in PAWN_PUSHES[color]]
+                       for color in COLORS)
+
+
+def slider_attacks(index, directions, occupied):
+    """
+    Returns the boxes attacked from a box by a piece moving along rays (rook, bishop or queen): each ray stops
+    at the first occupied box, which is included.
+
+    Args:
+        index (int): The number of the box of the piece.
+        directions (tuple): The directions in which the piece moves.
+        occupied (int): The bitboard of all the occupied boxes.
+
+    Returns:
+        int: The bitboard of the attacked boxes.
+
+    """
+    attacks = 0
+    for direction in directions:
+        ray = RAY_MASKS[direction][index]
+        blockers = ray & occupied
+        if blockers:
+            if INCREASING_DIRECTIONS[direction]:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= RAY_MASKS[direction][first]
+        attacks |= ray
+    return attacks
+
+
+def _relevant_mask(index, directions):
+    """
+    Returns the boxes whose occupation changes the attacks of a rook or a bishop on a box: its rays, without their
+    last box, which is attacked whether it is occupied or not.
+
+    """
+    mask = 0
+    for direction in directions:
+        mask |= _mask(RAYS[direction][index][:-1])
+    return mask
+
+
+# The attacks of the rooks and of the bishops, computed once for each occupation of the boxes of their rays (a
+# dictionary per box, filled as the occupations are met), and the boxes of these occupations.
+LINE_DIRECTIONS = {ROOK: ROOK_DIRECTIONS, BISHOP: BISHOP_DIRECTIONS}
+RELEVANT_MASKS = {kind: [_relevant_mask(index, directions) for index in range(64)]
+                  for kind, directions in LINE_DIRECTIONS.items()}
+LINE_ATTACKS = {kind: [{} for _ in range(64)] for kind in LINE_DIRECTIONS}
+
+
+def line_attacks(index, kind, occupied):
+    """
+    Returns the boxes attacked from a box by a rook or a bishop, as slider_attacks(), from the attacks already
+    computed for the same occupation of its rays.
+
+    Args:
+        index (int): The number of the box of the piece.
+        kind (int): ROOK or BISHOP.
+        occupied (int): The bitboard of all the occupied boxes.
+
+    Returns:
+        int: The bitboard of the attacked boxes.
+
+    """
+    key = occupied & RELEVANT_MASKS[kind][index]
+    attacks = LINE_ATTACKS[kind][index]
+    try:
+        return attacks[key]
+    except KeyError:
+        attacks[key] = slider_attacks(index, LINE_DIRECTIONS[kind], key)
+        return attacks[key]
+
+
+def piece_attacks(index, kind, occupied):
+    """
+    Returns the boxes attacked from a box by a rook, a bishop or a queen.
+
+    """
+    if kind == QUEEN:
+        return line_attacks(index, ROOK, occupied) | line_attacks(index, BISHOP, occupied)
+    return line_attacks(index, kind, occupied)
+
+
+def _first_blocker(blockers, direction):
+    """
+    Returns the number of the first box of a bitboard met when moving from the origin of a ray in a direction.
+
+    """
+    if INCREASING_DIRECTIONS[direction]:
+        return (blockers & -blockers).bit_length() - 1
+    return blockers.bit_length() - 1
+
+
+def pawn_targets(index, color, occupied, enemy):
+    """
+    Returns the boxes where a pawn can move: forward on free boxes (two boxes from its starting row), and
+    diagonally on an enemy piece.
+
+    Args:
+        index (int): The number of the box of the pawn.
+        color (int): The color of the pawn (WHITE or BLACK).
+        occupied (int): The bitboard of all the occupied boxes.
+        enemy (int): The bitboard of the boxes occupied by the other color.
+
+    Returns:
+        int: The bitboard of the target boxes.
+
+    """
+    targets = PAWN_CAPTURE_MASKS[color][index] & enemy
+    single, double = PAWN_PUSH_BITS[color][index]
+    if single and not occupied & single:
+        targets |= single
+        if double and not occupied & double:
+            targets |= double
+    return targets
+
+
+def box_numbers(mask):
+    """
+    Returns the numbers of the boxes of a bitboard, in increasing order.
+
+    """
+    numbers = []
+    while mask:
+        bit = mask & -mask
+        numbers.append(bit.bit_length() - 1)
+        mask ^= bit
+    return numbers
+
+
+def square_names(mask):
+    """
+    Returns the positions ('a1', 'e4', ...) of the boxes of a bitboard, in increasing order.
+
+    """
+    names = []
+    while mask:
+        bit = mask & -mask
+        names.append(SQUARE_NAMES[bit.bit_length() - 1])
+        mask ^= bit
+    return names
+
+
+class BitboardChessboard(Chessboard):
+    """
+    Chessboard class, implemented with bitboards. It offers the same methods as the Chessboard class: the list of
+    the boxes (squares), the Zobrist key and the scores are kept by the Chessboard class, and the bitboards replace
+    its index of the boxes of the pieces (piece_boxes).
+
+    Attributes:
+        bitboards (list): For each color (WHITE, BLACK), a list of 6 integers, one per type of piece (PAWN,
+            KNIGHT, BISHOP, ROOK, QUEEN, KING), whose bits are the boxes occupied by these pieces.
+        occupied (list): For each color, an integer whose bits are the boxes occupied by a piece of this color.
+        safety_cache (dict): The result of king_safety() for each color, until the chessboard is modified.
+
+    """
+    __slots__ = ('bitboards', 'occupied', 'safety_cache')
+
+    def clear_index(self):
+        self.bitboards = [[0] * 6, [0] * 6]
+        self.occupied = [0, 0]
+        self.safety_cache = {}
+
+    def add_to_index(self, index, piece):
+        color, kind = PIECE_KINDS[piece]
+        bit = 1 << index
+        self.bitboards[color][kind] |= bit
+        self.occupied[color] |= bit
+        self.safety_cache.clear()
+
+    def remove_from_index(self, index, piece):
+        color, kind = PIECE_KINDS[piece]
+        mask = ~(1 << index)
+        self.bitboards[color][kind] &= mask
+        self.occupied[color] &= mask
+        self.safety_cache.clear()
+
+    def copy_index(self, board):
+        board.bitboards = [list(self.bitboards[WHITE]), list(self.bitboards[BLACK])]
+        board.occupied = list(self.occupied)
+        board.safety_cache = dict(self.safety_cache)
+
+    def set_squares(self, squares):
+        self.clear_board()
+        for index, piece in enumerate(squares):
+            if piece is not None:
+                self.put_piece(index, piece)
+        self.undo_stack = []
+
+    def boxes_of(self, piece):
+        color, kind = PIECE_KINDS[piece]
+        return box_numbers(self.bitboards[color][kind])
+
+    def pieces(self, color):
+        pieces = self.bitboards[COLORS.index(color)]
+        return [(index, piece_type(color)) for kind, piece_type in enumerate(PIECE_TYPES)
+                for index in box_numbers(pieces[kind])]
+
+    def free_path_between_positions(self, source, target):
+        source_index, target_index = SQUARE_INDEX[source], SQUARE_INDEX[target]
+        if source_index == target_index:
+            return True
+
+        # Two boxes which are neither on a line nor on a diagonal do not have a path between them.
+        if not (ROOK_LINE_MASKS[source_index] | BISHOP_LINE_MASKS[source_index]) >> target_index & 1:
+            return False
+
+        return not BETWEEN_MASKS[source_index][target_index] & (self.occupied[WHITE] | self.occupied[BLACK])
+
+    def is_move_valid(self, source, target):
+        source_index = SQUARE_INDEX.get(source)
+        target_index = SQUARE_INDEX.get(target)
+        if source_index is None or target_index is None:
+            return False
+
+        piece = self.squares[source_index]
+        if piece is None:
+            return False
+
+        color = PIECE_KINDS[piece][0]
+        if not self.targets_mask(source_index) >> target_index & 1:
+            return False
+
+        # Finally, the move must not leave the king in check.
+        return self.is_legal(source_index, target_index, self.king_safety(COLORS[color]))
+
+    def king_position(self, color):
+        kings = self.bitboards[COLORS.index(color)][KING] if color in COLORS else 0
+        if not kings:
+            return None
+
+        return SQUARE_NAMES[kings.bit_length() - 1]
+
+    def attackers_mask(self, index, color, occupied):
+        """
+        Returns the bitboard of the pieces of a color which attack a box.
+
+        Args:
+            index (int): The number of the attacked box.
+            color (int): The color of the attacking pieces (WHITE or BLACK).
+            occupied (int): The bitboard of the occupied boxes, which stop the rays of the rooks, bishops and
+                queens.
+
+        Returns:
+            int: The bitboard of the attacking pieces.
+
+        """
+        pieces = self.bitboards[color]
+        attackers = ((KNIGHT_MASKS[index] & pieces[KNIGHT]) | (KING_MASKS[index] & pieces[KING])
+                     | (PAWN_CAPTURE_MASKS[1 - color][index] & pieces[PAWN]))
+        # The rays are only walked if a slider of the color is on the lines or diagonals of the box.
+        rooks = (pieces[ROOK] | pieces[QUEEN]) & ROOK_LINE_MASKS[index]
+        if rooks:
+            attackers |= line_attacks(index, ROOK, occupied) & rooks
+        bishops = (pieces[BISHOP] | pieces[QUEEN]) & BISHOP_LINE_MASKS[index]
+        if bishops:
+            attackers |= line_attacks(index, BISHOP, occupied) & bishops
+        return attackers
+
+    def attackers(self, index, color, ignored=None):
+        occupied = self.occupied[WHITE] | self.occupied[BLACK]
+        if ignored is not None:
+            occupied &= ~(1 << ignored)
+
+        return box_numbers(self.attackers_mask(index, COLORS.index(color), occupied))
+
+    def king_safety(self, color):
+        """
+        Computes the checkers, the pins and the safe boxes around the king of a color. The result is kept until the
+        next modification of the chessboard, so that it is computed only once per move.
+
+        Args:
+            color (str): The color of the player.
+
+        Returns:
+            tuple or None: A (king box, color, checkers bitboard, pins, king targets) tuple, where pins is a
+                dictionary giving for the box of each pinned piece the bitboard of the boxes where it can still
+                go, and king targets is the bitboard of the boxes where the king can go, and None if there is no
+                king of this color.
+
+        """
+        if color in self.safety_cache:
+            return self.safety_cache[color]
+
+        color_index = COLORS.index(color)
+        kings = self.bitboards[color_index][KING]
+        if not kings:
+            self.safety_cache[color] = None
+            return None
+
+        king_index = kings.bit_length() - 1
+        enemy_index = 1 - color_index
+        own = self.occupied[color_index]
+        occupied = own | self.occupied[enemy_index]
+        enemy_pieces = self.bitboards[enemy_index]
+
+        # A piece is pinned if it is the first piece met on a ray from the king, and the second one is an enemy
+        # piece moving along this ray.
+        pins = {}
+        for direction in QUEEN_DIRECTIONS:
+            sliders = enemy_pieces[QUEEN] | enemy_pieces[ROOK if direction in ROOK_DIRECTIONS else BISHOP]
+            ray = RAY_MASKS[direction][king_index]
+            if not ray & sliders:
+                continue
+
+            blockers = ray & occupied
+            first = _first_blocker(blockers, direction)
+            if not own >> first & 1:
+                continue
+
+            beyond = blockers & RAY_MASKS[direction][first]
+            if not beyond:
+                continue
+
+            second = _first_blocker(beyond, direction)
+            if sliders >> second & 1:
+                pins[first] = ray ^ RAY_MASKS[direction][second]
+
+        # Only the few boxes next to the king are tested, and without the king, so that it cannot escape a rook or
+        # a bishop by moving away along its ray.
+        king_targets = 0
+        candidates = KING_MASKS[king_index] & ~own
+        without_king = occupied & ~kings
+        while candidates:
+            bit = candidates & -candidates
+            candidates ^= bit
+            if not self.attackers_mask(bit.bit_length() - 1, enemy_index, without_king):
+                king_targets |= bit
+
+        safety = (king_index, color_index, self.attackers_mask(king_index, enemy_index, occupied), pins,
+                  king_targets)
+        self.safety_cache[color] = safety
+        return safety
+
+    def targets_mask(self, index):
+        """
+        Returns the bitboard of the boxes where the piece on a box can move, without considering the safety of its
+        king.
+
+        Args:
+            index (int): The number of the box of the piece, which must not be empty.
+
+        Returns:
+            int: The bitboard of the target boxes.
+
+        """
+        color, kind = PIECE_KINDS[self.squares[index]]
+        own = self.occupied[color]
+        if kind == PAWN:
+            return pawn_targets(index, color, own | self.occupied[1 - color], self.occupied[1 - color])
+
+        if kind == KNIGHT:
+            return KNIGHT_MASKS[index] & ~own
+
+        if kind == KING:
+            return KING_MASKS[index] & ~own
+
+        return piece_attacks(index, kind, own | self.occupied[1 - color]) & ~own
+
+    def legal_targets_mask(self, index, safety):
+        """
+        Returns the bitboard of the boxes where the piece on a box can move without leaving its king in check.
+
+        Args:
+            index (int): The number of the box of the piece, which must not be empty.
+            safety (tuple): The result of king_safety() for the color of the piece.
+
+        Returns:
+            int: The bitboard of the target boxes.
+
+        """
+        targets = self.targets_mask(index)
+        if safety is None:
+            return targets
+
+        king_index, _, checkers, pins, king_targets = safety
+        if index == king_index:
+            return targets & king_targets
+
+        if checkers:
+            # Against a double check, only the king can move.
+            if checkers & (checkers - 1):
+                return 0
+            targets &= checkers | BETWEEN_MASKS[king_index][checkers.bit_length() - 1]
+
+        pin = pins.get(index)
+        if pin is not None:
+            targets &= pin
+
+        return targets
+
+    def move_masks(self, color):
+        """
+        Computes the valid moves of all the pieces of a color, as bitboards: the checks and the pins restrict
+        whole sets of target boxes at once.
+
+        Args:
+            color (int): The color of the pieces (WHITE or BLACK).
+
+        Returns:
+            list: The (box number, bitboard of the target boxes) tuples of the pieces which can move.
+
+        """
+        safety = self.king_safety(COLORS[color])
+        pieces = self.bitboards[color]
+        own = self.occupied[color]
+        enemy = self.occupied[1 - color]
+        occupied = own | enemy
+
+        # The boxes where the pieces other than the king can go: not on a piece of their color, and, if the king
+        # is in check, on the checking piece or between it and the king.
+        allowed = ~own
+        king_index, pins, king_targets = -1, {}, 0
+        if safety is not None:
+            king_index, _, checkers, pins, king_targets = safety
+            if checkers:
+                if checkers & (checkers - 1):
+                    allowed = 0
+                else:
+                    allowed &= checkers | BETWEEN_MASKS[king_index][checkers.bit_length() - 1]
+
+        masks = []
+        if king_targets:
+            masks.append((king_index, king_targets))
+        if not allowed:
+            return masks
+
+        for kind, step_masks in ((KING, KING_MASKS), (KNIGHT, KNIGHT_MASKS)):
+            boxes = pieces[kind]
+            while boxes:
+                bit = boxes & -boxes
+                boxes ^= bit
+                index = bit.bit_length() - 1
+                if index == king_index:
+                    continue
+                targets = step_masks[index] & allowed
+                if index in pins:
+                    targets &= pins[index]
+                if targets:
+                    masks.append((index, targets))
+
+        for kind in SLIDER_DIRECTIONS:
+            boxes = pieces[kind]
+            while boxes:
+                bit = boxes & -boxes
+                boxes ^= bit
+                index = bit.bit_length() - 1
+                targets = piece_attacks(index, kind, occupied) & allowed
+                if index in pins:
+                    targets &= pins[index]
+                if targets:
+                    masks.append((index, targets))
+
+        boxes = pieces[PAWN]
+        while boxes:
+            bit = boxes & -boxes
+            boxes ^= bit
+            index = bit.bit_length() - 1
+            targets = pawn_targets(index, color, occupied, enemy) & allowed
+            if index in pins:
+                targets &= pins[index]
+            if targets:
+                masks.append((index, targets))
+
+        return masks
+
+    def is_legal(self, source_index, target_index, safety):
+        if safety is None:
+            return True
+
+        king_index, _, checkers, pins, king_targets = safety
+        if source_index == king_index:
+            return bool(king_targets >> target_index & 1)
+
+        if checkers:
+            if checkers & (checkers - 1):
+                return False
+            if not (checkers | BETWEEN_MASKS[king_index][checkers.bit_length() - 1]) >> target_index & 1:
+                return False
+
+        pin = pins.get(source_index)
+        return pin is None or bool(pin >> target_index & 1)
+
+    def is_in_check(self, color):
+        safety = self.king_safety(color)
+        return safety is not None and bool(safety[2])
+
+    def has_legal_moves(self, color):
+        return bool(self.move_masks(COLORS.index(color)))
+
+    def count_moves(self, color):
+        return sum(targets.bit_count() for _, targets in self.move_masks(COLORS.index(color)))
+
+    def generate_moves(self, position):
+        index = SQUARE_INDEX.get(position)
+        if index is None or self.squares[index] is None:
+            return []
+
+        color = COLORS[PIECE_KINDS[self.squares[index]][0]]
+        return square_names(self.legal_targets_mask(index, self.king_safety(color)))
+
+    def generate_all_moves(self, color):
+        moves = []
+        for index, targets in self.move_masks(COLORS.index(color)):
+            source_moves = MOVES[index]
+            while targets:
+                bit = targets & -targets
+                moves.append(source_moves[bit.bit_length() - 1])
+                targets ^= bit
+        return moves
+
+    def color_king_is_on_board(self, color):
+        if color not in COLORS:
+            return False
+
+        return bool(self.bitboards[COLORS.index(color)][KING])
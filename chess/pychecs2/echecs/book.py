@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the opening book of the computer player: the moves played in a collection of games, for the
+positions of their first moves, with a weight counting how often (and how successfully) each move was played.
+
+The book is a file of fixed-size records (RECORD, in big endian as in the Polyglot format): the Zobrist key of a
+position (Chessboard.hash_key), a move (see encode_move() of the transposition module), its weight, and 4 unused
+bytes. The records are sorted by key, so that the moves of a position are found by a binary search in the file,
+which is mapped in memory (mmap): opening a book reads nothing, and a search only reads a few pages, whatever its
+size.
+
+A book is built from PGN files, and its moves are read, from the folder containing the pychecs2 package, with:
+
+    python -m pychecs2.echecs.book build games.pgn --output book.bin --plies 20
+    python -m pychecs2.echecs.book probe book.bin --fen "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b - - 0 1"
+
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+from collections import defaultdict
+
+from pychecs2.echecs.chess_board import Chessboard, INITIAL_FEN
+from pychecs2.echecs.pgn import PgnError, decode_san, read_games
+from pychecs2.echecs.transposition import encode_move, decode_move
+
+RECORD = struct.Struct('>QHHI')
+KEY = struct.Struct('>Q')
+
+MAX_WEIGHT = 0xffff
+
+# The weight added to a move for each game, according to the result of the game for the player of the move.
+RESULT_WEIGHTS = {'win': 2, 'draw': 1, 'loss': 0}
+
+# The number of half-moves of each game added to the book.
+BOOK_PLIES = 20
+
+
+class OpeningBook:
+    """
+    An opening book, read from its file.
+
+    Attributes:
+        path (str): The path of the file.
+        size (int): The number of records of the book.
+
+    Args:
+        path (str): The path of the file.
+
+    Raises:
+        OSError: If the file cannot be read.
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self.data = None
+        with open(path, 'rb') as book_file:
+            self.size = os.fstat(book_file.fileno()).st_size // RECORD.size
+            if self.size:
+                self.data = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+            self.size = 0
+
+    def entries(self, key):
+        """
+        Finds the moves of a position, by a binary search of its key.
+
+        Args:
+            key (int): The Zobrist key of the position.
+
+        Returns:
+            list: The (move, weight) tuples of the position, the move as a (source position, target position)
+                tuple, the heaviest first.
+
+        """
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(self.data, middle * RECORD.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        entries = []
+        for index in range(low, self.size):
+            entry_key, code, weight, _ = RECORD.unpack_from(self.data, index * RECORD.size)
+            if entry_key != key:
+                break
+            entries.append((decode_move(code), weight))
+        return entries
+
+    def moves(self, board):
+        """
+        Returns the moves of the book for the side to move of a chessboard. The moves are checked, since two
+        positions can have the same key.
+
+        Args:
+            board (Chessboard): The chessboard.
+
+        Returns:
+            list: The valid (move, weight) tuples, the heaviest first.
+
+        """
+        return [(move, weight) for move, weight in self.entries(board.hash_key)
+                if move is not None and board.get_piece_color_from_position(move[0]) == board.side_to_move
+                and board.is_move_valid(*move)]
+
+    def choose_move(self, board, generator=random):
+        """
+        Chooses a move of the book at random, each move being chosen in proportion to its weight.
+
+        Args:
+            board (Chessboard): The chessboard.
+            generator (Random): The random generator.
+
+        Returns:
+            tuple or None: The move, as a (source position, target position) tuple, or None if the position is not
+                in the book.
+
+        """
+        moves = [(move, weight) for move, weight in self.moves(board) if weight > 0]
+        if not moves:
+            return None
+        return generator.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+
+def game_weights(result):
+    """
+    Returns the weight of the moves of each color of a game, according to its result ('1-0', '0-1', '1/2-1/2' or
+    '*'). The moves of a game whose result is unknown are counted as the moves of a draw.
+
+    """
+    if result == '1-0':
+        return {'white': RESULT_WEIGHTS['win'], 'black': RESULT_WEIGHTS['loss']}
+    elif result == '0-1':
+        return {'white': RESULT_WEIGHTS['loss'], 'black': RESULT_WEIGHTS['win']}
+    return {'white': RESULT_WEIGHTS['draw'], 'black': RESULT_WEIGHTS['draw']}
+
+
+def build_book(pgn_paths, path, plies=BOOK_PLIES):
+    """
+    Builds an opening book from the games of PGN files: the first moves of each game are added to the book, with a
+    weight depending on the result of the game. The moves of a game are read until its first move which cannot be
+    played (see the pgn module).
+
+    Args:
+        pgn_paths (list): The paths of the PGN files.
+        path (str): The path of the book to write (replaced if it exists).
+        plies (int): The number of half-moves of each game to add.
+
+    Returns:
+        int, int: The number of games read, and the number of records of the book.
+
+    """
+    weights = defaultdict(int)
+    games = 0
+    for pgn_path in pgn_paths:
+        for pgn_game in read_games(pgn_path):
+            games += 1
+            try:
+                board = Chessboard.from_fen(pgn_game.headers.get('FEN') or INITIAL_FEN)
+            except ValueError:
+                continue
+
+            color_weights = game_weights(pgn_game.headers.get('Result', '*'))
+            for san in pgn_game.san_moves()[:plies]:
+                try:
+                    move = decode_san(board, san)
+                except PgnError:
+                    break
+                weights[board.hash_key, encode_move(move)] += color_weights[board.side_to_move]
+                board.push(move)
+
+    # The weights are scaled down if the heaviest one does not fit in its 16 bits.
+    scale = max(1, max(weights.values(), default=0) / MAX_WEIGHT)
+    records = sorted((key, -round(weight / scale), code) for (key, code), weight in weights.items()
+                     if round(weight / scale) > 0)
+
+    # The new book is written next to the old one, then replaces it, so that a book being read is never half written.
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as book_file:
+        for key, weight, code in records:
+            book_file.write(RECORD.pack(key, code, -weight, 0))
+    os.replace(temporary_path, path)
+    return games, len(records)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Builds or reads an opening book.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="build a book from PGN files")
+    build.add_argument('pgn', nargs='+', help="PGN files")
+    build.add_argument('--output', default='book.bin', help="path of the book (default: book.bin)")
+    build.add_argument('--plies', type=int, default=BOOK_PLIES,
+                       help="half-moves of each game to add (default: {})".format(BOOK_PLIES))
+    probe = commands.add_parser('probe', help="display the moves of a position")
+    probe.add_argument('book', help="path of the book")
+    probe.add_argument('--fen', default=INITIAL_FEN, help="position (default: the initial position)")
+    args = parser.parse_args(arguments)
+
+    if args.command == 'build':
+        games, records = build_book(args.pgn, args.output, args.plies)
+        print('Games: {}, records: {}'.format(games, records))
+        return 0
+
+    with OpeningBook(args.book) as book:
+        for (source, target), weight in book.moves(Chessboard.from_fen(args.fen)):
+            print('{}{}: {}'.format(source, target, weight))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -3,32 +3,476 @@
 This file contains the Chessboard class, a class grouping together various pieces on a game board.
 
 """
+from collections.abc import MutableMapping
+from functools import lru_cache
+
+from pychecs2.echecs.evaluation import PIECE_TYPES, PIECE_VALUES, SQUARE_VALUES, PIECE_BYTES
 from pychecs2.echecs.piece import Pawn, Rook, Bishop, Knight, Queen, King, USE_UNICODE
+from pychecs2.echecs.zobrist import SIDE_KEY, piece_keys
+from pychecs2.echecs.tables import SQUARE_NAMES, SQUARE_INDEX, QUEEN_TARGETS, BETWEEN, RAYS, PAWN_PUSHES, \
+    PAWN_CAPTURES, KNIGHT_TARGETS, KING_TARGETS, QUEEN_DIRECTIONS
+
+
+INITIAL_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1'
+
+# The pieces of the FEN notation: upper case letters for white, lower case letters for black.
+FEN_PIECES = {char: piece_type(color)
+              for letter, piece_type in (('p', Pawn), ('n', Knight), ('b', Bishop), ('r', Rook), ('q', Queen),
+                                         ('k', King))
+              for char, color in ((letter.upper(), 'white'), (letter, 'black'))}
+FEN_CHARS = {piece: char for char, piece in FEN_PIECES.items()}
+
+# The pieces of each color, one per type, in the order of PIECE_TYPES: the keys of Chessboard.piece_boxes.
+COLOR_PIECES = {color: tuple(piece_type(color) for piece_type in PIECE_TYPES) for color in ('white', 'black')}
+KINGS = {color: King(color) for color in ('white', 'black')}
+
+
+@lru_cache(maxsize=4096)
+def parse_fen_row(row):
+    """
+    Converts a row of the FEN notation (for example 'r3k2r' or '8') into its 8 boxes. The rows are few and often
+    repeated ('8', 'pppppppp', ...), so the result is kept for the next positions.
+
+    Args:
+        row (str): The row, from the a column to the h column.
+
+    Returns:
+        tuple or None: The 8 boxes of the row (a Piece instance or None each), and None if the row is invalid.
+
+    """
+    boxes = []
+    for char in row:
+        if char in FEN_PIECES:
+            boxes.append(FEN_PIECES[char])
+        elif '1' <= char <= '8':
+            boxes.extend((None,) * int(char))
+        else:
+            return None
+
+    return tuple(boxes) if len(boxes) == 8 else None
+
+
+def parse_fen(fen):
+    """
+    Reads the placement of the pieces and the active color of a position in FEN notation. The castling rights, the
+    en passant box and the move counters are ignored, since the rules of the chessboard do not include these moves.
+
+    Args:
+        fen (str): The position, for example 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1'.
+
+    Returns:
+        list, str: The 64 boxes (see the tables module), containing a Piece instance or None, and the color of the
+            player who has to play.
+
+    Raises:
+        ValueError: If the position is not a valid FEN.
+
+    """
+    fields = fen.split(None, 2)
+    rows = fields[0].split('/') if fields else ()
+    squares = []
+    if len(rows) == 8:
+        # The FEN starts with the 8th row, and the boxes are numbered from the 1st row.
+        for row in reversed(rows):
+            boxes = parse_fen_row(row)
+            if boxes is None:
+                break
+            squares.extend(boxes)
+
+    if len(squares) != 64 or (len(fields) > 1 and fields[1] not in ('w', 'b')):
+        raise ValueError("Invalid FEN: {}".format(fen))
+
+    return squares, 'black' if len(fields) > 1 and fields[1] == 'b' else 'white'
+
+
+def boards_from_fens(fens, board_class=None):
+    """
+    Creates the chessboards of many positions in FEN notation, for example the lines of a file of test positions.
+    The empty lines are skipped.
+
+    Args:
+        fens (iterable): The positions.
+        board_class (type): The class of the chessboards to create, Chessboard by default.
+
+    Yields:
+        Chessboard: The chessboard of each position, in order, with its side to move.
+
+    Raises:
+        ValueError: If a position is not a valid FEN.
+
+    """
+    from_fen = (board_class or Chessboard).from_fen
+    for fen in fens:
+        if fen and not fen.isspace():
+            yield from_fen(fen)
+
+
+def other_color(color):
+    """
+    Returns the color of the opponent of a player.
+
+    Args:
+        color (str): The color of the player, 'white' or 'black'.
+
+    Returns:
+        str: 'black' for 'white', and 'white' for 'black'.
+
+    """
+    if color == 'white':
+        return 'black'
+    return 'white'
+
+
+def empty_piece_boxes():
+    """
+    Returns the boxes of the pieces of an empty chessboard (see Chessboard.piece_boxes).
+
+    Returns:
+        dict: An empty set for each piece.
+
+    """
+    return {piece: set() for color in ('white', 'black') for piece in COLOR_PIECES[color]}
+
+
+class PiecesView(MutableMapping):
+    """
+    A dictionary-like view of the pieces of a chessboard, whose keys are positions ('a1', 'e4', ...) and values
+    are Piece instances. Reading and writing through this view reads and updates the boxes of the chessboard.
+
+    Args:
+        chess_board (Chessboard): The chessboard viewed.
+
+    """
+    __slots__ = ('chess_board',)
+
+    def __init__(self, chess_board):
+        self.chess_board = chess_board
+
+    def __getitem__(self, position):
+        index = SQUARE_INDEX.get(position)
+        if index is None or self.chess_board.squares[index] is None:
+            raise KeyError(position)
+        return self.chess_board.squares[index]
+
+    def __setitem__(self, position, piece):
+        self.chess_board.put_piece(SQUARE_INDEX[position], piece)
+
+    def __delitem__(self, position):
+        index = SQUARE_INDEX[position]
+        if self.chess_board.squares[index] is None:
+            raise KeyError(position)
+        self.chess_board.remove_piece(index)
+
+    def __contains__(self, position):
+        index = SQUARE_INDEX.get(position)
+        return index is not None and self.chess_board.squares[index] is not None
+
+    def __iter__(self):
+        for index, piece in enumerate(self.chess_board.squares):
+            if piece is not None:
+                yield SQUARE_NAMES[index]
+
+    def __len__(self):
+        return 64 - self.chess_board.squares.count(None)
+
+    def __repr__(self):
+        return repr(dict(self))
 
 
 class Chessboard:
     """
-    Chessboard class, implemented with a piece dictionary.
+    Chessboard class, implemented with a list of the 64 boxes (see the tables module for their numbers).
 
     Attributes:
-        pieces_dictionary (dict): A dictionary whose keys are positions, according to the following format:
+        squares (list): The 64 boxes of the chessboard, containing a Piece instance or None.
+        pieces_dictionary (PiecesView): A dictionary-like view of the pieces, whose keys are positions, according to
+            the following format:
             A position is a two-character string.
             The first character is a letter between a and h, representing the column of the chessboard.
             The second character is a number between 1 and 8, representing the row of the chessboard.
+            Assigning a dictionary to this attribute replaces all the pieces of the chessboard.
         row_numbers (list): A list containing, in order, the numbers representing the rows.
         col_letters (list): A list containing, in order, the letters representing the columns.
+        side_to_move (str): The color of the player who has to play, 'white' or 'black'. It is changed by the
+            Game (its active_player), since moving a piece does not change it.
+        pieces_key (int): The Zobrist key of the pieces (see the zobrist module), updated at each move.
+        material_values (dict): The value of the pieces of each color (see the evaluation module), updated at each
+            move, capture and undo.
+        square_values (dict): The value of the pieces of each color according to their boxes (material and
+            piece-square bonuses, see the evaluation module), updated in the same way.
+        piece_boxes (dict): For each piece (one per color and type, see COLOR_PIECES), the set of the numbers of the
+            boxes where it is, updated in the same way: the pieces of a color, or its king, are found without
+            scanning the 64 boxes.
+        piece_codes (bytearray): The code of the piece on each box, as a signed byte (see PIECE_CODES in the
+            evaluation module), updated in the same way, so that positions are encoded for NumPy without a loop.
+        undo_stack (list): The moves played with push() and not yet undone with pop(), the last one at the end. Each
+            one is recorded as a (source position, target position, captured piece or None, pieces_key before the
+            move, side_to_move before the move) tuple.
 
     """
+    # The attributes are __slots__ (there is no __dict__), so that the many chessboards created by an analysis use
+    # little memory.
+    __slots__ = ('side_to_move', 'squares', 'pieces_key', 'material_values', 'square_values', 'piece_boxes',
+                 'piece_codes', 'taken_pieces', 'undo_stack')
+
+    # These lists can be used in other methods, for example to validate a position.
+    row_numbers = ['1', '2', '3', '4', '5', '6', '7', '8']
+    col_letters = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
+
     def __init__(self):
-        # The dictionary of pieces, initially empty, but then filled by the initialize_checkboard() method.
-        self.pieces_dictionary = {}
+        self.side_to_move = 'white'
 
-        # These lists can be used in other methods, for example to validate a position.
-        self.row_numbers = ['1', '2', '3', '4', '5', '6', '7', '8']
-        self.col_letters = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
+        # The boxes, initially empty, but then filled by the init_board() method.
+        self.clear_board()
 
         self.init_board()
         self.taken_pieces = []
+        self.undo_stack = []
+
+    @property
+    def pieces_dictionary(self):
+        return PiecesView(self)
+
+    @pieces_dictionary.setter
+    def pieces_dictionary(self, pieces):
+        """
+        Replaces all the pieces of the chessboard by those of the dictionary received, for example a dictionary
+        loaded from a save.
+
+        """
+        squares = [None] * 64
+        for position, piece in dict(pieces).items():
+            squares[SQUARE_INDEX[position]] = piece
+        self.set_squares(squares)
+
+    def set_squares(self, squares):
+        """
+        Replaces all the pieces of the chessboard by those of a list of the 64 boxes. The moves recorded for pop()
+        are forgotten, since they no longer apply to the new pieces.
+
+        Args:
+            squares (list): The 64 boxes, containing a Piece instance or None.
+
+        """
+        key = 0
+        material_values = {'white': 0, 'black': 0}
+        square_values = {'white': 0, 'black': 0}
+        piece_boxes = empty_piece_boxes()
+        for index, piece in enumerate(squares):
+            if piece is not None:
+                key ^= piece_keys(piece)[index]
+                material_values[piece.color] += PIECE_VALUES[piece.__class__]
+                square_values[piece.color] += SQUARE_VALUES[piece][index]
+                piece_boxes[piece].add(index)
+        self.squares = list(squares)
+        self.piece_codes = bytearray(PIECE_BYTES[piece] for piece in squares)
+        self.pieces_key = key
+        self.material_values = material_values
+        self.square_values = square_values
+        self.piece_boxes = piece_boxes
+        self.undo_stack = []
+
+    @classmethod
+    def from_fen(cls, fen):
+        """
+        Creates a chessboard from a position in FEN notation (see parse_fen()), with its side to move.
+
+        Args:
+            fen (str): The position, for example 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1'.
+
+        Returns:
+            Chessboard: The chessboard, of the class on which the method is called.
+
+        Raises:
+            ValueError: If the position is not a valid FEN.
+
+        """
+        squares, side_to_move = parse_fen(fen)
+
+        # The initial position of __init__() is not created, since it would be replaced immediately.
+        board = cls.__new__(cls)
+        board.clear_board()
+        board.set_squares(squares)
+        board.side_to_move = side_to_move
+        board.taken_pieces = []
+        return board
+
+    def to_fen(self):
+        """
+        Returns the position in FEN notation. Castling and en passant are not part of the rules of the
+        chessboard, and the moves are not counted, so the last fields are always '- - 0 1'.
+
+        Returns:
+            str: The position, for example 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1'.
+
+        """
+        rows = []
+        for row_start in range(56, -8, -8):
+            row = ''
+            empty = 0
+            for piece in self.squares[row_start:row_start + 8]:
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                row += FEN_CHARS[piece]
+            rows.append(row + str(empty) if empty else row)
+
+        return '{} {} - - 0 1'.format('/'.join(rows), 'w' if self.side_to_move == 'white' else 'b')
+
+    def clear_board(self):
+        """
+        Removes all the pieces of the chessboard.
+
+        """
+        self.squares = [None] * 64
+        self.piece_codes = bytearray(64)
+        self.pieces_key = 0
+        self.material_values = {'white': 0, 'black': 0}
+        self.square_values = {'white': 0, 'black': 0}
+        self.clear_index()
+
+    def clear_index(self):
+        """
+        Empties the index of the boxes of the pieces (piece_boxes). The index is kept up to date by put_piece() and
+        remove_piece() through add_to_index() and remove_from_index(), which a subclass can override to keep its
+        own representation of the pieces instead (see the bitboard module).
+
+        """
+        self.piece_boxes = empty_piece_boxes()
+
+    def add_to_index(self, index, piece):
+        self.piece_boxes[piece].add(index)
+
+    def remove_from_index(self, index, piece):
+        self.piece_boxes[piece].remove(index)
+
+    def copy_index(self, board):
+        """
+        Copies the index of the boxes of the pieces into a copy of the chessboard (see copy()).
+
+        """
+        board.piece_boxes = {piece: set(boxes) for piece, boxes in self.piece_boxes.items()}
+
+    def boxes_of(self, piece):
+        """
+        Returns the boxes where a piece is.
+
+        Args:
+            piece (Piece): The piece, one of the shared instances of the piece module.
+
+        Returns:
+            iterable: The numbers of the boxes.
+
+        """
+        return self.piece_boxes[piece]
+
+    def put_piece(self, index, piece):
+        """
+        Places a piece on a box, replacing the piece which was there if any. The Zobrist key, the scores, the
+        boxes and the codes of the pieces are updated.
+
+        Args:
+            index (int): The number of the box, from 0 to 63.
+            piece (Piece): The piece to place.
+
+        """
+        if self.squares[index] is not None:
+            self.remove_piece(index)
+        self.squares[index] = piece
+        self.piece_codes[index] = PIECE_BYTES[piece]
+        self.pieces_key ^= piece_keys(piece)[index]
+        self.material_values[piece.color] += PIECE_VALUES[piece.__class__]
+        self.square_values[piece.color] += SQUARE_VALUES[piece][index]
+        self.add_to_index(index, piece)
+
+    def remove_piece(self, index):
+        """
+        Removes the piece which is on a box, and returns it. The Zobrist key, the scores, the boxes and the codes
+        of the pieces are updated.
+
+        Args:
+            index (int): The number of the box, from 0 to 63.
+
+        Returns:
+            Piece: The removed piece.
+
+        """
+        piece = self.squares[index]
+        self.squares[index] = None
+        self.piece_codes[index] = 0
+        self.pieces_key ^= piece_keys(piece)[index]
+        self.material_values[piece.color] -= PIECE_VALUES[piece.__class__]
+        self.square_values[piece.color] -= SQUARE_VALUES[piece][index]
+        self.remove_from_index(index, piece)
+        return piece
+
+    def pieces(self, color):
+        """
+        Returns the pieces of a color, with their boxes, from the boxes of each piece (piece_boxes).
+
+        Args:
+            color (str): The color (white or black) of the pieces.
+
+        Returns:
+            list: The (box number, piece) tuples, grouped by type of piece (pawns first, king last).
+
+        """
+        piece_boxes = self.piece_boxes
+        return [(index, piece) for piece in COLOR_PIECES[color] for index in piece_boxes[piece]]
+
+    @property
+    def hash_key(self):
+        """
+        The Zobrist key of the position: a 64-bit integer identifying the pieces on the chessboard and the side to
+        move. Two equal positions have the same key, and two different positions have different keys, except in
+        rare collisions.
+
+        Returns:
+            int: The key of the position.
+
+        """
+        if self.side_to_move == 'black':
+            return self.pieces_key ^ SIDE_KEY
+        return self.pieces_key
+
+    @property
+    def material(self):
+        """
+        The value of the pieces of each color, in hundredths of pawns, without rescanning the chessboard.
+
+        Returns:
+            dict: The value of the white pieces ('white') and of the black pieces ('black').
+
+        """
+        return dict(self.material_values)
+
+    @property
+    def material_balance(self):
+        """
+        The value of the white pieces minus the value of the black pieces, in hundredths of pawns.
+
+        Returns:
+            int: The balance, positive if white has more material.
+
+        """
+        return self.material_values['white'] - self.material_values['black']
+
+    def evaluate(self, color):
+        """
+        Evaluates the position from the point of view of a player, as the evaluate() function of the evaluation
+        module, but in O(1) with the scores updated at each move.
+
+        Args:
+            color (str): The color of the player.
+
+        Returns:
+            int: The score of the position, in hundredths of pawns.
+
+        """
+        return self.square_values[color] - self.square_values[other_color(color)]
 
     def is_position_valid(self, position):
         """
@@ -42,16 +486,7 @@ class Chessboard:
             bool: True if the position is valid, False otherwise.
 
         """
-        if len(position) != 2:
-            return False
-
-        if position[0] not in self.col_letters:
-            return False
-
-        if position[1] not in self.row_numbers:
-            return False
-
-        return True
+        return position in SQUARE_INDEX
 
     def get_piece_from_position(self, position):
         """
@@ -65,10 +500,11 @@ class Chessboard:
             Piece or None: A Piece instance if a piece was located at this position, and None otherwise.
 
         """
-        if position not in self.pieces_dictionary:
+        index = SQUARE_INDEX.get(position)
+        if index is None:
             return None
 
-        return self.pieces_dictionary[position]
+        return self.squares[index]
 
     def get_piece_color_from_position(self, position):
         """
@@ -179,37 +615,16 @@ class Chessboard:
             bool: True if no piece is located between the two positions, and False otherwise (or if the
                 did not allow for verification).
         """
-        source_col, target_col = source[0], target[0]
-        source_row, target_row = source[1], target[1]
-
-        # If the source and target columns are the same, we check if the field is free for each row.
-        if source_col == target_col:
-            for rangee in self.rows_between(source_row, target_row):
-                if self.get_piece_from_position('{}{}'.format(source_col, rangee)) is not None:
-                    return False
-
-            return True
-
-        # If the source and target rows are the same, we check if the field is free for each column.
-        if source_row == target_row:
-            for col in self.col_between(source_col, target_col):
-                if self.get_piece_from_position('{}{}'.format(col, source_row)) is not None:
-                    return False
+        source_index, target_index = SQUARE_INDEX[source], SQUARE_INDEX[target]
 
-            return True
-
-        #  here, it's either a diagonal or something invalid.
-        columns = self.col_between(source_col, target_col)
-        rows = self.rows_between(source_row, target_row)
-        if len(columns) != len(rows):
-            # Error, it is neither a line nor a diagonal.
+        # The boxes between the two positions are read in the BETWEEN table. It is empty for two positions which
+        # are not aligned, so we first make sure that they are on the same row, column or diagonal.
+        if source_index != target_index and target_index not in QUEEN_TARGETS[source_index]:
             return False
 
-        i = 0
-        while i < len(rows):
-            if self.get_piece_from_position('{}{}'.format(columns[i], rows[i])) is not None:
+        for index in BETWEEN[source_index][target_index]:
+            if self.squares[index] is not None:
                 return False
-            i += 1
 
         return True
 
@@ -224,6 +639,7 @@ class Chessboard:
             3. If the piece can't jump, the path must be free between the two positions.
             4. If there is a piece at the target position, it must be of a different color.
             5. The move must be valid for this particular piece.
+            6. The move must not leave the king of the same color as the piece in check.
 
         Args:
             source_position (str): The source position of the move.
@@ -253,10 +669,322 @@ class Chessboard:
             if piece_cible.color == piece.color:
                 return False
 
-            else:
-                return piece.can_take_over(source, target)
+            elif not piece.can_take_over(source, target):
+                return False
+
+        elif not piece.can_move_towards(source, target):
+            return False
+
+        return self.is_legal(SQUARE_INDEX[source], SQUARE_INDEX[target], self.king_safety(piece.color))
+
+    def king_position(self, color):
+        """
+        Returns the position of the king of a color.
+
+        Args:
+            color (str): The color (white or black) of the king to look for.
+
+        Returns:
+            str or None: The position of the king, and None if there is no king of this color on the chessboard.
+
+        """
+        kings = self.piece_boxes.get(KINGS.get(color))
+        if not kings:
+            return None
+
+        return SQUARE_NAMES[min(kings)]
+
+    def attackers(self, index, color, ignored=None):
+        """
+        Returns the boxes of the pieces of a color which attack a box, i.e. which could take a piece located on
+        this box. Instead of testing every piece, we look from the box itself: the knights at a knight step, the
+        pawns and the king next to it, and the first piece met on each ray.
+
+        Args:
+            index (int): The number of the attacked box (see the tables module).
+            color (str): The color of the attacking pieces.
+            ignored (int): The number of a box to consider empty, for example the box that a king is leaving.
+
+        Returns:
+            list: The numbers of the boxes of the attacking pieces.
+
+        """
+        squares = self.squares
+        attackers = []
+        for attacker_index in KNIGHT_TARGETS[index]:
+            piece = squares[attacker_index]
+            if isinstance(piece, Knight) and piece.color == color:
+                attackers.append(attacker_index)
+
+        for attacker_index in KING_TARGETS[index]:
+            piece = squares[attacker_index]
+            if isinstance(piece, King) and piece.color == color:
+                attackers.append(attacker_index)
+
+        # A pawn attacks the boxes from which a pawn of the other color would take it.
+        for attacker_index in PAWN_CAPTURES[other_color(color)][index]:
+            piece = squares[attacker_index]
+            if isinstance(piece, Pawn) and piece.color == color:
+                attackers.append(attacker_index)
+
+        for direction in QUEEN_DIRECTIONS:
+            for attacker_index in RAYS[direction][index]:
+                if attacker_index == ignored:
+                    continue
+
+                piece = squares[attacker_index]
+                if piece is not None:
+                    if piece.color == color and direction in piece.directions:
+                        attackers.append(attacker_index)
+                    break
+
+        return attackers
+
+    def king_safety(self, color):
+        """
+        Computes, once for a position, what the legality of the moves of a color depends on: the pieces giving
+        check to its king (the checkers) and the pieces pinned against its king. A pinned piece can only move
+        along the ray between the king and the piece pinning it.
+
+        Args:
+            color (str): The color of the player.
+
+        Returns:
+            tuple or None: A (king box, color, checker boxes, pins) tuple, where pins is a dictionary giving for
+                the box of each pinned piece the boxes where it can still go, and None if there is no king of
+                this color.
+
+        """
+        king = self.king_position(color)
+        if king is None:
+            return None
+
+        king_index = SQUARE_INDEX[king]
+        squares = self.squares
+        pins = {}
+        for direction in QUEEN_DIRECTIONS:
+            ray = RAYS[direction][king_index]
+            pinned_index = None
+            for distance, index in enumerate(ray):
+                piece = squares[index]
+                if piece is None:
+                    continue
+
+                if piece.color == color:
+                    if pinned_index is not None:
+                        break
+                    pinned_index = index
+                    continue
+
+                if pinned_index is not None and direction in piece.directions:
+                    pins[pinned_index] = ray[:distance + 1]
+                break
+
+        return king_index, color, self.attackers(king_index, other_color(color)), pins
+
+    def is_legal(self, source_index, target_index, safety):
+        """
+        Checks if a move, valid according to the rules of the piece, does not leave the king of the player in
+        check.
+
+        Args:
+            source_index (int): The number of the source box of the move.
+            target_index (int): The number of the target box of the move.
+            safety (tuple): The result of king_safety() for the color of the moving piece.
+
+        Returns:
+            bool: True if the king is not in check after the move, and False otherwise.
+
+        """
+        if safety is None:
+            return True
+
+        king_index, color, checkers, pins = safety
+
+        # The king cannot go on an attacked box. Its own box is ignored, since a rook giving check would still
+        # attack the box behind the king after its move.
+        if source_index == king_index:
+            return not self.attackers(target_index, other_color(color), king_index)
+
+        # Against a double check, only the king can move. Against a single check, the checker must be taken or
+        # a piece must be placed between it and the king.
+        if len(checkers) > 1:
+            return False
+
+        if checkers and target_index != checkers[0] and target_index not in BETWEEN[king_index][checkers[0]]:
+            return False
+
+        pin = pins.get(source_index)
+        return pin is None or target_index in pin
+
+    def is_in_check(self, color):
+        """
+        Checks if the king of a color is in check.
+
+        Args:
+            color (str): The color (white or black) of the king.
+
+        Returns:
+            bool: True if the king is attacked by a piece of the other color, and False otherwise (or if there is
+                no king of this color).
+
+        """
+        king = self.king_position(color)
+        if king is None:
+            return False
+
+        return bool(self.attackers(SQUARE_INDEX[king], other_color(color)))
+
+    def has_legal_moves(self, color):
+        """
+        Checks if the player of a color can make at least one move.
+
+        Args:
+            color (str): The color (white or black) of the player.
+
+        Returns:
+            bool: True if a valid move exists, and False otherwise.
+
+        """
+        safety = self.king_safety(color)
+        for source_index, piece in self.pieces(color):
+            for target_index in self.piece_targets(source_index, piece):
+                if self.is_legal(source_index, target_index, safety):
+                    return True
+
+        return False
+
+    def is_checkmate(self, color):
+        """
+        Checks if the player of a color is checkmated: its king is in check, and no move can save it.
+
+        Args:
+            color (str): The color (white or black) of the player.
 
-        return piece.can_move_towards(source, target)
+        Returns:
+            bool: True if the player is checkmated, and False otherwise.
+
+        """
+        return self.is_in_check(color) and not self.has_legal_moves(color)
+
+    def is_stalemate(self, color):
+        """
+        Checks if the player of a color is stalemated: its king is not in check, but it cannot make any move.
+
+        Args:
+            color (str): The color (white or black) of the player.
+
+        Returns:
+            bool: True if the player is stalemated, and False otherwise.
+
+        """
+        return not self.is_in_check(color) and not self.has_legal_moves(color)
+
+    def piece_targets(self, source_index, piece):
+        """
+        Returns the boxes where a piece can move according to its rules of movement, without considering the
+        safety of its king. Instead of testing the 64 boxes, we only walk the boxes reachable by this type of
+        piece: the pushes and captures of a pawn, the steps of a knight or a king, and the rays of a rook, a bishop
+        or a queen, until the first piece met.
+
+        Args:
+            source_index (int): The number of the box of the piece (see the tables module).
+            piece (Piece): The piece located on this box.
+
+        Returns:
+            list: The numbers of the target boxes.
+
+        """
+        squares = self.squares
+        targets = []
+        if isinstance(piece, Pawn):
+            # A pawn moves forward on free boxes, and takes diagonally.
+            for target_index in PAWN_PUSHES[piece.color][source_index]:
+                if squares[target_index] is not None:
+                    break
+                targets.append(target_index)
+
+            for target_index in PAWN_CAPTURES[piece.color][source_index]:
+                target_piece = squares[target_index]
+                if target_piece is not None and target_piece.color != piece.color:
+                    targets.append(target_index)
+
+        elif piece.step_targets is not None:
+            for target_index in piece.step_targets[source_index]:
+                target_piece = squares[target_index]
+                if target_piece is None or target_piece.color != piece.color:
+                    targets.append(target_index)
+
+        else:
+            # We walk each ray until the first piece met, which can be taken if it is of the other color.
+            for direction in piece.directions:
+                for target_index in RAYS[direction][source_index]:
+                    target_piece = squares[target_index]
+                    if target_piece is None:
+                        targets.append(target_index)
+                        continue
+
+                    if target_piece.color != piece.color:
+                        targets.append(target_index)
+                    break
+
+        return targets
+
+    def generate_moves(self, position):
+        """
+        Generates the positions where the piece located at a position can move, i.e. the moves for which
+        is_move_valid() returns True.
+
+        Args:
+            position (str): The position of the piece to move.
+
+        Returns:
+            list: The target positions (in str) of the valid moves of the piece, and an empty list if there is
+                no piece at this position.
+
+        """
+        piece = self.get_piece_from_position(position)
+        if piece is None:
+            return []
+
+        source_index = SQUARE_INDEX[position]
+        safety = self.king_safety(piece.color)
+        return [SQUARE_NAMES[target_index] for target_index in self.piece_targets(source_index, piece)
+                if self.is_legal(source_index, target_index, safety)]
+
+    def generate_all_moves(self, color):
+        """
+        Generates all the valid moves of the pieces of a color. The checks and pins are computed only once for
+        all the moves.
+
+        Args:
+            color (str): The color (white or black) of the pieces to move.
+
+        Returns:
+            list: The valid moves, as (source position, target position) tuples.
+
+        """
+        safety = self.king_safety(color)
+        moves = []
+        for source_index, piece in self.pieces(color):
+            source = SQUARE_NAMES[source_index]
+            moves.extend((source, SQUARE_NAMES[target_index])
+                         for target_index in self.piece_targets(source_index, piece)
+                         if self.is_legal(source_index, target_index, safety))
+        return moves
+
+    def count_moves(self, color):
+        """
+        Counts the valid moves of the pieces of a color.
+
+        Args:
+            color (str): The color (white or black) of the pieces to move.
+
+        Returns:
+            int: The number of moves, i.e. len(generate_all_moves(color)).
+
+        """
+        return len(self.generate_all_moves(color))
 
     def move(self, source, target):
         """
@@ -275,14 +1003,96 @@ class Chessboard:
 
         if not self.is_move_valid(source, target):
             raise MoveException("Invalid Move!")
-        # if there are no pieces at the target position, it is added to the list of taken pieces.
-        if self.get_piece_from_position(target) is not None:
-            self.taken_pieces.append(self.pieces_dictionary[target])
 
+        self.apply_move(source, target)
 
-        self.pieces_dictionary[target] = self.pieces_dictionary[source]
-        del self.pieces_dictionary[source]
+    def apply_move(self, source, target):
+        """
+        Moves a piece from the source position to the target position, without checking the move. The piece of
+        the target position, if any, is added to the taken pieces.
 
+        Args:
+            source (str): The source position.
+            target (str): The target position.
+
+        """
+        # if there is a piece at the target position, it is added to the list of taken pieces.
+        target_index = SQUARE_INDEX[target]
+        if self.squares[target_index] is not None:
+            self.taken_pieces.append(self.remove_piece(target_index))
+
+        self.put_piece(target_index, self.remove_piece(SQUARE_INDEX[source]))
+
+    def push(self, move):
+        """
+        Plays a move without checking it, so that it can be undone by pop(): the move must be valid, for example
+        one of the moves of generate_all_moves(). Unlike move(), the side to move passes to the opponent.
+
+        Args:
+            move (tuple): The move, as a (source position, target position) tuple.
+
+        """
+        source, target = move
+        self.undo_stack.append((source, target, self.get_piece_from_position(target), self.pieces_key,
+                                self.side_to_move))
+        self.apply_move(source, target)
+        self.side_to_move = other_color(self.side_to_move)
+
+    def pop(self):
+        """
+        Undoes the last move played with push(): the piece goes back to its source box, the captured piece (if
+        any) goes back to the target box, and the key of the position and the side to move are restored.
+
+        Returns:
+            tuple: The undone move, as a (source position, target position) tuple.
+
+        Raises:
+            IndexError: If there is no move to undo.
+
+        """
+        source, target, captured, key, side_to_move = self.undo_stack.pop()
+        self.restore_move(source, target, captured)
+        self.pieces_key = key
+        self.side_to_move = side_to_move
+        return source, target
+
+    def restore_move(self, source, target, captured):
+        """
+        Moves back the piece of the target position to the source position, and puts back the captured piece
+        (removing it from the taken pieces). The Zobrist key is restored by pop().
+
+        Args:
+            source (str): The source position of the move.
+            target (str): The target position of the move.
+            captured (Piece): The piece captured by the move, or None.
+
+        """
+        target_index = SQUARE_INDEX[target]
+        self.put_piece(SQUARE_INDEX[source], self.remove_piece(target_index))
+        if captured is not None:
+            self.put_piece(target_index, captured)
+            self.taken_pieces.pop()
+
+    def copy(self):
+        """
+        Creates an independent copy of the chessboard, which can be modified without modifying this one. The
+        pieces themselves are shared, since moving a piece does not modify it.
+
+        Returns:
+            Chessboard: The copy of the chessboard.
+
+        """
+        board = self.__class__.__new__(self.__class__)
+        board.side_to_move = self.side_to_move
+        board.squares = list(self.squares)
+        board.piece_codes = bytearray(self.piece_codes)
+        board.pieces_key = self.pieces_key
+        board.material_values = dict(self.material_values)
+        board.square_values = dict(self.square_values)
+        self.copy_index(board)
+        board.taken_pieces = list(self.taken_pieces)
+        board.undo_stack = list(self.undo_stack)
+        return board
 
     def color_king_is_on_board(self, color):
         """
@@ -295,12 +1105,10 @@ class Chessboard:
             bool: True if a king of this color is in the chessboard, and False otherwise.
 
         """
-        for piece in self.pieces_dictionary.values():
-            if isinstance(piece, King):
-                if piece.color == color:
-                    return True
+        if color not in KINGS:
+            return False
 
-        return False
+        return bool(self.piece_boxes[KINGS[color]])
 
     def init_board(self):
         """
@@ -362,7 +1170,7 @@ class Chessboard:
             else:
                 string += '{} | '.format(self.row_numbers[row])
             for col in range(8):
-                piece = self.pieces_dictionary.get('{}{}'.format(self.col_letters[col], self.row_numbers[row]))
+                piece = self.squares[row * 8 + col]
                 if piece is not None:
                     if USE_UNICODE:
                         string += str(piece) + ' \u2502 '
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the evaluation of the positions: the value of the pieces (material), plus a bonus or a penalty
+for the box of each piece (piece-square tables), for example a knight is worth more in the center than in a corner.
+The score of a position is the sum of the values of the pieces of a player, minus the sum of the values of the
+pieces of the opponent.
+
+To score many positions at once, evaluate_batch() encodes each position as 64 signed bytes (int8, see encode()),
+which the chessboard keeps up to date at each move (its piece_codes), then scores all of them with the NumPy library, by indexing a table of the value of each piece on each box: there is
+no Python loop over the boxes. NumPy is optional: without it, evaluate_batch() scores the positions one at a time.
+
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pychecs2.echecs.piece import Pawn, Knight, Bishop, Rook, Queen, King
+
+PIECE_TYPES = (Pawn, Knight, Bishop, Rook, Queen, King)
+
+# The value of the pieces, in hundredths of pawns.
+PIECE_VALUES = {Pawn: 100, Knight: 320, Bishop: 330, Rook: 500, Queen: 900, King: 0}
+
+# The bonus of each type of piece on each box, for a white piece, written as the chessboard is seen by white: the
+# first line is the row 8, the last line the row 1. The tables of the black pieces are the same, upside down.
+PIECE_SQUARE_BONUSES = {
+    Pawn: (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ),
+    Knight: (
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ),
+    Bishop: (
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ),
+    Rook: (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ),
+    Queen: (
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ),
+    King: (
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ),
+}
+
+
+def _square_values(piece_type, color):
+    """
+    Builds the value (material and bonus) of a piece on each of the 64 boxes, numbered as in the tables module.
+
+    """
+    bonuses = PIECE_SQUARE_BONUSES[piece_type]
+    values = []
+    for index in range(64):
+        row, col = index // 8, index % 8
+        # The line of the box in the table: the row 8 of white is the row 1 of black.
+        line = 7 - row if color == 'white' else row
+        values.append(PIECE_VALUES[piece_type] + bonuses[line * 8 + col])
+    return values
+
+
+# SQUARE_VALUES[piece][box]: the value of a piece (one of the shared instances of the piece module) on a box, for
+# its owner.
+SQUARE_VALUES = {piece_type(color): _square_values(piece_type, color)
+                 for piece_type in PIECE_TYPES for color in ('white', 'black')}
+
+# The code of a piece in the encoded positions: 1 to 6 for the white pieces, -1 to -6 for the black pieces, and 0
+# for an empty box.
+PIECE_CODES = {piece_type(color): sign * (number + 1)
+               for number, piece_type in enumerate(PIECE_TYPES) for color, sign in (('white', 1), ('black', -1))}
+PIECE_CODES[None] = 0
+
+# PIECE_BYTES[piece]: the code of a piece as an unsigned byte (two's complement), as kept by the chessboards in their
+# piece_codes, which are then read as int8.
+PIECE_BYTES = {piece: code & 0xff for piece, code in PIECE_CODES.items()}
+
+if numpy is not None:
+    # WEIGHTS[code + 6, box]: the value of the piece of this code on the box, from the point of view of white.
+    WEIGHTS = numpy.zeros((13, 64), dtype=numpy.int32)
+    for _piece, _code in PIECE_CODES.items():
+        if _piece is not None:
+            WEIGHTS[_code + 6] = SQUARE_VALUES[_piece] if _code > 0 else [-value for value in SQUARE_VALUES[_piece]]
+    del _piece, _code
+    BOXES = numpy.arange(64)
+
+
+def evaluate(board, color):
+    """
+    Evaluates a position from the point of view of a player: the value of the pieces of the player minus the value
+    of the pieces of the opponent, each piece being valued according to its box.
+
+    Args:
+        board (Chessboard): The chessboard.
+        color (str): The color of the player.
+
+    Returns:
+        int: The score of the position, in hundredths of pawns.
+
+    """
+    score = 0
+    for index, piece in enumerate(board.squares):
+        if piece is None:
+            continue
+        if piece.color == color:
+            score += SQUARE_VALUES[piece][index]
+        else:
+            score -= SQUARE_VALUES[piece][index]
+    return score
+
+
+def encode(board):
+    """
+    Encodes a position as 64 signed bytes, the code of the piece on each box (see PIECE_CODES).
+
+    Args:
+        board (Chessboard): The chessboard.
+
+    Returns:
+        ndarray: The codes, of type int8.
+
+    Raises:
+        ImportError: If NumPy is not installed.
+
+    """
+    return encode_batch([board])[0]
+
+
+def encode_batch(boards):
+    """
+    Encodes positions as an array of signed bytes, one line of 64 codes per position. The codes are kept by the
+    chessboards (piece_codes), so the positions are only joined, without a loop over the boxes.
+
+    Args:
+        boards (iterable): The chessboards.
+
+    Returns:
+        ndarray: The codes, of type int8 and of shape (number of positions, 64), read-only.
+
+    Raises:
+        ImportError: If NumPy is not installed.
+
+    """
+    if numpy is None:
+        raise ImportError("The encoding of the positions requires NumPy.")
+
+    data = b''.join([board.piece_codes for board in boards])
+    return numpy.frombuffer(data, dtype=numpy.int8).reshape(-1, 64)
+
+
+def evaluate_codes(codes, color='white'):
+    """
+    Scores encoded positions (see encode_batch()), all at once.
+
+    Args:
+        codes (ndarray): The codes of the positions, of shape (number of positions, 64).
+        color (str): The color of the player from whose point of view the positions are scored.
+
+    Returns:
+        ndarray: The score of each position, in hundredths of pawns.
+
+    """
+    scores = WEIGHTS[codes.astype(numpy.intp) + 6, BOXES].sum(axis=1)
+    return scores if color == 'white' else -scores
+
+
+def evaluate_batch(boards, color='white'):
+    """
+    Scores many positions from the point of view of a player, in the same way as evaluate().
+
+    Args:
+        boards (iterable): The chessboards.
+        color (str): The color of the player.
+
+    Returns:
+        ndarray or list: The score of each position, in hundredths of pawns: a NumPy array, or a list if NumPy is not
+            installed.
+
+    """
+    if numpy is None:
+        return [evaluate(board, color) for board in boards]
+    return evaluate_codes(encode_batch(boards), color)
@@ -4,7 +4,8 @@ This file contains a class containing information about a chess game,
 including a chess object (an instance of the Chess class).
 
 """
-from pychecs2.echecs.chess_board import Chessboard
+from pychecs2.echecs.chess_board import Chessboard, MoveException, other_color
+from pychecs2.echecs.search import Searcher, MAX_DEPTH
 
 class NoPieceInPosition(Exception):
     pass
@@ -20,19 +21,85 @@ class Game:
     Attributes:
         active_player (str): The color of the active player, 'white' or 'black'.
         chessboard (Chessboard): The chessboard on which the game takes place.
+        computer_color (str): The color played by the computer, 'white' or 'black', or None if both players
+            are humans.
+        searcher (Searcher): The search used by the computer to choose its moves, or None until the computer
+            plays its first move.
+        book (OpeningBook): The opening book consulted by the computer before searching, or None.
+        tablebases (Tablebases): The endgame tables consulted by the computer before searching, or None.
+        redo_stack (list): The moves undone by undo(), which can be played again by redo(), the next one at the
+            end. It is emptied when another move is played.
+
+    Args:
+        board_class (type): The class of the chessboard to create, Chessboard (the default) or a class offering
+            the same methods, such as BitboardChessboard.
+        computer_color (str): The color played by the computer, or None (the default) for two human players.
+        book (OpeningBook): The opening book of the computer, or None (the default) to always search.
+        tablebases (Tablebases): The endgame tables of the computer, or None (the default) to always search.
 
     """
-    def __init__(self):
+    def __init__(self, board_class=Chessboard, computer_color=None, book=None, tablebases=None):
+        # Creation of an instance of the Chessboard class, which will be manipulated in the methods of the class.
+        self.chess_board = board_class()
+
         # The player starting a game of chess is the white player.
         self.active_player = 'white'
 
-        # Creation of an instance of the Chessboard class, which will be manipulated in the methods of the class.
-        self.chess_board = Chessboard()
+        self.computer_color = computer_color
+        self.searcher = None
+        self.book = book
+        self.tablebases = tablebases
+        self.redo_stack = []
+
+    @property
+    def active_player(self):
+        # The active player is kept by the chessboard (side_to_move), so that the key of the position
+        # (chess_board.hash_key) depends on it.
+        return self.chess_board.side_to_move
+
+    @active_player.setter
+    def active_player(self, color):
+        self.chess_board.side_to_move = color
+
+    @classmethod
+    def from_fen(cls, fen, board_class=Chessboard, computer_color=None, book=None, tablebases=None):
+        """
+        Creates a game starting from a position in FEN notation.
+
+        Args:
+            fen (str): The position, for example 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1'. Its active
+                color is the active player of the game.
+            board_class (type): The class of the chessboard to create.
+            computer_color (str): The color played by the computer, or None for two human players.
+            book (OpeningBook): The opening book of the computer, or None to always search.
+            tablebases (Tablebases): The endgame tables of the computer, or None to always search.
+
+        Returns:
+            Game: The game.
+
+        Raises:
+            ValueError: If the position is not a valid FEN.
+
+        """
+        game = cls(board_class, computer_color, book, tablebases)
+        game.chess_board = board_class.from_fen(fen)
+        return game
+
+    def to_fen(self):
+        """
+        Returns the current position of the game in FEN notation, with the active player.
+
+        Returns:
+            str: The position.
+
+        """
+        return self.chess_board.to_fen()
 
     def determine_winner(self):
         """
         Determines the color of the winning player, if there is one. To determine if a player is the winner,
-        the king of the opponent's color must be absent from the chessboard.
+        the active player must be checkmated, or the king of the opponent's color must be absent from the
+        chessboard.
 
         Returns:
             str: white' if the white player won, 'black' if the black player won, and 'none' if no
@@ -43,18 +110,32 @@ class Game:
             return 'white'
         elif not self.chess_board.color_king_is_on_board('white'):
             return 'black'
+        elif self.chess_board.is_checkmate(self.active_player):
+            return other_color(self.active_player)
 
         return 'aucun'
 
+    def is_stalemate(self):
+        """
+        Checks if the game ends in a draw because the active player is stalemated: its king is not in check,
+        but none of its moves is valid.
+
+        Returns:
+            bool: True if the active player is stalemated, and False otherwise.
+
+        """
+        return self.chess_board.is_stalemate(self.active_player)
+
     def game_over(self):
         """
-        Checks if the game is over. A game is over if a winner can be declared.
+        Checks if the game is over. A game is over if a winner can be declared, or if the active player is
+        stalemated.
 
         Returns:
             bool: True if the game is over, and False otherwise.
 
         """
-        return self.determine_winner() != 'aucun'
+        return self.determine_winner() != 'aucun' or self.is_stalemate()
         #TODO: A supprimer
     def ask_positions(self):
         """
@@ -89,10 +170,100 @@ class Game:
             raise NoPieceInPosition("No piece at this location!")
         elif piece.color != self.active_player:
             raise WrongColorException("This piece does not belong to the active player.")
-        self.chess_board.move(source, target)
-        self.next_player()
+        elif not self.chess_board.is_move_valid(source, target):
+            raise MoveException("Invalid Move!")
+
+        # The move is recorded by the chessboard (push() also changes the active player), so that it can be undone.
+        self.chess_board.push((source, target))
+        self.redo_stack = []
+
+    def can_undo(self):
+        """
+        Checks if a move can be undone.
+
+        Returns:
+            bool: True if at least one move has been played, and False otherwise.
+
+        """
+        return bool(self.chess_board.undo_stack)
+
+    def undo(self):
+        """
+        Undoes the last move: the chessboard and the active player are put back as they were before it.
+
+        Returns:
+            tuple or None: The undone move, as a (source position, target position) tuple, or None if no move has
+                been played.
+
+        """
+        if not self.can_undo():
+            return None
+
+        move = self.chess_board.pop()
+        self.redo_stack.append(move)
+        return move
+
+    def redo(self):
+        """
+        Plays again the last move undone by undo().
+
+        Returns:
+            tuple or None: The move played again, as a (source position, target position) tuple, or None if there is
+                no move to play again.
+
+        """
+        # The undone moves no longer apply if the pieces have been replaced since (loading of a save...).
+        if not self.redo_stack or not self.chess_board.is_move_valid(*self.redo_stack[-1]):
+            self.redo_stack = []
+            return None
+
+        move = self.redo_stack.pop()
+        self.chess_board.push(move)
+        return move
+
+    def is_computer_turn(self):
+        """
+        Checks if the computer has to play.
 
+        Returns:
+            bool: True if the active player is played by the computer, and False otherwise.
+
+        """
+        return self.active_player == self.computer_color
 
+    def play_computer_move(self, max_time=None, max_nodes=None, max_depth=MAX_DEPTH):
+        """
+        Makes the computer choose and play the move of the active player: a move of the opening book or of the
+        endgame tables if the position is in them, and otherwise the best move found within a budget of time, of
+        searched positions or of depth (see the search module).
+
+        Args:
+            max_time (float): The maximum thinking time, in seconds, or None.
+            max_nodes (int): The maximum number of positions to search, or None.
+            max_depth (int): The maximum depth of the search, in moves.
+
+        Returns:
+            tuple or None: The move played, as a (source position, target position) tuple, and None if the active
+                player cannot move.
+
+        """
+        move = None
+        if self.book is not None:
+            move = self.book.choose_move(self.chess_board)
+        if move is None and self.tablebases is not None:
+            move = self.tablebases.best_move(self.chess_board)
+        if move is not None:
+            self.move(*move)
+            return move
+
+        # The transposition table of the search takes several megabytes: it is only created for the games where the
+        # computer plays, and not for the games which are only replayed (pgn and validation modules).
+        if self.searcher is None:
+            self.searcher = Searcher()
+        result = self.searcher.search(self.chess_board, self.active_player, max_depth, max_nodes, max_time)
+        if result.best_move is not None:
+            self.move(*result.best_move)
+        return result.best_move
 
     def next_player(self):
         """
@@ -118,9 +289,14 @@ class Game:
         while not self.game_over():
             print(self.chess_board)
             print("\nIt is the turn of {} to play".format(self.active_player))
+            if self.is_computer_turn():
+                print("The computer plays {}{}".format(*self.play_computer_move(max_time=5)))
+                continue
             source, cible = self.ask_positions()
-            self.chess_board.move(source, cible)
-            self.next_player()
+            self.move(source, cible)
 
         print(self.chess_board)
-        print("\nGame Over! \nThe {} player  won".format(self.determine_winner()))
+        if self.is_stalemate():
+            print("\nGame Over! \nStalemate, the game is a draw")
+        else:
+            print("\nGame Over! \nThe {} player  won".format(self.determine_winner()))
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the save format of the games: a snapshot of a position, followed by a journal of the moves played
+since this position. Saving a move only appends a few bytes at the end of the file (and waits for them to be written
+on the disk), so the game can be saved after each move, and a crash loses at most the move being written.
+
+A file contains, in order (integers in little endian):
+    - the header (HEADER): the characters b'PCS2', the version of the format, the side to move (0 for white, 1 for
+      black), the time allowed per move in seconds (0 if none), the number (0 to 2) and the clocks of the last moves
+      played before the snapshot (see the records below), the 64 boxes (one half byte per box, from a1 to h8, see
+      PIECE_CODES), and the number of taken pieces,
+    - the codes of the taken pieces, one byte per piece,
+    - the records of the journal (RECORD), 4 bytes each: the code of a move (see encode_move() of the transposition
+      module), or UNDO when the last move was undone, then the seconds left on the clock when the move was played
+      (NO_CLOCK if unknown).
+
+Loading a file replays the journal on the snapshot. The journal is emptied regularly (compaction): the file is then
+rewritten with a snapshot of the current position, which keeps the clocks of the last two moves, so that the player
+who has to play can resume with the time it had left.
+
+"""
+import os
+import struct
+from collections import namedtuple
+
+from pychecs2.echecs.chess_board import Chessboard, MoveException
+from pychecs2.echecs.game import Game, NoPieceInPosition, WrongColorException
+from pychecs2.echecs.piece import Pawn, Knight, Bishop, Rook, Queen, King
+from pychecs2.echecs.transposition import encode_move, decode_move
+
+MAGIC = b'PCS2'
+VERSION = 2
+
+HEADER = struct.Struct('<4sBBHBHH32sB')
+RECORD = struct.Struct('<HH')
+
+# The code of a record undoing the last move, and the clock of a record whose clock is unknown.
+UNDO = 0xffff
+NO_CLOCK = 0xffff
+
+# The journal is compacted once it contains this number of records.
+COMPACT_EVERY = 256
+
+# The code of a piece is 1 to 6 for the white pieces, and 9 to 14 for the black pieces (0 is an empty box).
+PIECE_TYPES = (Pawn, Knight, Bishop, Rook, Queen, King)
+PIECE_CODES = {(color, piece_type): offset + kind + 1
+               for color, offset in (('white', 0), ('black', 8)) for kind, piece_type in enumerate(PIECE_TYPES)}
+CODE_PIECES = {code: piece_type(color) for (color, piece_type), code in PIECE_CODES.items()}
+
+SavedGame = namedtuple('SavedGame', ['game', 'move_clock', 'clocks'])
+
+
+class SaveFileError(Exception):
+    pass
+
+
+def encode_clock(clock):
+    """
+    Encodes the seconds left on a clock, or None if unknown, as stored in the records and in the header.
+
+    """
+    return NO_CLOCK if clock is None else max(0, min(clock, NO_CLOCK - 1))
+
+
+def decode_clock(clock):
+    return None if clock == NO_CLOCK else clock
+
+
+def encode_snapshot(board, move_clock=0, clocks=()):
+    """
+    Encodes the header of a save: the position of a chessboard, with its side to move and its taken pieces.
+
+    Args:
+        board (Chessboard): The chessboard.
+        move_clock (int): The time allowed per move, in seconds (0 if none).
+        clocks (list): The seconds left on the clock when the moves before the position were played (None if
+            unknown), the last one at the end. Only the last two are kept.
+
+    Returns:
+        bytes: The encoded snapshot.
+
+    """
+    codes = [PIECE_CODES[piece.color, piece.__class__] if piece is not None else 0 for piece in board.squares]
+    boxes = bytes(codes[index] | codes[index + 1] << 4 for index in range(0, 64, 2))
+    taken = bytes(PIECE_CODES[piece.color, piece.__class__] for piece in board.taken_pieces[:255])
+    side = 0 if board.side_to_move == 'white' else 1
+    last_clocks = [encode_clock(clock) for clock in list(clocks)[-2:]]
+    n_clocks = len(last_clocks)
+    last_clocks += [NO_CLOCK] * (2 - n_clocks)
+    return HEADER.pack(MAGIC, VERSION, side, min(move_clock, 0xffff), n_clocks, *last_clocks, boxes,
+                       len(taken)) + taken
+
+
+def decode_snapshot(data, board_class=Chessboard):
+    """
+    Decodes the header of a save.
+
+    Args:
+        data (bytes): The content of the file.
+        board_class (type): The class of the chessboard to create.
+
+    Returns:
+        Chessboard, int, list, int: The chessboard (with its side to move and taken pieces), the time allowed per
+            move, the clocks of the last moves before the position (None if unknown), and the size of the snapshot
+            in bytes (where the journal begins).
+
+    Raises:
+        SaveFileError: If the data is not a save of a supported version.
+
+    """
+    if len(data) < HEADER.size:
+        raise SaveFileError("The save is truncated.")
+
+    magic, version, side, move_clock, n_clocks, clock_1, clock_2, boxes, n_taken = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise SaveFileError("This file is not a save of a game.")
+    if version != VERSION:
+        raise SaveFileError("Unsupported save version: {}".format(version))
+    if len(data) < HEADER.size + n_taken:
+        raise SaveFileError("The save is truncated.")
+    if n_clocks > 2:
+        raise SaveFileError("Invalid clocks in the save.")
+
+    try:
+        pieces = {}
+        for index in range(64):
+            code = boxes[index // 2] >> (4 * (index % 2)) & 0xf
+            if code:
+                pieces[index] = CODE_PIECES[code]
+        taken = [CODE_PIECES[code] for code in data[HEADER.size:HEADER.size + n_taken]]
+    except KeyError:
+        raise SaveFileError("Invalid piece in the save.")
+
+    board = board_class()
+    board.clear_board()
+    for index, piece in pieces.items():
+        board.put_piece(index, piece)
+    board.taken_pieces = taken
+    board.side_to_move = 'white' if side == 0 else 'black'
+    clocks = [decode_clock(clock) for clock in (clock_1, clock_2)[:n_clocks]]
+    return board, move_clock, clocks, HEADER.size + n_taken
+
+
+def load_game(path, board_class=Chessboard):
+    """
+    Loads a saved game: the position of the snapshot, then the moves of the journal, which are checked and played
+    again (so that they can be undone). A last record only partly written (interrupted save) is ignored.
+
+    Args:
+        path (str): The path of the save.
+        board_class (type): The class of the chessboard of the game.
+
+    Returns:
+        SavedGame: The game, the time allowed per move (0 if none), and the seconds left on the clock when the last
+            two moves before the snapshot and each move of the journal still played were played (None if unknown).
+
+    Raises:
+        SaveFileError: If the file is not a valid save.
+        OSError: If the file cannot be read.
+
+    """
+    with open(path, 'rb') as save_file:
+        data = save_file.read()
+
+    board, move_clock, clocks, offset = decode_snapshot(data, board_class)
+    game = Game(board_class)
+    game.chess_board = board
+
+    end = offset + (len(data) - offset) // RECORD.size * RECORD.size
+    for code, clock in RECORD.iter_unpack(data[offset:end]):
+        if code == UNDO:
+            if game.undo() is None:
+                raise SaveFileError("The journal undoes a move which was not played.")
+            clocks.pop()
+            continue
+
+        if code == 0 or code > 64 * 64:
+            raise SaveFileError("Invalid move in the journal.")
+        move = decode_move(code)
+        try:
+            game.move(*move)
+        except (NoPieceInPosition, WrongColorException, MoveException) as error:
+            raise SaveFileError("Invalid move in the journal: {}{} ({})".format(move[0], move[1], error))
+        clocks.append(decode_clock(clock))
+
+    return SavedGame(game, move_clock, clocks)
+
+
+class GameJournal:
+    """
+    The save of a game, updated after each move. The journal starts with a snapshot of the current position of the
+    game (start()), then the moves and undos are recorded as they are played (record_move(), record_undo()).
+
+    Attributes:
+        path (str): The path of the save.
+        game (Game): The saved game.
+        move_clock (int): The time allowed per move, in seconds (0 if none), stored in the snapshot.
+        compact_every (int): The number of records after which the journal is compacted (0 to never compact).
+        records (int): The number of records in the journal.
+        undoable (int): The number of moves of the journal which can be undone (played and not undone).
+        clocks (list): The seconds left on the clock when each move was played (None if unknown), before and after
+            the snapshot, the last one at the end. The last two are kept in the snapshot by compact().
+
+    Args:
+        path (str): The path of the save.
+        game (Game): The game to save.
+        move_clock (int): The time allowed per move, in seconds (0 if none).
+        compact_every (int): The number of records after which the journal is compacted.
+
+    """
+    def __init__(self, path, game, move_clock=0, compact_every=COMPACT_EVERY):
+        self.path = path
+        self.game = game
+        self.move_clock = move_clock
+        self.compact_every = compact_every
+        self.records = 0
+        self.undoable = 0
+        self.clocks = []
+        self.file = None
+
+    def is_started(self):
+        """
+        Checks if the journal has been started (and not closed).
+
+        Returns:
+            bool: True if the moves are being recorded, and False otherwise.
+
+        """
+        return self.file is not None
+
+    def start(self, board=None, clocks=()):
+        """
+        Writes a snapshot of the current position of the game, replacing the previous save, and starts recording
+        the moves after it.
+
+        Args:
+            board (Chessboard): The position of the snapshot, if not the current position of the game, for example
+                the position before the move which has just been played, so that this move is recorded too.
+            clocks (list): The seconds left on the clock when the moves before the snapshot were played (None if
+                unknown), for example the clocks of a loaded game. By default, they are unknown (a new game).
+
+        """
+        clocks = list(clocks)
+        self.close()
+
+        # The new save is written next to the old one, then replaces it: an interrupted write leaves the old save.
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'wb') as save_file:
+            save_file.write(encode_snapshot(board if board is not None else self.game.chess_board, self.move_clock,
+                                            clocks))
+            save_file.flush()
+            os.fsync(save_file.fileno())
+        os.replace(temporary_path, self.path)
+        sync_directory(self.path)
+
+        self.file = open(self.path, 'ab')
+        self.records = 0
+        self.undoable = 0
+        self.clocks = clocks
+
+    def compact(self):
+        """
+        Rewrites the save as a snapshot of the current position, with an empty journal. The clocks of the moves
+        are kept.
+
+        """
+        self.start(clocks=self.clocks)
+
+    def record_move(self, move, clock=None):
+        """
+        Records a move which has just been played in the game.
+
+        Args:
+            move (tuple): The move, as a (source position, target position) tuple.
+            clock (int): The seconds left on the clock when the move was played, or None.
+
+        """
+        self.append(encode_move(move), clock)
+        self.clocks.append(clock)
+        self.undoable += 1
+        self.compact_if_needed()
+
+    def record_undo(self):
+        """
+        Records that the last move of the game has just been undone.
+
+        """
+        if self.clocks:
+            self.clocks.pop()
+
+        # A move played before the snapshot is not in the journal: the snapshot is rewritten instead.
+        if self.undoable == 0:
+            self.compact()
+            return
+
+        self.append(UNDO, None)
+        self.undoable -= 1
+        self.compact_if_needed()
+
+    def append(self, code, clock):
+        """
+        Appends a record at the end of the journal, and waits for it to be written on the disk.
+
+        """
+        if self.file is None:
+            raise SaveFileError("The journal has not been started.")
+
+        self.file.write(RECORD.pack(code, encode_clock(clock)))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.records += 1
+
+    def compact_if_needed(self):
+        if self.compact_every and self.records >= self.compact_every:
+            self.compact()
+
+    def close(self):
+        """
+        Stops recording the moves. The save stays on the disk.
+
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def sync_directory(path):
+    """
+    Waits for the directory of a file to be written on the disk, so that a file just renamed is not lost in a crash
+    (not possible on Windows, where it is not needed).
+
+    """
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+
+    descriptor = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
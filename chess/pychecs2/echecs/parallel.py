@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a parallel version of the search of the search module. The threads of a Python process share a
+single core (because of the GIL), so the search is spread over several processes instead.
+
+It follows the "Lazy SMP" scheme: all the processes search the same position, and share their analyses through a
+single transposition table placed in shared memory (written without lock, see the transposition module). A process
+thus often finds in the table the positions already searched by the others, and goes deeper in the same time. The
+main search is run in the calling process, and the helpers in a pool of processes; half of the helpers start one
+move deeper, so that they do not all search the same positions at the same time. When the main search is finished,
+the helpers are stopped, and the deepest result is kept (the one of the main search in case of a tie).
+
+The scaling with the number of processes is measured from the folder containing the pychecs2 package, e.g.:
+
+    python -m pychecs2.echecs.parallel --threads 1 2 4 --depth 5
+    python -m pychecs2.echecs.parallel --threads 8 --time 10 --fen "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10"
+
+"""
+import argparse
+import multiprocessing
+import time
+
+from pychecs2.echecs.chess_board import INITIAL_FEN
+from pychecs2.echecs.perft import BOARD_CLASSES
+from pychecs2.echecs.search import Searcher, MAX_DEPTH
+from pychecs2.echecs.transposition import TranspositionTable, table_bytes
+
+# The searcher of a helper process, created by _init_helper() when the process starts.
+_helper_searcher = None
+
+# The time given to the helpers to return their result once stopped, in seconds.
+HELPER_STOP_TIME = 1.0
+
+
+def _init_helper(memory, size_mb, stop_event):
+    """
+    Creates the searcher of a helper process, on the shared transposition table.
+
+    """
+    global _helper_searcher
+    _helper_searcher = Searcher(TranspositionTable(size_mb, buffer=memory))
+    _helper_searcher.stop_event = stop_event
+
+
+def _helper_search(board, color, max_depth, max_nodes, max_time, start_depth, age):
+    """
+    Runs the search of a helper process, at the age of the main search.
+
+    """
+    return _helper_searcher.search(board, color, max_depth, max_nodes, max_time, start_depth, age)
+
+
+class ParallelSearcher:
+    """
+    A search of the best move spread over several processes, which can replace a Searcher (its search() method
+    takes the same arguments and returns a result of the same type).
+
+    Attributes:
+        threads (int): The number of processes searching, including the calling process.
+        table (TranspositionTable): The transposition table, shared by all the processes.
+
+    Args:
+        threads (int): The number of processes to use. By default, the number of cores of the machine.
+        size_mb (float): The memory of the shared transposition table, in megabytes.
+
+    """
+    def __init__(self, threads=None, size_mb=16):
+        self.threads = max(1, threads if threads is not None else multiprocessing.cpu_count())
+        self.memory = multiprocessing.RawArray('B', table_bytes(size_mb))
+        self.table = TranspositionTable(size_mb, buffer=self.memory)
+        self.searcher = Searcher(self.table)
+        self.stop_event = multiprocessing.Event()
+        self.pool = None
+        if self.threads > 1:
+            self.pool = multiprocessing.Pool(self.threads - 1, _init_helper, (self.memory, size_mb, self.stop_event))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        """
+        Stops the helper processes.
+
+        """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def search(self, board, color, max_depth=MAX_DEPTH, max_nodes=None, max_time=None):
+        """
+        Searches the best move of a player with all the processes.
+
+        Args:
+            board (Chessboard): The chessboard, which is not modified.
+            color (str): The color of the player who has to play.
+            max_depth (int): The maximum depth of the search, in moves.
+            max_nodes (int): The maximum number of positions to search by each process, or None.
+            max_time (float): The maximum duration of the search, in seconds, or None.
+
+        Returns:
+            SearchResult: The best move, its score and the depth reached by the deepest search, and the number of
+                positions searched by all the processes.
+
+        """
+        self.stop_event.clear()
+        # Each process has its own copy of the table, so the age of the search is chosen here and given to all.
+        self.table.new_search()
+        age = self.table.age
+        helpers = []
+        if self.pool is not None:
+            helpers = [self.pool.apply_async(_helper_search, (board, color, max_depth, max_nodes, max_time,
+                                                              1 + number % 2, age))
+                       for number in range(1, self.threads)]
+
+        result = self.searcher.search(board, color, max_depth, max_nodes, max_time, age=age)
+
+        # The helpers stop at their next check of the stop event, and cannot search longer than max_time: a helper
+        # which has not returned by then is left out of the result.
+        self.stop_event.set()
+        deadline = time.perf_counter() + max(HELPER_STOP_TIME, max_time or 0)
+        nodes = result.nodes
+        for helper in helpers:
+            try:
+                helper_result = helper.get(max(0, deadline - time.perf_counter()))
+            except multiprocessing.TimeoutError:
+                continue
+            nodes += helper_result.nodes
+            if helper_result.best_move is not None and helper_result.depth > result.depth:
+                result = helper_result._replace(elapsed=result.elapsed)
+
+        return result._replace(nodes=nodes)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Measures the scaling of the parallel search.")
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, multiprocessing.cpu_count()],
+                        help="numbers of processes to compare (default: 1 and the number of cores)")
+    parser.add_argument('--depth', type=int, default=4, help="depth to search (default: 4)")
+    parser.add_argument('--time', type=float, default=None,
+                        help="search for a fixed time, in seconds, instead of a fixed depth")
+    parser.add_argument('--fen', default=INITIAL_FEN, help="position to search (default: the initial position)")
+    parser.add_argument('--board', choices=sorted(BOARD_CLASSES), default='dict',
+                        help="chessboard implementation to use (default: dict)")
+    parser.add_argument('--hash', type=float, default=16, help="size of the transposition table, in MB (default: 16)")
+    args = parser.parse_args(arguments)
+
+    board = BOARD_CLASSES[args.board].from_fen(args.fen)
+    max_depth = MAX_DEPTH if args.time is not None else args.depth
+
+    print('{:>7} {:>5} {:>6} {:>10} {:>9} {:>12} {:>8}'.format(
+        'threads', 'depth', 'move', 'nodes', 'time (s)', 'nodes/s', 'speedup'))
+    reference = None
+    for threads in args.threads:
+        with ParallelSearcher(threads, args.hash) as searcher:
+            start = time.perf_counter()
+            result = searcher.search(board, board.side_to_move, max_depth, max_time=args.time)
+            elapsed = time.perf_counter() - start
+
+        # With a fixed depth, the speedup is the ratio of the times; with a fixed time, the ratio of the speeds.
+        measure = 1 / elapsed if args.time is None else result.nodes / elapsed
+        reference = reference or measure
+        print('{:>7} {:>5} {:>6} {:>10} {:>9.2f} {:>12.0f} {:>7.2f}x'.format(
+            threads, result.depth, ''.join(result.best_move or ('-',)), result.nodes, elapsed,
+            result.nodes / max(elapsed, 1e-9), measure / reference))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
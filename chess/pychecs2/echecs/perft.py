@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a "perft" (performance test) of the rules of the game: it counts all the sequences of valid
+moves of a given depth from a position. Comparing the counts with known values checks the generation of the moves,
+and the time taken measures its speed, in nodes (positions) per second.
+
+It is run from the folder containing the pychecs2 package, for example:
+
+    python -m pychecs2.echecs.perft --depth 4
+    python -m pychecs2.echecs.perft --depth 2 --divide --fen "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"
+    python -m pychecs2.echecs.perft --suite --board bitboard
+
+"""
+import argparse
+import time
+
+from pychecs2.echecs.chess_board import Chessboard, INITIAL_FEN, other_color
+from pychecs2.echecs.bitboard import BitboardChessboard
+
+BOARD_CLASSES = {'dict': Chessboard, 'bitboard': BitboardChessboard}
+
+# Reference positions, with their known number of nodes for each depth (from 1). The chessboard does not implement
+# castling, en passant nor promotion, so only the published counts of the depths where none of these moves can occur
+# are kept.
+REFERENCE_POSITIONS = [
+    ('initial', INITIAL_FEN, [20, 400, 8902, 197281]),
+    ('endgame', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', [14, 191]),
+    ('middlegame', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10', [46, 2079, 89890]),
+]
+
+def perft(board, color, depth):
+    """
+    Counts the sequences of valid moves of a given depth, starting with a move of a color.
+
+    Args:
+        board (Chessboard): The chessboard, on which the moves are played and undone (it is unchanged at the end).
+        color (str): The color of the player who has to play.
+        depth (int): The number of moves of the sequences.
+
+    Returns:
+        int: The number of sequences, i.e. of positions (nodes) reached at this depth.
+
+    """
+    if depth == 0:
+        return 1
+
+    # At the last move, the moves are only counted: a chessboard can count them without building them.
+    if depth == 1:
+        return board.count_moves(color)
+
+    moves = board.generate_all_moves(color)
+
+    # Each move is played, then undone, on the same chessboard.
+    nodes = 0
+    for move in moves:
+        board.push(move)
+        nodes += perft(board, other_color(color), depth - 1)
+        board.pop()
+    return nodes
+
+
+def divide(board, color, depth):
+    """
+    Counts the sequences of valid moves of a given depth separately for each first move. Comparing these counts with
+    those of another program finds the move whose sub-tree is wrong.
+
+    Args:
+        board (Chessboard): The chessboard, on which the moves are played and undone (it is unchanged at the end).
+        color (str): The color of the player who has to play.
+        depth (int): The number of moves of the sequences, at least 1.
+
+    Returns:
+        list: A list of ((source position, target position), number of nodes) tuples, empty if the depth is less
+            than 1 (there is no first move).
+
+    """
+    if depth < 1:
+        return []
+
+    counts = []
+    for move in board.generate_all_moves(color):
+        board.push(move)
+        counts.append((move, perft(board, other_color(color), depth - 1)))
+        board.pop()
+    return counts
+
+
+def run_suite(board_class, max_depth):
+    """
+    Runs the perft of the reference positions, up to a maximum depth, and displays the results.
+
+    Args:
+        board_class (type): The class of the chessboard to test.
+        max_depth (int): The maximum depth to test.
+
+    Returns:
+        bool: True if all the counts are the expected ones, and False otherwise.
+
+    """
+    success = True
+    for name, fen, expected_counts in REFERENCE_POSITIONS:
+        for depth, expected in enumerate(expected_counts[:max_depth], 1):
+            board = board_class.from_fen(fen)
+            start = time.perf_counter()
+            nodes = perft(board, board.side_to_move, depth)
+            elapsed = time.perf_counter() - start
+            status = 'ok' if nodes == expected else 'FAILED (expected {})'.format(expected)
+            print('{:<12} depth {}: {:>10} nodes {:>12.0f} nodes/s  {}'.format(
+                name, depth, nodes, nodes / max(elapsed, 1e-9), status))
+            success = success and nodes == expected
+    return success
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Counts the positions reachable from a position (perft).")
+    parser.add_argument('--depth', type=int, default=3, help="number of moves to play (default: 3)")
+    parser.add_argument('--fen', default=INITIAL_FEN, help="starting position (default: the initial position)")
+    parser.add_argument('--board', choices=sorted(BOARD_CLASSES), default='dict',
+                        help="chessboard implementation to test (default: dict)")
+    parser.add_argument('--divide', action='store_true', help="display the count of each first move")
+    parser.add_argument('--suite', action='store_true',
+                        help="check the reference positions up to --depth instead of a single position")
+    args = parser.parse_args(arguments)
+    if args.depth < 0:
+        parser.error("--depth must be at least 0")
+    if args.divide and args.depth < 1:
+        parser.error("--divide needs a --depth of at least 1")
+
+    board_class = BOARD_CLASSES[args.board]
+    if args.suite:
+        return 0 if run_suite(board_class, args.depth) else 1
+
+    board = board_class.from_fen(args.fen)
+    color = board.side_to_move
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(board, color, args.depth)
+        for (source, target), nodes in counts:
+            print('{}{}: {}'.format(source, target, nodes))
+        nodes = sum(nodes for _, nodes in counts)
+        print()
+    else:
+        nodes = perft(board, color, args.depth)
+    elapsed = time.perf_counter() - start
+
+    print('Nodes: {}'.format(nodes))
+    print('Time: {:.3f} s'.format(elapsed))
+    print('Nodes per second: {:.0f}'.format(nodes / max(elapsed, 1e-9)))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the reading and the writing of games in PGN notation (Portable Game Notation), the format of the
+chess databases. A PGN file is a list of games, each made of headers (lines such as [White "Kasparov, Garry"]),
+then of the moves in SAN notation (Standard Algebraic Notation, such as 1. e4 e5 2. Nf3 Nc6), ending with the result.
+
+The files can contain millions of games, so they are not loaded in memory: read_games() maps the file in memory
+(mmap), lets the system load its pages as they are read, and yields the games one at a time. The headers of a game
+are only decoded when they are read (PgnGame.headers), and with headers_only=True, the moves are not even copied, so
+that a database can be indexed quickly (the offset of each game can then be given to read_games() to read it
+completely).
+
+The chessboard does not implement castling, en passant nor promotion: a game containing one of these moves cannot
+be replayed (PgnError).
+
+"""
+import mmap
+import re
+import textwrap
+
+from pychecs2.echecs.chess_board import Chessboard, INITIAL_FEN
+from pychecs2.echecs.game import Game
+from pychecs2.echecs.piece import Pawn, Knight, Bishop, Rook, Queen, King
+from pychecs2.echecs.tables import SQUARE_INDEX, SQUARE_NAMES
+
+# The letters of the pieces in SAN notation (a move without letter is a move of a pawn).
+PIECE_LETTERS = {Knight: 'N', Bishop: 'B', Rook: 'R', Queen: 'Q', King: 'K'}
+SAN_PIECES = {letter: piece_type for piece_type, letter in PIECE_LETTERS.items()}
+
+# The tags written first, in this order, by every PGN file (the "Seven Tag Roster"), with their value if unknown.
+SEVEN_TAG_ROSTER = (('Event', '?'), ('Site', '?'), ('Date', '????.??.??'), ('Round', '?'), ('White', '?'),
+                    ('Black', '?'), ('Result', '*'))
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+HEADER_PATTERN = re.compile(rb'\[\s*([A-Za-z0-9_]+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN_PATTERN = re.compile(r'\{[^}]*\}?|;[^\n]*|[()]|\$\d+|[^\s(){};]+')
+MOVE_NUMBER_PATTERN = re.compile(r'^\d+\.*')
+SAN_PATTERN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(=?[NBRQ])?[+#]?[!?]*$')
+
+# The longest line written in the moves of a game.
+LINE_LENGTH = 79
+
+
+class PgnError(Exception):
+    pass
+
+
+class PgnGame:
+    """
+    A game read from a PGN file.
+
+    Attributes:
+        offset (int): The position of the game in the file, in bytes.
+        header_text (bytes): The headers of the game, as written in the file.
+        movetext (bytes): The moves of the game, as written in the file, or None if only the headers were read.
+
+    """
+    __slots__ = ('offset', 'header_text', 'movetext', 'parsed_headers')
+
+    def __init__(self, offset, header_text, movetext=None):
+        self.offset = offset
+        self.header_text = header_text
+        self.movetext = movetext
+        self.parsed_headers = None
+
+    def __repr__(self):
+        return '<PgnGame at {}: {} - {}>'.format(self.offset, self.headers.get('White', '?'),
+                                                 self.headers.get('Black', '?'))
+
+    @property
+    def headers(self):
+        """
+        The headers of the game, decoded the first time they are read.
+
+        Returns:
+            dict: The value of each tag, for example {'White': 'Kasparov, Garry', 'Result': '1-0', ...}.
+
+        """
+        if self.parsed_headers is None:
+            self.parsed_headers = {
+                tag.decode('ascii'): re.sub(r'\\(.)', r'\1', value.decode('utf-8', 'replace'))
+                for tag, value in HEADER_PATTERN.findall(self.header_text)
+            }
+        return self.parsed_headers
+
+    def san_moves(self):
+        """
+        Reads the moves of the game, without the move numbers, comments, variations and annotations.
+
+        Returns:
+            list: The moves, in SAN notation (for example ['e4', 'e5', 'Nf3']).
+
+        Raises:
+            PgnError: If only the headers of the game were read.
+
+        """
+        if self.movetext is None:
+            raise PgnError("Only the headers of the game were read.")
+
+        moves = []
+        depth = 0
+        for token in TOKEN_PATTERN.findall(self.movetext.decode('utf-8', 'replace')):
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth = max(0, depth - 1)
+            elif depth or token[0] in '{;$' or token in RESULTS:
+                continue
+            else:
+                token = MOVE_NUMBER_PATTERN.sub('', token)
+                if token:
+                    moves.append(token)
+        return moves
+
+    def replay(self, board_class=Chessboard):
+        """
+        Plays the moves of the game, from the initial position or the position of its FEN tag.
+
+        Args:
+            board_class (type): The class of the chessboard of the game.
+
+        Returns:
+            Game: The game, after its last move (its moves can be undone).
+
+        Raises:
+            PgnError: If a move is invalid, or cannot be played with the rules of the chessboard.
+
+        """
+        game = self.initial_game(board_class)
+        self.play_moves(game)
+        return game
+
+    def initial_game(self, board_class=Chessboard):
+        """
+        Creates the game at the position of its first move: the initial position, or the position of its FEN tag.
+
+        Args:
+            board_class (type): The class of the chessboard of the game.
+
+        Returns:
+            Game: The game, without moves.
+
+        Raises:
+            PgnError: If the FEN tag is not a valid position.
+
+        """
+        fen = self.headers.get('FEN')
+        try:
+            return Game.from_fen(fen, board_class) if fen else Game(board_class)
+        except ValueError as error:
+            raise PgnError(str(error))
+
+    def play_moves(self, game):
+        """
+        Plays the moves of the game in a game created by initial_game(). When a move is invalid, the moves before it
+        stay played.
+
+        Args:
+            game (Game): The game.
+
+        Raises:
+            PgnError: If a move is invalid, or cannot be played with the rules of the chessboard.
+
+        """
+        for number, san in enumerate(self.san_moves()):
+            try:
+                move = decode_san(game.chess_board, san)
+            except PgnError as error:
+                raise PgnError("Half-move {}: {}".format(number + 1, error))
+            game.chess_board.push(move)
+
+
+def read_games(path, headers_only=False, start=0):
+    """
+    Reads the games of a PGN file, one at a time.
+
+    Args:
+        path (str): The path of the file.
+        headers_only (bool): If True, only the headers of the games are read, which is much faster.
+        start (int): The offset where the reading starts, for example the offset of a game (PgnGame.offset) found
+            by a previous reading.
+
+    Yields:
+        PgnGame: The games, in the order of the file.
+
+    Raises:
+        OSError: If the file cannot be read.
+
+    """
+    with open(path, 'rb') as pgn_file:
+        try:
+            data = mmap.mmap(pgn_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # An empty file cannot be mapped.
+            return
+
+        try:
+            for offset, headers_end, end in game_spans(data, start):
+                yield PgnGame(offset, data[offset:headers_end], None if headers_only else data[headers_end:end])
+        finally:
+            data.close()
+
+
+def game_spans(data, start=0):
+    """
+    Finds the games of the content of a PGN file. A game starts with its headers, on consecutive lines starting with
+    '[', and its moves continue until the next line starting with '[', which is searched by data.find() without
+    looking at the moves.
+
+    Args:
+        data (bytes): The content of the file (or a mmap of the file).
+        start (int): The offset where the search starts.
+
+    Yields:
+        tuple: The offset of the start of a game, of the end of its headers, and of its end.
+
+    """
+    size = len(data)
+    position = 3 if start == 0 and data[:3] == b'\xef\xbb\xbf' else start
+    while position < size:
+        while position < size and data[position] in b' \t\r\n':
+            position += 1
+        if position == size:
+            return
+
+        offset = position
+        while data[position:position + 1] == b'[':
+            line_end = data.find(b'\n', position)
+            position = size if line_end < 0 else line_end + 1
+
+        headers_end = position
+        next_game = data.find(b'\n[', position)
+        position = size if next_game < 0 else next_game + 1
+        yield offset, headers_end, position
+
+
+def decode_san(board, san):
+    """
+    Converts a move in SAN notation into a move of the chessboard, for the side to move.
+
+    Args:
+        board (Chessboard): The chessboard, before the move.
+        san (str): The move, for example 'e4', 'Nbd7', 'exd5' or 'Qh4#'.
+
+    Returns:
+        tuple: The move, as a (source position, target position) tuple.
+
+    Raises:
+        PgnError: If the move is invalid, ambiguous or cannot be played with the rules of the chessboard.
+
+    """
+    match = SAN_PATTERN.match(san)
+    if match is None:
+        if san.startswith(('O-O', '0-0')):
+            raise PgnError("Castling is not supported by the rules of the chessboard: {}".format(san))
+        raise PgnError("Invalid move: {}".format(san))
+
+    letter, source_column, source_row, capture, target, promotion = match.groups()
+    if promotion:
+        raise PgnError("Promotion is not supported by the rules of the chessboard: {}".format(san))
+
+    # The x of a capture must match the target box: a piece of the opponent to take, or an empty box.
+    color = board.side_to_move
+    target_piece = board.get_piece_from_position(target)
+    if capture and (target_piece is None or target_piece.color == color):
+        raise PgnError("Invalid capture: {}".format(san))
+    if not capture and target_piece is not None:
+        raise PgnError("Capture without x: {}".format(san))
+
+    piece_type = SAN_PIECES[letter] if letter else Pawn
+    if piece_type is Pawn:
+        # A pawn push stays on its column, and a pawn capture is written with the column of the pawn.
+        if capture and source_column is None:
+            raise PgnError("Pawn capture without its column: {}".format(san))
+        source_column = source_column if capture else target[0]
+
+    sources = []
+    for index in board.boxes_of(piece_type(color)):
+        source = SQUARE_NAMES[index]
+        if ((source_column is None or source[0] == source_column) and (source_row is None or source[1] == source_row)
+                and board.is_move_valid(source, target)):
+            sources.append(source)
+
+    if len(sources) != 1:
+        raise PgnError("{} move: {}".format('Invalid' if not sources else 'Ambiguous', san))
+    return sources[0], target
+
+
+def encode_san(board, move):
+    """
+    Converts a move of the chessboard into SAN notation.
+
+    Args:
+        board (Chessboard): The chessboard, before the move, which is played and undone to know if it gives check.
+        move (tuple): The move, as a (source position, target position) tuple.
+
+    Returns:
+        str: The move in SAN notation, for example 'Nbd7', 'exd5' or 'Qh4#'.
+
+    """
+    source, target = move
+    squares = board.squares
+    piece = squares[SQUARE_INDEX[source]]
+    capture = 'x' if squares[SQUARE_INDEX[target]] is not None else ''
+
+    if piece.__class__ is Pawn:
+        san = (source[0] + capture if capture else '') + target
+    else:
+        # The source is written when other pieces of the same type can move to the same box: its column if it is
+        # enough to distinguish them, else its row, else both.
+        others = [SQUARE_NAMES[index] for index in board.boxes_of(piece)
+                  if index != SQUARE_INDEX[source] and board.is_move_valid(SQUARE_NAMES[index], target)]
+        if not others:
+            disambiguation = ''
+        elif all(other[0] != source[0] for other in others):
+            disambiguation = source[0]
+        elif all(other[1] != source[1] for other in others):
+            disambiguation = source[1]
+        else:
+            disambiguation = source
+        san = PIECE_LETTERS[piece.__class__] + disambiguation + capture + target
+
+    board.push(move)
+    opponent = board.side_to_move
+    if board.is_checkmate(opponent):
+        san += '#'
+    elif board.is_in_check(opponent):
+        san += '+'
+    board.pop()
+    return san
+
+
+def game_result(game):
+    """
+    Returns the result of a game in PGN notation: '1-0' if white won, '0-1' if black won, '1/2-1/2' for a draw,
+    and '*' if the game is not over.
+
+    """
+    winner = game.determine_winner()
+    if winner == 'white':
+        return '1-0'
+    elif winner == 'black':
+        return '0-1'
+    elif game.is_stalemate():
+        return '1/2-1/2'
+    return '*'
+
+
+def game_to_pgn(game, headers=None):
+    """
+    Writes the moves played in a game (those which can be undone) in PGN notation.
+
+    Args:
+        game (Game): The game, which is not modified.
+        headers (dict): The tags of the game, for example {'White': 'Alice', 'Black': 'Bob'}. The missing tags of the
+            Seven Tag Roster are written as unknown, and the result is the one of the game.
+
+    Returns:
+        str: The game in PGN notation, ending with an empty line.
+
+    """
+    moves = [entry[:2] for entry in game.chess_board.undo_stack]
+    board = game.chess_board.copy()
+    for _ in moves:
+        board.pop()
+
+    tags = dict(SEVEN_TAG_ROSTER)
+    tags.update(headers or {})
+    tags['Result'] = game_result(game)
+    fen = board.to_fen()
+    if fen != INITIAL_FEN:
+        tags['SetUp'] = '1'
+        tags['FEN'] = fen
+
+    words = []
+    move_number = 1
+    for move in moves:
+        if board.side_to_move == 'white':
+            words.append('{}.'.format(move_number))
+        elif not words:
+            words.append('{}...'.format(move_number))
+        words.append(encode_san(board, move))
+        board.push(move)
+        if board.side_to_move == 'white':
+            move_number += 1
+    words.append(tags['Result'])
+
+    lines = ['[{} "{}"]'.format(tag, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+             for tag, value in tags.items()]
+    return '\n'.join(lines) + '\n\n' + textwrap.fill(' '.join(words), LINE_LENGTH) + '\n\n'
+
+
+def write_games(path, games, mode='w'):
+    """
+    Writes games in a PGN file, one at a time.
+
+    Args:
+        path (str): The path of the file.
+        games (iterable): The games, as Game instances or (Game, headers) tuples (see game_to_pgn()).
+        mode (str): 'w' to replace the file, 'a' to add the games at its end.
+
+    Returns:
+        int: The number of games written.
+
+    """
+    count = 0
+    with open(path, mode, encoding='utf-8', newline='\n') as pgn_file:
+        for game in games:
+            game, headers = game if isinstance(game, tuple) else (game, None)
+            pgn_file.write(game_to_pgn(game, headers))
+            count += 1
+    return count
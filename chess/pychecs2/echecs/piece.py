@@ -3,6 +3,9 @@
 File containing the base Piece class, as well as a child class for each of the type of pieces in the chess game.
 
 """
+from pychecs2.echecs.tables import SQUARE_INDEX, KNIGHT_TARGETS, KING_TARGETS, ROOK_TARGETS, BISHOP_TARGETS, \
+    QUEEN_TARGETS, PAWN_PUSHES, PAWN_CAPTURES, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, QUEEN_DIRECTIONS
+
 # TODO: If your system does not correctly display the unicode characters of the chess game,
 # set this constant (global variable) to False.
 USE_UNICODE = True
@@ -13,22 +16,53 @@ class Piece:
     A basic class representing a piece of the chess game. It is this class which is inherited below to provide
     one class per type of piece (Pawn, Rook, etc.).
 
+    A piece does not know its box, so there is only one piece of each type and color: Knight('white') always
+    returns the same instance, shared by all the chessboards. A piece thus cannot be modified, and has no
+    __dict__ (its attributes are __slots__), which makes the chessboards and their copies small.
+
     Attributes:
         color (str): The color of the piece, either 'white' or 'black'.
         can_jump (bool): Whether or not the piece can "jump" over other pieces on a chessboard.
+        directions (tuple): The directions (see the tables module) in which the piece moves as far as it wants,
+            for the rook, the bishop and the queen. Empty for the other pieces.
+        step_targets (list): For the pieces which move only by one step (the knight and the king), the set of
+            boxes reachable from each box. None for the other pieces.
 
     Args:
         color (str): The color with which to create the piece.
         can_jump (bool): The value with which the attribute can_jump must be initialized.
 
     """
+    __slots__ = ('color', 'can_jump')
+
+    directions = ()
+    step_targets = None
+
+    # The instance of each (type of piece, color), created the first time it is requested.
+    _instances = {}
+
+    def __new__(cls, color, *args):
+        instance = Piece._instances.get((cls, color))
+        if instance is None:
+            instance = super().__new__(cls)
+            Piece._instances[cls, color] = instance
+        return instance
+
     def __init__(self, color, can_jump):
         # Validation if the received color is valid.
         assert color in ('white', 'black')
 
-        # Creation of the attributes with the received values.
-        self.color = color
-        self.can_jump = can_jump
+        # Creation of the attributes with the received values, the first time only (the instance is shared).
+        if not hasattr(self, 'color'):
+            object.__setattr__(self, 'color', color)
+            object.__setattr__(self, 'can_jump', can_jump)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("A piece is shared by all the chessboards and cannot be modified.")
+
+    def __reduce__(self):
+        # A piece is saved as its type and color, so that loading it returns the shared instance.
+        return self.__class__, (self.color,)
 
     def is_white(self):
         """
@@ -99,49 +133,21 @@ class Piece:
 
 
 class Pawn(Piece):
+    __slots__ = ()
+
     def __init__(self, color):
         super().__init__(color, False)
 
     def can_move_towards(self, source, target):
-        source_col, target_col = ord(source[0]), ord(target[0])
-        source_row, target_row = int(source[1]), int(target[1])
-
-        # A pawn moves in the same column.
-        if target_col != source_col:
-            return False
-
-        # If the pawn has never moved, it may move two boxes. Otherwise, only one box.
-        # Note that this is the only place where we refer to the size of the chessboard.
-        # To make our classes of pieces truly independent of this size, we could
-        # for example add an attribute n_deplacements, which will be incremented if the piece is
-        # moves.
-        diff = source_row - target_row
-        if self.is_white():
-            if source_row == 2:
-                return diff in (-1, -2)
-            else:
-                return diff == -1
-
-        else:
-            if source_row == 7:
-                return diff in (1, 2)
-            else:
-                return diff == 1
+        # A pawn moves forward in the same column, of one box, or of two boxes if it has never moved (if it is
+        # still on its starting row). Note that the tables module is the only place where we refer to the size
+        # of the chessboard.
+        return SQUARE_INDEX[target] in PAWN_PUSHES[self.color][SQUARE_INDEX[source]]
 
     def can_take_over(self, source, target):
-        source_col, target_col = ord(source[0]), ord(target[0])
-        source_row, target_row = int(source[1]), int(target[1])
-
         # The pawn makes a diagonal capture, of one box only, and the direction depends
         # of its color.
-        if target_col not in (source_col - 1, source_col + 1):
-            return False
-
-        if self.is_white():
-            return target_row == source_row + 1
-
-        else:
-            return target_row == source_row - 1
+        return SQUARE_INDEX[target] in PAWN_CAPTURES[self.color][SQUARE_INDEX[source]]
 
     def __repr__(self):
         """
@@ -165,22 +171,15 @@ class Pawn(Piece):
 
 
 class Rook(Piece):
+    __slots__ = ()
+    directions = ROOK_DIRECTIONS
+
     def __init__(self, color):
         super().__init__(color, False)
 
     def can_move_towards(self, source, target):
-        source_col, target_col = source[0], target[0]
-        source_row, target_row = source[1], target[1]
-
-        # A tower moves on the same row or line in any direction.
-        if target_col != source_col and source_row != target_row:
-            return False
-
-        # On the other hand, it cannot stay there.
-        if source_col == target_col and source_row == target_row:
-            return False
-
-        return True
+        # A tower moves on the same row or line in any direction (but it cannot stay there).
+        return SQUARE_INDEX[target] in ROOK_TARGETS[SQUARE_INDEX[source]]
 
     def __repr__(self):
         if self.is_white():
@@ -196,24 +195,15 @@ class Rook(Piece):
 
 
 class Knight(Piece):
+    __slots__ = ()
+    step_targets = KNIGHT_TARGETS
+
     def __init__(self, color):
         super().__init__(color, True)
 
     def can_move_towards(self, source, target):
-        source_col, target_col = ord(source[0]), ord(target[0])
-        source_row, target_row = int(source[1]), int(target[1])
-
         # A knight moves in an "L", so one of its coordinates varies by 1, and the other by 2.
-        col_distance = abs(source_col - target_col)
-        row_distance = abs(source_row - target_row)
-
-        if col_distance == 1 and row_distance == 2:
-            return True
-
-        if col_distance == 2 and row_distance == 1:
-            return True
-
-        return False
+        return SQUARE_INDEX[target] in KNIGHT_TARGETS[SQUARE_INDEX[source]]
 
     def __repr__(self):
         if self.is_white():
@@ -229,22 +219,15 @@ class Knight(Piece):
 
 
 class Bishop(Piece):
+    __slots__ = ()
+    directions = BISHOP_DIRECTIONS
+
     def __init__(self, color):
         super().__init__(color, False)
 
     def can_move_towards(self, source, target):
         # A bishop moves diagonally, i.e. the distance between rows and columns must be the same.
-        source_col, target_col = ord(source[0]), ord(target[0])
-        source_row, target_row = int(source[1]), int(target[1])
-
-        if abs(source_col - target_col) != abs(source_row - target_row):
-            return False
-
-        # Par contre, il ne peut pas faire de sur-place.
-        if source_col == target_col and source_row == target_row:
-            return False
-
-        return True
+        return SQUARE_INDEX[target] in BISHOP_TARGETS[SQUARE_INDEX[source]]
 
     def __repr__(self):
         if self.is_white():
@@ -260,21 +243,15 @@ class Bishop(Piece):
 
 
 class King(Piece):
+    __slots__ = ()
+    step_targets = KING_TARGETS
+
     def __init__(self, color):
         super().__init__(color, False)
 
     def can_move_towards(self, source, target):
         # A king can move one box, on a line, row or column.
-        source_col, target_col = ord(source[0]), ord(target[0])
-        source_row, target_row = int(source[1]), int(target[1])
-
-        col_distance = abs(source_col - target_col)
-        row_distance = abs(source_row - target_row)
-
-        if row_distance != 1 and col_distance != 1:
-            return False
-
-        return True
+        return SQUARE_INDEX[target] in KING_TARGETS[SQUARE_INDEX[source]]
 
     def __repr__(self):
         if self.is_white():
@@ -290,16 +267,15 @@ class King(Piece):
 
 
 class Queen(Piece):
+    __slots__ = ()
+    directions = QUEEN_DIRECTIONS
+
     def __init__(self, color):
         super().__init__(color, False)
 
     def can_move_towards(self, source, target):
         # A move for a queen is valid if it moves in a row, column or diagonally.
-        # Note that we use the methods directly from a class, passing as first
-        # argument the current object (self). It would have been "cleaner" to create new functions
-        # common to Rook, Bishop and Queen classes to avoid making these calls from the class.
-        return Rook.can_move_towards(self, source, target) or \
-            Bishop.can_move_towards(self, source, target)
+        return SQUARE_INDEX[target] in QUEEN_TARGETS[SQUARE_INDEX[source]]
 
     def __repr__(self):
         if self.is_white():
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the search of the computer player: an alpha-beta search (negamax form), deepened one move at a
+time (iterative deepening) until a budget of time, nodes or depth is exhausted.
+
+The moves are ordered to make the alpha-beta cuts happen early: first the best move found by a previous search of
+the position (kept in a TranspositionTable), then the captures, the most valuable victim first, then the quiet moves
+which caused a cut at the same depth (the "killer" moves). At the end of the search, only captures are searched
+(quiescence), so that a position is not evaluated in the middle of an exchange of pieces.
+
+"""
+import time
+from collections import namedtuple
+
+from pychecs2.echecs.chess_board import other_color
+from pychecs2.echecs.evaluation import PIECE_VALUES
+from pychecs2.echecs.tables import SQUARE_INDEX
+from pychecs2.echecs.transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+# The score of a checkmate. A mate in n moves is scored MATE_SCORE - n, so that the fastest mate is preferred.
+MATE_SCORE = 100000
+INFINITY = 1000000
+
+MAX_DEPTH = 64
+
+# The time limit is checked each time this number of nodes has been searched.
+TIME_CHECK_INTERVAL = 512
+
+SearchResult = namedtuple('SearchResult', ['best_move', 'score', 'depth', 'nodes', 'elapsed'])
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def evaluate(board, color):
+    """
+    Evaluates a position from the point of view of a player: the value of the pieces of the player and of their
+    boxes (see the evaluation module), minus the one of the opponent. The values are kept up to date by the
+    chessboard at each move, so that the evaluation does not scan the boxes.
+
+    Args:
+        board (Chessboard): The chessboard.
+        color (str): The color of the player.
+
+    Returns:
+        int: The score of the position, in hundredths of pawns.
+
+    """
+    return board.evaluate(color)
+
+
+def score_to_table(score, ply):
+    """
+    Converts a mate score, counted from the root of the search, into a score counted from the position, before
+    storing it in the transposition table (the same position can be met at different plies).
+
+    """
+    if score > MATE_SCORE - MAX_DEPTH * 2:
+        return score + ply
+    if score < -MATE_SCORE + MAX_DEPTH * 2:
+        return score - ply
+    return score
+
+
+def score_from_table(score, ply):
+    """
+    Converts a mate score read in the transposition table back into a score counted from the root of the search.
+
+    """
+    if score > MATE_SCORE - MAX_DEPTH * 2:
+        return score - ply
+    if score < -MATE_SCORE + MAX_DEPTH * 2:
+        return score + ply
+    return score
+
+
+class Searcher:
+    """
+    The search of the best move of a position. The transposition table is kept from one search to the other, so
+    that the analyses of the previous moves of a game are reused.
+
+    Attributes:
+        table (TranspositionTable): The transposition table.
+        evaluate (function): The evaluation function, taking a chessboard and a color, and returning a score.
+        nodes (int): The number of positions searched by the current (or last) search.
+        stop_event (Event): An event (threading or multiprocessing) which interrupts the search when it is set, or
+            None. It is checked with the time limit.
+
+    Args:
+        table (TranspositionTable): The transposition table to use. By default, a new table of 16 MB.
+        evaluate (function): The evaluation function. By default, the material and piece-square balance
+            (evaluate()).
+
+    """
+    def __init__(self, table=None, evaluate=evaluate):
+        self.table = table if table is not None else TranspositionTable(16)
+        self.evaluate = evaluate
+        self.nodes = 0
+        self.max_nodes = None
+        self.deadline = None
+        self.killers = {}
+        self.root_best = None
+        self.stop_event = None
+
+    def search(self, board, color, max_depth=MAX_DEPTH, max_nodes=None, max_time=None, start_depth=1, age=None):
+        """
+        Searches the best move of a player. The search is deepened one move at a time, and stops when one of the
+        limits is reached: the result is then the one of the last depth completely searched.
+
+        Args:
+            board (Chessboard): The chessboard, which is not modified.
+            color (str): The color of the player who has to play.
+            max_depth (int): The maximum depth of the search, in moves.
+            max_nodes (int): The maximum number of positions to search, or None.
+            max_time (float): The maximum duration of the search, in seconds, or None.
+            start_depth (int): The first depth searched. The helpers of a parallel search start deeper than the main
+                search, so that they do not all search the same positions.
+            age (int): The age of the entries stored in the transposition table, the one of the main search for
+                the helpers of a parallel search, or None for a new age.
+
+        Returns:
+            SearchResult: The best move (None if the player cannot move), its score, the depth reached, the number
+                of positions searched and the duration of the search.
+
+        """
+        start = time.perf_counter()
+        self.table.new_search(age)
+        self.nodes = 0
+        self.max_nodes = max_nodes
+        self.deadline = start + max_time if max_time is not None else None
+        self.killers = {}
+
+        # The moves are played and undone on a copy, so that an interrupted search does not leave moves on the
+        # chessboard received.
+        board = board.copy()
+        board.side_to_move = color
+        moves = board.generate_all_moves(color)
+        if not moves:
+            score = -MATE_SCORE if board.is_in_check(color) else 0
+            return SearchResult(None, score, 0, 0, time.perf_counter() - start)
+
+        # If even the first depth cannot be completed, the best move found so far is played.
+        self.root_best = (moves[0], -INFINITY)
+        result = None
+        for depth in range(min(start_depth, max_depth), max_depth + 1):
+            try:
+                score = self.negamax(board, color, depth, -INFINITY, INFINITY, 0)
+            except SearchTimeout:
+                break
+
+            result = SearchResult(self.root_best[0], score, depth, self.nodes, time.perf_counter() - start)
+
+            # There is no need to search deeper once a mate is found.
+            if abs(score) > MATE_SCORE - MAX_DEPTH * 2:
+                break
+
+        if result is None:
+            result = SearchResult(self.root_best[0], self.root_best[1], 0, self.nodes, time.perf_counter() - start)
+
+        return result._replace(elapsed=time.perf_counter() - start)
+
+    def count_node(self):
+        """
+        Counts a searched position, and interrupts the search (SearchTimeout) if a limit is reached.
+
+        """
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise SearchTimeout()
+
+        if self.nodes % TIME_CHECK_INTERVAL == 0:
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                raise SearchTimeout()
+            if self.stop_event is not None and self.stop_event.is_set():
+                raise SearchTimeout()
+
+    def order_moves(self, board, moves, best_move, ply):
+        """
+        Sorts the moves: the best move of the transposition table, then the captures (most valuable victim first,
+        with the least valuable attacker), then the killer moves, then the other moves.
+
+        """
+        killers = self.killers.get(ply, ())
+        squares = board.squares
+
+        def priority(move):
+            if move == best_move:
+                return 1000000
+            victim = squares[SQUARE_INDEX[move[1]]]
+            if victim is not None:
+                attacker = squares[SQUARE_INDEX[move[0]]]
+                return 10000 + 10 * PIECE_VALUES[victim.__class__] - PIECE_VALUES[attacker.__class__] // 10
+            if move in killers:
+                return 5000
+            return 0
+
+        return sorted(moves, key=priority, reverse=True)
+
+    def negamax(self, board, color, depth, alpha, beta, ply):
+        """
+        Searches a position with the alpha-beta algorithm, in its negamax form: the score is always from the point
+        of view of the player who has to play.
+
+        Args:
+            board (Chessboard): The chessboard.
+            color (str): The color of the player who has to play.
+            depth (int): The remaining depth, in moves.
+            alpha (int): The score that the player is already sure to obtain.
+            beta (int): The score above which the opponent will avoid this position.
+            ply (int): The number of moves played since the root of the search.
+
+        Returns:
+            int: The score of the position.
+
+        """
+        self.count_node()
+        key = board.hash_key
+        entry = self.table.probe(key)
+        best_move = None
+        if entry is not None:
+            best_move = entry.best_move
+            if ply > 0 and entry.depth >= depth:
+                score = score_from_table(entry.score, ply)
+                if (entry.bound == EXACT or (entry.bound == LOWER_BOUND and score >= beta)
+                        or (entry.bound == UPPER_BOUND and score <= alpha)):
+                    return score
+
+        if depth == 0:
+            return self.quiescence(board, color, alpha, beta, ply)
+
+        moves = board.generate_all_moves(color)
+        if not moves:
+            return -MATE_SCORE + ply if board.is_in_check(color) else 0
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        for move in self.order_moves(board, moves, best_move, ply):
+            board.push(move)
+            score = -self.negamax(board, other_color(color), depth - 1, -beta, -alpha, ply + 1)
+            board.pop()
+            if score > best_score:
+                best_score, best_move = score, move
+                if ply == 0:
+                    self.root_best = (move, score)
+
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                if board.get_piece_from_position(move[1]) is None and move not in self.killers.get(ply, ()):
+                    self.killers.setdefault(ply, []).insert(0, move)
+                    del self.killers[ply][2:]
+                break
+
+        if best_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.table.store(key, depth, score_to_table(best_score, ply), bound, best_move)
+        return best_score
+
+    def quiescence(self, board, color, alpha, beta, ply):
+        """
+        Searches only the captures of a position, until the position is calm, and returns its score.
+
+        """
+        self.count_node()
+        stand_pat = self.evaluate(board, color)
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        squares = board.squares
+        captures = [move for move in board.generate_all_moves(color) if squares[SQUARE_INDEX[move[1]]] is not None]
+        for move in self.order_moves(board, captures, None, ply):
+            board.push(move)
+            score = -self.quiescence(board, other_color(color), -beta, -alpha, ply + 1)
+            board.pop()
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+
+        return alpha
+
+
+def find_best_move(game, max_depth=MAX_DEPTH, max_nodes=None, max_time=None, searcher=None):
+    """
+    Searches the best move of the active player of a game.
+
+    Args:
+        game (Game): The game, which is not modified.
+        max_depth (int): The maximum depth of the search, in moves.
+        max_nodes (int): The maximum number of positions to search, or None.
+        max_time (float): The maximum duration of the search, in seconds, or None.
+        searcher (Searcher): The searcher to use (to keep its transposition table), or None for a new one.
+
+    Returns:
+        SearchResult: The result of the search.
+
+    """
+    if searcher is None:
+        searcher = Searcher()
+    return searcher.search(game.chess_board, game.active_player, max_depth, max_nodes, max_time)
@@ -0,0 +1,614 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the endgame tablebases: for every position of an endgame with few pieces (KQvK, KRvK, KPvK,
+KQvKR...), the result of the game with the best play of both players, and the number of half-moves (plies) before
+the mate.
+
+A table covers one material, written as the white pieces then the black pieces (K, Q, R, B, N, P), separated by 'v'.
+Its positions are numbered by a dense index: the side to move, then the box of each piece, in the order of the name
+(see position_index()), so that the result of a position is read at a computed offset of the file, without search.
+Each position takes one byte (see decode_value()):
+    - 0 if the game is a draw (no player can force the mate),
+    - 1 + the number of plies before the mate otherwise: an even number of plies if the side to move is mated, and
+      an odd number if it mates,
+    - INVALID if the position cannot occur (two pieces on the same box, or the player who does not play in check).
+
+The tables are generated by retrograde analysis: starting from the mates, each result is propagated to the
+positions which lead to it, one ply further at a time (see generate_table()). Captures lead to tables of fewer
+pieces, which are generated first. The chessboard does not implement promotion, so a pawn on its last row stays
+there. The generation is written in Python, and a table of 4 pieces (33 million positions) takes a long time.
+
+The tables are written in a directory, and read through mmap by Tablebases, e.g. from the folder containing the
+pychecs2 package:
+
+    python -m pychecs2.echecs.tablebase generate KQvK KRvK KPvK --directory tablebases
+    python -m pychecs2.echecs.tablebase probe --directory tablebases --fen "8/8/8/4k3/8/8/8/4K2Q w - - 0 1"
+
+"""
+import argparse
+import itertools
+import mmap
+import os
+import struct
+from collections import defaultdict, namedtuple
+
+from pychecs2.echecs.chess_board import Chessboard, other_color
+from pychecs2.echecs.piece import Pawn, Knight, Bishop, Rook, Queen, King
+from pychecs2.echecs.tables import RAYS, BETWEEN, KING_TARGETS, KNIGHT_TARGETS, ROOK_TARGETS, BISHOP_TARGETS, \
+    QUEEN_TARGETS, PAWN_PUSHES, PAWN_CAPTURES, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, QUEEN_DIRECTIONS
+
+MAGIC = b'PCTB'
+VERSION = 1
+
+# The header of a file: the magic characters, the version, and the length of the name of the material, followed by
+# the name, then by the values of the positions.
+HEADER = struct.Struct('<4sBB')
+
+MAX_PIECES = 4
+DRAW = 0
+INVALID = 0xff
+MAX_PLIES = INVALID - 2
+
+COLORS = ('white', 'black')
+PIECE_LETTERS = {King: 'K', Queen: 'Q', Rook: 'R', Bishop: 'B', Knight: 'N', Pawn: 'P'}
+LETTER_PIECES = {letter: piece_type for piece_type, letter in PIECE_LETTERS.items()}
+
+# The order of the pieces in the name of a material.
+PIECE_ORDER = {piece_type: order for order, piece_type in enumerate((King, Queen, Rook, Bishop, Knight, Pawn))}
+
+SLIDER_DIRECTIONS = {Rook: ROOK_DIRECTIONS, Bishop: BISHOP_DIRECTIONS, Queen: QUEEN_DIRECTIONS}
+SLIDER_TARGETS = {Rook: ROOK_TARGETS, Bishop: BISHOP_TARGETS, Queen: QUEEN_TARGETS}
+STEP_TARGETS = {King: KING_TARGETS, Knight: KNIGHT_TARGETS}
+
+# The result of a position for the side to move: WIN, DRAW or LOSS, and the number of plies before the mate (None
+# for a draw).
+WIN, LOSS = 1, -1
+TablebaseResult = namedtuple('TablebaseResult', ['wdl', 'plies'])
+
+
+def sort_key(piece):
+    return piece.color != 'white', PIECE_ORDER[piece.__class__]
+
+
+def material_name(pieces):
+    """
+    Returns the name of the material of pieces, for example 'KQvK'.
+
+    Args:
+        pieces (iterable): The pieces.
+
+    Returns:
+        str: The name of the material.
+
+    """
+    pieces = sorted(pieces, key=sort_key)
+    return (''.join(PIECE_LETTERS[piece.__class__] for piece in pieces if piece.color == 'white') + 'v'
+            + ''.join(PIECE_LETTERS[piece.__class__] for piece in pieces if piece.color == 'black'))
+
+
+def parse_material(name):
+    """
+    Converts the name of a material into its pieces, in the order of the index of the table.
+
+    Args:
+        name (str): The name, for example 'KQvK' or 'KPvK'.
+
+    Returns:
+        tuple: The pieces.
+
+    Raises:
+        ValueError: If the name is invalid, or has more than MAX_PIECES pieces.
+
+    """
+    sides = name.upper().split('V')
+    if len(sides) != 2 or any(side.count('K') != 1 or not side.startswith('K') for side in sides):
+        raise ValueError("Invalid material: {} (each side needs a king first, as in KQvK)".format(name))
+
+    try:
+        pieces = [LETTER_PIECES[letter](color) for color, side in zip(COLORS, sides) for letter in side]
+    except KeyError:
+        raise ValueError("Invalid material: {}".format(name))
+    if len(pieces) > MAX_PIECES:
+        raise ValueError("The tablebases have at most {} pieces: {}".format(MAX_PIECES, name))
+
+    return tuple(sorted(pieces, key=sort_key))
+
+
+def position_index(side, squares):
+    """
+    Computes the index of a position in its table.
+
+    Args:
+        side (str): The color of the player who has to play.
+        squares (iterable): The box of each piece, in the order of the name of the material.
+
+    Returns:
+        int: The index.
+
+    """
+    index = COLORS.index(side)
+    for square in squares:
+        index = index * 64 + square
+    return index
+
+
+def decode_value(value):
+    """
+    Decodes the value of a position in a table.
+
+    Args:
+        value (int): The byte of the position.
+
+    Returns:
+        TablebaseResult or None: The result for the side to move, or None if the position cannot occur.
+
+    """
+    if value == INVALID:
+        return None
+    elif value == DRAW:
+        return TablebaseResult(DRAW, None)
+
+    plies = value - 1
+    return TablebaseResult(WIN if plies % 2 else LOSS, plies)
+
+
+def piece_targets(piece, source, occupied):
+    """
+    Returns the boxes where a piece can move according to its rules of movement, including the boxes of the pieces
+    of its own color (which the caller excludes).
+
+    Args:
+        piece (Piece): The piece.
+        source (int): The box of the piece.
+        occupied (dict): The piece on each occupied box.
+
+    Returns:
+        list: The target boxes.
+
+    """
+    piece_type = piece.__class__
+    if piece_type in STEP_TARGETS:
+        return STEP_TARGETS[piece_type][source]
+    elif piece_type is Pawn:
+        targets = []
+        for target in PAWN_PUSHES[piece.color][source]:
+            if target in occupied:
+                break
+            targets.append(target)
+        targets.extend(target for target in PAWN_CAPTURES[piece.color][source] if target in occupied)
+        return targets
+
+    targets = []
+    for direction in SLIDER_DIRECTIONS[piece_type]:
+        for target in RAYS[direction][source]:
+            targets.append(target)
+            if target in occupied:
+                break
+    return targets
+
+
+def is_attacked(square, color, occupied):
+    """
+    Checks if a box is attacked by a piece of a color.
+
+    Args:
+        square (int): The box.
+        color (str): The color of the attacking pieces.
+        occupied (dict): The piece on each occupied box.
+
+    Returns:
+        bool: True if a piece of this color attacks the box, and False otherwise.
+
+    """
+    for source, piece in occupied.items():
+        if piece.color != color:
+            continue
+        piece_type = piece.__class__
+        if piece_type in STEP_TARGETS:
+            if square in STEP_TARGETS[piece_type][source]:
+                return True
+        elif piece_type is Pawn:
+            if square in PAWN_CAPTURES[color][source]:
+                return True
+        elif square in SLIDER_TARGETS[piece_type][source] and not any(box in occupied
+                                                                       for box in BETWEEN[source][square]):
+            return True
+    return False
+
+
+def generate_table(name, subtables):
+    """
+    Generates the table of a material by retrograde analysis:
+        1. Each position is checked, and its legal moves are counted. The mates are lost in 0 plies, the stalemates
+           are draws, and the captures are scored with the table of the material left (subtables).
+        2. The positions lost in n plies make the positions which lead to them won in n + 1 plies. The positions won
+           in n plies remove one move to the positions which lead to them: a position whose moves all lead to
+           positions won by the opponent is lost, one ply after the longest of them.
+        3. The positions which are neither won nor lost are draws.
+
+    Args:
+        name (str): The name of the material.
+        subtables (dict): The values of the tables of the materials with one piece less, by name.
+
+    Returns:
+        bytearray: The value of each position (see decode_value()), by index.
+
+    """
+    pieces = parse_material(name)
+    count = len(pieces)
+    side_size = 64 ** count
+    kings = {piece.color: number for number, piece in enumerate(pieces) if piece.__class__ is King}
+
+    values = bytearray([INVALID]) * (2 * side_size)
+    counters = bytearray(2 * side_size)
+    escapes = set()
+    capture_losses = {}
+    scheduled = defaultdict(list)
+    frontier = []
+
+    for side_number, side in enumerate(COLORS):
+        opponent = other_color(side)
+        for squares in itertools.product(range(64), repeat=count):
+            occupied = dict(zip(squares, pieces))
+            if len(occupied) < count or is_attacked(squares[kings[opponent]], side, occupied):
+                continue
+
+            index = position_index(side, squares)
+            values[index] = DRAW
+            moves = 0
+            best_capture_win = None
+            for number, (source, piece) in enumerate(zip(squares, pieces)):
+                if piece.color != side:
+                    continue
+                for target in piece_targets(piece, source, occupied):
+                    captured = occupied.get(target)
+                    if captured is not None and captured.color == side:
+                        continue
+                    after = dict(occupied)
+                    del after[source]
+                    after[target] = piece
+                    king_square = target if number == kings[side] else squares[kings[side]]
+                    if is_attacked(king_square, opponent, after):
+                        continue
+
+                    moves += 1
+                    if captured is None:
+                        counters[index] += 1
+                        continue
+
+                    # The capture leads to the table of the material left, where the opponent has to play.
+                    left = squares[:squares.index(target)] + squares[squares.index(target) + 1:]
+                    left = tuple(target if box == source else box for box in left)
+                    subname = material_name(piece for number, piece in enumerate(pieces)
+                                            if squares[number] != target)
+                    result = decode_value(subtables[subname][position_index(opponent, left)])
+                    if result.wdl == LOSS:
+                        if best_capture_win is None or result.plies + 1 < best_capture_win:
+                            best_capture_win = result.plies + 1
+                        escapes.add(index)
+                    elif result.wdl == DRAW:
+                        escapes.add(index)
+                    else:
+                        capture_losses[index] = max(capture_losses.get(index, 0), result.plies + 1)
+
+            if moves == 0:
+                if is_attacked(squares[kings[side]], opponent, occupied):
+                    values[index] = 1
+                    frontier.append(index)
+            elif best_capture_win is not None:
+                scheduled[best_capture_win].append(index)
+            elif counters[index] == 0 and index not in escapes:
+                scheduled[capture_losses[index]].append(index)
+
+    plies = 0
+    while plies <= MAX_PLIES and (frontier or any(level >= plies for level in scheduled)):
+        for index in scheduled.pop(plies, ()):
+            if values[index] == DRAW:
+                values[index] = plies + 1
+                frontier.append(index)
+
+        next_frontier = []
+        for index in frontier:
+            for previous in previous_positions(index, pieces, side_size):
+                if values[previous] != DRAW:
+                    continue
+                if plies % 2 == 0:
+                    # The opponent is mated in plies: the previous position is won in plies + 1.
+                    values[previous] = plies + 2
+                    next_frontier.append(previous)
+                    continue
+
+                counters[previous] -= 1
+                if counters[previous] == 0 and previous not in escapes:
+                    loss = max(plies + 1, capture_losses.get(previous, 0))
+                    if loss == plies + 1:
+                        values[previous] = loss + 1
+                        next_frontier.append(previous)
+                    else:
+                        scheduled[loss].append(previous)
+
+        frontier = next_frontier
+        plies += 1
+
+    return values
+
+
+def previous_positions(index, pieces, side_size):
+    """
+    Returns the positions of the same material which lead to a position by a move without capture (the previous
+    positions of the opponent of the side to move).
+
+    Args:
+        index (int): The index of the position.
+        pieces (tuple): The pieces of the material.
+        side_size (int): The number of positions of each side to move.
+
+    Returns:
+        list: The indexes of the previous positions, some of which can be invalid.
+
+    """
+    side_number, rest = divmod(index, side_size)
+    squares = []
+    for _ in pieces:
+        rest, square = divmod(rest, 64)
+        squares.append(square)
+    squares.reverse()
+    occupied = dict(zip(squares, pieces))
+
+    mover = COLORS[1 - side_number]
+    base = (1 - side_number) * side_size + index - side_number * side_size
+    previous = []
+    for number, (target, piece) in enumerate(zip(squares, pieces)):
+        if piece.color != mover:
+            continue
+        weight = 64 ** (len(pieces) - 1 - number)
+        piece_type = piece.__class__
+        if piece_type in STEP_TARGETS:
+            sources = [source for source in STEP_TARGETS[piece_type][target] if source not in occupied]
+        elif piece_type is Pawn:
+            # A pawn comes from the box behind it, or from two boxes behind it on its first move.
+            step = -8 if mover == 'white' else 8
+            sources = [source for source in (target + step, target + 2 * step)
+                       if 0 <= source < 64 and source not in occupied and target in PAWN_PUSHES[mover][source]
+                       and target + step not in occupied]
+        else:
+            sources = []
+            for direction in SLIDER_DIRECTIONS[piece_type]:
+                for source in RAYS[direction][target]:
+                    if source in occupied:
+                        break
+                    sources.append(source)
+
+        previous.extend(base + (source - target) * weight for source in sources)
+    return previous
+
+
+def submaterials(name):
+    """
+    Returns the names of the materials left after the capture of a piece of a material.
+
+    """
+    pieces = parse_material(name)
+    return sorted({material_name(pieces[:number] + pieces[number + 1:])
+                   for number, piece in enumerate(pieces) if piece.__class__ is not King})
+
+
+def table_path(directory, name):
+    return os.path.join(directory, name + '.pctb')
+
+
+def write_table(path, name, values):
+    """
+    Writes a table in a file (replaced if it exists).
+
+    """
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as table_file:
+        table_file.write(HEADER.pack(MAGIC, VERSION, len(name)) + name.encode('ascii'))
+        table_file.write(values)
+    os.replace(temporary_path, path)
+
+
+def read_table(path):
+    """
+    Maps a table file in memory.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        mmap, int: The content of the file, and the offset of the values of the positions.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file is not a table.
+
+    """
+    with open(path, 'rb') as table_file:
+        data = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, name_length = HEADER.unpack_from(data) if len(data) >= HEADER.size else (None, None, 0)
+    if magic != MAGIC or version != VERSION:
+        data.close()
+        raise ValueError("This file is not a tablebase: {}".format(path))
+    return data, HEADER.size + name_length
+
+
+def generate(names, directory, progress=None):
+    """
+    Generates the tables of materials, and of the materials reached by their captures, in a directory. The tables
+    already in the directory are not generated again.
+
+    Args:
+        names (list): The names of the materials.
+        directory (str): The directory of the tables.
+        progress (function): A function called with the name of each table generated, or None.
+
+    Returns:
+        list: The names of the tables generated.
+
+    """
+    os.makedirs(directory, exist_ok=True)
+    values = {}
+    generated = []
+
+    def load(name):
+        if name in values:
+            return values[name]
+        subtables = {subname: load(subname) for subname in submaterials(name)}
+        path = table_path(directory, name)
+        if os.path.exists(path):
+            data, offset = read_table(path)
+            values[name] = memoryview(data)[offset:]
+        else:
+            values[name] = generate_table(name, subtables)
+            write_table(path, name, values[name])
+            generated.append(name)
+            if progress is not None:
+                progress(name)
+        return values[name]
+
+    for name in names:
+        load(material_name(parse_material(name)))
+    return generated
+
+
+class Tablebases:
+    """
+    The tables of a directory, opened (mapped in memory) the first time they are probed.
+
+    Attributes:
+        directory (str): The directory of the tables.
+
+    Args:
+        directory (str): The directory of the tables.
+
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table[0].close()
+        self.tables = {}
+
+    def table(self, name):
+        """
+        Returns the content of the table of a material, and the offset of its values, or None if the table is not in
+        the directory.
+
+        """
+        if name not in self.tables:
+            try:
+                self.tables[name] = read_table(table_path(self.directory, name))
+            except (OSError, ValueError):
+                self.tables[name] = None
+        return self.tables[name]
+
+    def probe(self, board):
+        """
+        Reads the result of a position in its table.
+
+        Args:
+            board (Chessboard): The chessboard, whose side to move has to play.
+
+        Returns:
+            TablebaseResult or None: The result for the side to move, and None if the position has too many pieces,
+                or its table is not in the directory.
+
+        """
+        placed = [(piece, square) for square, piece in enumerate(board.squares) if piece is not None]
+        if len(placed) > MAX_PIECES:
+            return None
+        placed.sort(key=lambda item: sort_key(item[0]))
+
+        try:
+            name = material_name(piece for piece, _ in placed)
+            parse_material(name)
+        except ValueError:
+            return None
+        table = self.table(name)
+        if table is None:
+            return None
+
+        data, offset = table
+        return decode_value(data[offset + position_index(board.side_to_move, (square for _, square in placed))])
+
+    def best_move(self, board):
+        """
+        Chooses the best move of a position from the tables: the fastest mate if the position is won, a draw if it
+        is drawn, and the longest defence if it is lost.
+
+        Args:
+            board (Chessboard): The chessboard, which is not modified.
+
+        Returns:
+            tuple or None: The move, as a (source position, target position) tuple, and None if the position or one
+                of the positions after its moves is not in the tables.
+
+        """
+        if self.probe(board) is None:
+            return None
+
+        best = None
+        for move in board.generate_all_moves(board.side_to_move):
+            board.push(move)
+            result = self.probe(board)
+            board.pop()
+            if result is None:
+                return None
+
+            # The result is the one of the opponent.
+            if result.wdl == LOSS:
+                score = (2, -result.plies)
+            elif result.wdl == DRAW:
+                score = (1, 0)
+            else:
+                score = (0, result.plies)
+            if best is None or score > best[0]:
+                best = (score, move)
+
+        return best[1] if best is not None else None
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Generates or probes the endgame tablebases.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate_parser = commands.add_parser('generate', help="generate the tables of materials")
+    generate_parser.add_argument('materials', nargs='+', help="materials, for example KQvK KRvK KPvK")
+    generate_parser.add_argument('--directory', default='tablebases',
+                                 help="directory of the tables (default: tablebases)")
+    probe_parser = commands.add_parser('probe', help="display the result of a position")
+    probe_parser.add_argument('--directory', default='tablebases', help="directory of the tables")
+    probe_parser.add_argument('--fen', required=True, help="position to probe")
+    args = parser.parse_args(arguments)
+
+    if args.command == 'generate':
+        generate(args.materials, args.directory, progress=lambda name: print('Generated {}'.format(name)))
+        return 0
+
+    board = Chessboard.from_fen(args.fen)
+    with Tablebases(args.directory) as tablebases:
+        result = tablebases.probe(board)
+        if result is None:
+            print('Not in the tables.')
+            return 1
+        wdl = {WIN: 'win', DRAW: 'draw', LOSS: 'loss'}[result.wdl]
+        print('{} for {}{}'.format(wdl, board.side_to_move,
+                                   '' if result.plies is None else ', mate in {} plies'.format(result.plies)))
+        move = tablebases.best_move(board)
+        if move is not None:
+            print('Best move: {}{}'.format(*move))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
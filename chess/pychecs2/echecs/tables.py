@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains tables describing the geometry of the chessboard, built only once when the module is
+imported. The rules of movement of the pieces and the chessboards use them instead of recomputing, at each
+call, the rows, columns and boxes between two positions.
+
+The boxes are numbered from 0 to 63: 'a1' is the box 0, 'b1' the box 1, ..., 'h1' the box 7, 'a2' the box 8,
+and so on until 'h8', the box 63. All the tables below are indexed by these numbers.
+
+"""
+
+# Conversion between the positions ('a1', 'e4', ...) and the number of the boxes.
+SQUARE_NAMES = [col + row for row in '12345678' for col in 'abcdefgh']
+SQUARE_INDEX = {name: index for index, name in enumerate(SQUARE_NAMES)}
+
+# The eight directions, as (column step, row step). The first four are those of the rook, the last four those
+# of the bishop.
+NORTH, SOUTH, EAST, WEST, NORTH_EAST, NORTH_WEST, SOUTH_EAST, SOUTH_WEST = range(8)
+DIRECTION_STEPS = ((0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (-1, 1), (1, -1), (-1, -1))
+ROOK_DIRECTIONS = (NORTH, SOUTH, EAST, WEST)
+BISHOP_DIRECTIONS = (NORTH_EAST, NORTH_WEST, SOUTH_EAST, SOUTH_WEST)
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+KNIGHT_STEPS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+
+
+def _offset(index, col_step, row_step):
+    """
+    Returns the number of the box reached from a box by moving by a number of columns and rows, and None if
+    this box is outside the chessboard.
+
+    """
+    col, row = index % 8 + col_step, index // 8 + row_step
+    if 0 <= col < 8 and 0 <= row < 8:
+        return row * 8 + col
+    return None
+
+
+def _step_targets(steps):
+    """
+    Builds, for each of the 64 boxes, the set of the boxes reachable with one of the steps received.
+
+    """
+    return [frozenset(target for target in (_offset(index, *step) for step in steps) if target is not None)
+            for index in range(64)]
+
+
+def _ray(index, direction):
+    """
+    Returns the boxes reached from a box by moving in a direction, in order, until the edge of the chessboard.
+
+    """
+    ray = []
+    target = _offset(index, *DIRECTION_STEPS[direction])
+    while target is not None:
+        ray.append(target)
+        target = _offset(target, *DIRECTION_STEPS[direction])
+    return tuple(ray)
+
+
+def _pawn_pushes(direction, start_row):
+    """
+    Builds, for each of the 64 boxes, the boxes where a pawn can move forward (without taking): one box, or two
+    boxes from its starting row.
+
+    """
+    pushes = []
+    for index in range(64):
+        ray = RAYS[direction][index]
+        pushes.append(ray[:2] if index // 8 == start_row else ray[:1])
+    return pushes
+
+
+# RAYS[direction][box]: the boxes reached from the box in this direction, in order.
+RAYS = [[_ray(index, direction) for index in range(64)] for direction in range(8)]
+
+KNIGHT_TARGETS = _step_targets(KNIGHT_STEPS)
+KING_TARGETS = _step_targets(DIRECTION_STEPS)
+ROOK_TARGETS = [frozenset(target for direction in ROOK_DIRECTIONS for target in RAYS[direction][index])
+                for index in range(64)]
+BISHOP_TARGETS = [frozenset(target for direction in BISHOP_DIRECTIONS for target in RAYS[direction][index])
+                  for index in range(64)]
+QUEEN_TARGETS = [ROOK_TARGETS[index] | BISHOP_TARGETS[index] for index in range(64)]
+
+# For each color, the boxes where a pawn moves forward, and the boxes where it takes.
+PAWN_PUSHES = {'white': _pawn_pushes(NORTH, 1), 'black': _pawn_pushes(SOUTH, 6)}
+PAWN_CAPTURES = {'white': _step_targets(((1, 1), (-1, 1))), 'black': _step_targets(((1, -1), (-1, -1)))}
+
+# BETWEEN[source][target]: the boxes strictly between two boxes on the same row, column or diagonal, and an
+# empty tuple for two boxes which are not aligned.
+BETWEEN = [[()] * 64 for _ in range(64)]
+for _source in range(64):
+    for _direction in range(8):
+        _ray_boxes = RAYS[_direction][_source]
+        for _distance, _target in enumerate(_ray_boxes):
+            BETWEEN[_source][_target] = _ray_boxes[:_distance]
+del _source, _direction, _ray_boxes, _distance, _target
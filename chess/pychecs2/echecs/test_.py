@@ -1,25 +1,534 @@
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
 import unittest
-from project.pychecs2.echecs import piece
-
-# class MyTestCase(unittest.TestCase):
-#     def test_something(self):
-#         self.assertEqual(True, False)
-
+from pychecs2.echecs import evaluation, piece, tablebase
+from pychecs2.echecs.bitboard import BitboardChessboard
+from pychecs2.echecs.book import OpeningBook, build_book
+from pychecs2.echecs.chess_board import Chessboard
+from pychecs2.echecs.game import Game
+from pychecs2.echecs.journal import GameJournal, SaveFileError, load_game
+from pychecs2.echecs.perft import REFERENCE_POSITIONS, divide, perft, main as perft_main
+from pychecs2.echecs.parallel import ParallelSearcher
+from pychecs2.echecs.pgn import PgnError, decode_san, read_games, write_games
+from pychecs2.echecs.search import Searcher, MATE_SCORE
+from pychecs2.echecs.transposition import TranspositionTable, EXACT, LOWER_BOUND, table_bytes
+from pychecs2.echecs.validation import validate_games
+from pychecs2.server.broadcast import Broadcast
+from pychecs2.server.client import GameClient
+from pychecs2.server.server import GameServer, ProtocolError
 
 
 class Piece(unittest.TestCase):
     def test_color(self):
-       pass
+        self.assertTrue(piece.Knight('white').is_white())
+        self.assertTrue(piece.Knight('black').is_black())
 
     def test_can_move(self):
-        result = piece.Piece.can_move_towards( self,"a8", "b6")
-        self.assertEqual(result, "a8", "b6")
+        self.assertTrue(piece.Knight('white').can_move_towards("a8", "b6"))
+        self.assertFalse(piece.Knight('white').can_move_towards("a8", "b7"))
+
+    def test_shared_instances(self):
+        self.assertIs(piece.Knight('white'), piece.Knight('white'))
+        self.assertIsNot(piece.Knight('white'), piece.Knight('black'))
+        with self.assertRaises(AttributeError):
+            piece.Knight('white').color = 'black'
+
+
+class Perft(unittest.TestCase):
+    # The deeper counts are checked with: python -m pychecs2.echecs.perft --suite --depth 4
+    def test_reference_positions(self):
+        for board_class in (Chessboard, BitboardChessboard):
+            for name, fen, counts in REFERENCE_POSITIONS:
+                for depth, expected in enumerate(counts[:3], 1):
+                    with self.subTest(board=board_class.__name__, position=name, depth=depth):
+                        board = board_class.from_fen(fen)
+                        self.assertEqual(perft(board, board.side_to_move, depth), expected)
+
+    def test_divide(self):
+        board = Chessboard()
+        counts = divide(board, 'white', 2)
+        self.assertEqual((len(counts), sum(nodes for _, nodes in counts)), (20, 400))
+        self.assertEqual(divide(board, 'white', 0), [])
+        # A depth without first move is refused by the command line, instead of searching without end.
+        with contextlib.redirect_stderr(io.StringIO()):
+            for arguments in (['--divide', '--depth', '0'], ['--depth', '-1']):
+                with self.assertRaises(SystemExit):
+                    perft_main(arguments)
+
+
+class Fen(unittest.TestCase):
+    def test_round_trip(self):
+        for board_class in (Chessboard, BitboardChessboard):
+            for fen in ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1',
+                        '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 b - - 0 1'):
+                board = board_class.from_fen(fen)
+                self.assertEqual(board.to_fen(), fen)
+                self.assertEqual(board.hash_key, board_class.from_fen(board.to_fen()).hash_key)
+
+        game = Game()
+        game.move('e2', 'e4')
+        self.assertEqual(Game.from_fen(game.to_fen()).to_fen(), game.to_fen())
+        self.assertEqual(Game.from_fen(game.to_fen()).active_player, 'black')
+        # The computer of a game created from a FEN has its book and endgame tables, as with Game().
+        with tablebase.Tablebases(tempfile.mkdtemp()) as tablebases:
+            loaded = Game.from_fen(game.to_fen(), computer_color='black', tablebases=tablebases)
+            self.assertIs(loaded.tablebases, tablebases)
+            self.assertIsNone(loaded.book)
+
+    def test_invalid(self):
+        for fen in ('', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w', '9/8/8/8/8/8/8/8 w', 'x7/8/8/8/8/8/8/8 w',
+                    '8/8/8/8/8/8/8/8 x'):
+            with self.assertRaises(ValueError):
+                Chessboard.from_fen(fen)
+
+
+class Zobrist(unittest.TestCase):
+    def test_incremental_key(self):
+        for board_class in (Chessboard, BitboardChessboard):
+            game = Game(board_class)
+            initial_key = game.chess_board.hash_key
+            for source, target in [('g1', 'f3'), ('g8', 'f6'), ('f3', 'g1')]:
+                game.move(source, target)
+                rebuilt = board_class()
+                rebuilt.pieces_dictionary = dict(game.chess_board.pieces_dictionary)
+                rebuilt.side_to_move = game.active_player
+                self.assertEqual(game.chess_board.hash_key, rebuilt.hash_key)
+            self.assertNotEqual(game.chess_board.hash_key, initial_key)
+            game.move('f6', 'g8')
+            self.assertEqual(game.chess_board.hash_key, initial_key)
+
+
+class Transposition(unittest.TestCase):
+    def test_store_and_probe(self):
+        table = TranspositionTable(size_mb=0.001)
+        self.assertEqual(table.size, 64)
+        self.assertIsNone(table.probe(12345))
+        table.store(12345, 3, -150, LOWER_BOUND, ('e2', 'e4'))
+        self.assertEqual(table.probe(12345), (3, -150, LOWER_BOUND, ('e2', 'e4')))
+        self.assertEqual(table.statistics()['hits'], 1)
+        self.assertEqual(table.statistics()['misses'], 1)
+
+    def test_depth_preferred_replacement(self):
+        table = TranspositionTable(size_mb=0.001)
+        table.store(1, 5, 10, EXACT)
+        # The key 1 + 64 falls on the same entry as the key 1.
+        self.assertFalse(table.store(1 + 64, 2, 20, EXACT))
+        self.assertIsNone(table.probe(1 + 64))
+        self.assertEqual(table.statistics()['collisions'], 1)
+        table.new_search()
+        self.assertTrue(table.store(1 + 64, 2, 20, EXACT))
+        self.assertEqual(table.probe(1 + 64).score, 20)
+
+    def test_shared_memory_age(self):
+        # The tables of the processes of a parallel search share their entries, and must share the age too.
+        memory = bytearray(table_bytes(0.001))
+        main, helper = TranspositionTable(size_mb=0.001, buffer=memory), TranspositionTable(size_mb=0.001, buffer=memory)
+        main.new_search()
+        main.new_search()
+        main.store(1, 5, 10, EXACT)
+        helper.new_search(main.age)
+        self.assertFalse(helper.store(1 + 64, 2, 20, EXACT))
+        self.assertEqual(helper.probe(1).depth, 5)
+
+
+class Search(unittest.TestCase):
+    def test_finds_mate_in_one(self):
+        for board_class in (Chessboard, BitboardChessboard):
+            board = board_class.from_fen('6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1')
+            color = board.side_to_move
+            result = Searcher().search(board, color, max_depth=3)
+            self.assertEqual(result.best_move, ('a1', 'a8'))
+            self.assertEqual(result.score, MATE_SCORE - 1)
+
+    def test_positional_evaluation(self):
+        # With the same material, the search prefers the boxes of the piece-square tables.
+        board = Chessboard.from_fen('4k3/8/8/8/8/8/8/N3K3 w - - 0 1')
+        result = Searcher().search(board, 'white', max_depth=1)
+        self.assertEqual(result.best_move, ('a1', 'b3'))
+        board.move('a1', 'b3')
+        self.assertEqual(result.score, board.evaluate('white'))
+
+    def test_node_limit(self):
+        board = Chessboard.from_fen('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+        color = board.side_to_move
+        result = Searcher().search(board, color, max_nodes=300)
+        self.assertLessEqual(result.nodes, 300)
+        self.assertIn(result.best_move, board.generate_all_moves(color))
+
+    def test_parallel_search(self):
+        board = BitboardChessboard.from_fen('6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1')
+        color = board.side_to_move
+        with ParallelSearcher(threads=2, size_mb=1) as searcher:
+            result = searcher.search(board, color, max_depth=3)
+            self.assertEqual(result.best_move, ('a1', 'a8'))
+            # The analyses are stored in the table shared by the processes.
+            self.assertIsNotNone(searcher.table.probe(board.hash_key))
+
+
+class Undo(unittest.TestCase):
+    def test_undo_and_redo(self):
+        for board_class in (Chessboard, BitboardChessboard):
+            game = Game(board_class)
+            initial_key = game.chess_board.hash_key
+            for source, target in [('e2', 'e4'), ('d7', 'd5'), ('e4', 'd5')]:
+                game.move(source, target)
+            self.assertEqual(len(game.chess_board.taken_pieces), 1)
+            self.assertEqual(game.undo(), ('e4', 'd5'))
+            self.assertEqual(game.chess_board.get_piece_from_position('d5').color, 'black')
+            self.assertEqual(game.chess_board.taken_pieces, [])
+            self.assertEqual(game.active_player, 'white')
+            game.undo()
+            game.undo()
+            self.assertIsNone(game.undo())
+            self.assertEqual(game.chess_board.hash_key, initial_key)
+            self.assertEqual(game.redo(), ('e2', 'e4'))
+            self.assertEqual(game.active_player, 'black')
+            game.move('g8', 'f6')
+            self.assertIsNone(game.redo())
+
+
+class Journal(unittest.TestCase):
+    def test_save_and_load(self):
+        path = os.path.join(tempfile.mkdtemp(), 'Save.pcs')
+        game = Game()
+        journal = GameJournal(path, game, move_clock=20, compact_every=4)
+        journal.start()
+        for source, target in [('e2', 'e4'), ('d7', 'd5'), ('e4', 'd5'), ('d8', 'd5')]:
+            game.move(source, target)
+            journal.record_move((source, target), clock=12)
+        game.undo()
+        journal.record_undo()
+        journal.close()
+
+        # A record only partly written is ignored.
+        with open(path, 'ab') as save_file:
+            save_file.write(b'\x01')
+
+        saved = load_game(path)
+        self.assertEqual(saved.move_clock, 20)
+        self.assertEqual(dict(saved.game.chess_board.pieces_dictionary), dict(game.chess_board.pieces_dictionary))
+        self.assertEqual(saved.game.chess_board.taken_pieces, game.chess_board.taken_pieces)
+        self.assertEqual(saved.game.active_player, 'black')
+
+        with open(path, 'wb') as save_file:
+            save_file.write(b'not a save')
+        with self.assertRaises(SaveFileError):
+            load_game(path)
+
+    def test_start_before_first_move(self):
+        # The save of a new game starts at its first move, from the position before it, so that it is recorded.
+        path = os.path.join(tempfile.mkdtemp(), 'Save.pcs')
+        game = Game()
+        journal = GameJournal(path, game, move_clock=20)
+        game.move('e2', 'e4')
+        before = game.chess_board.copy()
+        before.pop()
+        journal.start(before)
+        journal.record_move(('e2', 'e4'), clock=15)
+        journal.close()
+
+        saved = load_game(path)
+        self.assertEqual(saved.clocks, [15])
+        self.assertEqual(saved.game.active_player, 'black')
+        self.assertIsNotNone(saved.game.undo())
+
+    def test_clocks_kept_by_compaction(self):
+        path = os.path.join(tempfile.mkdtemp(), 'Save.pcs')
+        game = Game()
+        journal = GameJournal(path, game, move_clock=20)
+        journal.start()
+        for move, clock in [(('e2', 'e4'), 17), (('e7', 'e5'), 12), (('g1', 'f3'), 9)]:
+            game.move(*move)
+            journal.record_move(move, clock)
+        # As a Save of the interface: the snapshot replaces the journal, with the last two clocks.
+        journal.compact()
+        journal.close()
+        saved = load_game(path)
+        self.assertEqual(saved.clocks, [12, 9])
+
+        # A move undone after the snapshot was compacted takes its clock away.
+        journal = GameJournal(path, saved.game, move_clock=20, compact_every=2)
+        journal.start(clocks=saved.clocks)
+        for move, clock in [(('b8', 'c6'), 8), (('f1', 'b5'), 5)]:
+            saved.game.move(*move)
+            journal.record_move(move, clock)
+        saved.game.undo()
+        journal.record_undo()
+        journal.close()
+        self.assertEqual(load_game(path).clocks, [9, 8])
+
+
+class Pgn(unittest.TestCase):
+    def test_write_and_read(self):
+        path = os.path.join(tempfile.mkdtemp(), 'games.pgn')
+        game = Game()
+        for source, target in [('e2', 'e4'), ('d7', 'd5'), ('e4', 'd5'), ('g8', 'f6'), ('f1', 'b5')]:
+            game.move(source, target)
+        self.assertEqual(write_games(path, [(game, {'White': 'Alice'}), Game()]), 2)
+
+        games = list(read_games(path))
+        self.assertEqual(len(games), 2)
+        self.assertEqual(games[0].headers['White'], 'Alice')
+        self.assertEqual(games[0].san_moves(), ['e4', 'd5', 'exd5', 'Nf6', 'Bb5+'])
+        self.assertEqual(games[0].replay().to_fen(), game.to_fen())
+
+        # The headers are enough to find a game, which is then read from its offset.
+        offsets = [pgn_game.offset for pgn_game in read_games(path, headers_only=True)]
+        self.assertEqual(offsets, [pgn_game.offset for pgn_game in games])
+        self.assertEqual(next(read_games(path, start=offsets[1])).san_moves(), [])
+
+    def test_unsupported_move(self):
+        path = os.path.join(tempfile.mkdtemp(), 'games.pgn')
+        with open(path, 'w') as pgn_file:
+            pgn_file.write('[Event "?"]\n\n1. e4 {best} e5 (1... c5) 2. Nf3 Nc6 3. Bc4 Bc5 4. O-O *\n')
+        with self.assertRaises(PgnError):
+            next(read_games(path)).replay()
+
+    def test_corrupt_san(self):
+        board = Chessboard()
+        for move in [('e2', 'e4'), ('d7', 'd5')]:
+            board.push(move)
+        # A capture written without x, a capture of an empty box or of an own piece, and a pawn leaving its column.
+        for san in ['d5', 'Kxd1', 'Nxe2', 'Qxd1', 'xd5', 'exd4', 'Bxa6']:
+            with self.assertRaises(PgnError):
+                decode_san(board, san)
+        self.assertEqual(decode_san(board, 'exd5'), ('e4', 'd5'))
+        board.push(('e4', 'd5'))
+        with self.assertRaises(PgnError):
+            decode_san(board, 'Qd5')
+        self.assertEqual(decode_san(board, 'Qxd5'), ('d8', 'd5'))
+
+
+class Validation(unittest.TestCase):
+    def test_reports(self):
+        games = ['e2e4 e7e5 g1f3', 'e2e4 e2e5', 'd2d4 d7d5']
+        for processes in (1, 2):
+            reports = list(validate_games(games, processes=processes, chunk_size=2))
+            self.assertEqual([report.number for report in reports], [1, 2, 3])
+            self.assertEqual([report.error is None for report in reports], [True, False, True])
+            self.assertEqual(reports[1].moves, 1)
+            self.assertEqual(reports[2].fen, 'rnbqkbnr/ppp1pppp/8/3p4/3P4/8/PPP1PPPP/RNBQKBNR w - - 0 1')
+
+    def test_corrupt_pgn(self):
+        path = os.path.join(tempfile.mkdtemp(), 'games.pgn')
+        with open(path, 'w') as pgn_file:
+            pgn_file.write('[Event "?"]\n\n1. e4 d5 2. d5 *\n\n[Event "?"]\n\n1. e4 d5 2. exd5 *\n')
+        reports = list(validate_games(read_games(path), processes=1))
+        self.assertEqual([(report.moves, report.error is None) for report in reports], [(2, False), (3, True)])
+
+
+class Book(unittest.TestCase):
+    def test_build_and_probe(self):
+        folder = tempfile.mkdtemp()
+        games = []
+        for moves, result in [([('e2', 'e4'), ('e7', 'e5')], '1-0'), ([('e2', 'e4'), ('c7', 'c5')], '0-1'),
+                              ([('d2', 'd4'), ('d7', 'd5')], '1/2-1/2')]:
+            game = Game()
+            for move in moves:
+                game.move(*move)
+            games.append((game, {'Result': result}))
+        write_games(os.path.join(folder, 'games.pgn'), games)
+        build_book([os.path.join(folder, 'games.pgn')], os.path.join(folder, 'book.bin'))
+
+        with OpeningBook(os.path.join(folder, 'book.bin')) as book:
+            self.assertEqual(book.moves(Chessboard()), [(('e2', 'e4'), 2), (('d2', 'd4'), 1)])
+            game = Game(computer_color='white', book=book)
+            game.move('e2', 'e4')
+            game.computer_color = 'black'
+            self.assertIn(game.play_computer_move(), [('e7', 'e5'), ('c7', 'c5')])
+            # The book is consulted before searching.
+            self.assertIsNone(game.searcher)
+
+
+class Tablebase(unittest.TestCase):
+    # The tables of 3 pieces take several seconds to generate; they are checked with:
+    # python -m pychecs2.echecs.tablebase generate KQvK KRvK
+    def test_generate_and_probe(self):
+        folder = tempfile.mkdtemp()
+        self.assertEqual(tablebase.generate(['KvK'], folder), ['KvK'])
+        self.assertEqual(tablebase.generate(['KvK'], folder), [])
+        self.assertEqual(tablebase.submaterials('KQvKR'), ['KQvK', 'KvKR'])
+
+        with tablebase.Tablebases(folder) as tablebases:
+            board = Chessboard.from_fen('8/8/8/4k3/8/8/8/4K3 w - - 0 1')
+            self.assertEqual(tablebases.probe(board), (tablebase.DRAW, None))
+            self.assertIn(tablebases.best_move(board), board.generate_all_moves('white'))
+            self.assertIsNone(tablebases.probe(Chessboard()))
+
+    def test_values(self):
+        self.assertEqual(tablebase.decode_value(1), (tablebase.LOSS, 0))
+        self.assertEqual(tablebase.decode_value(20), (tablebase.WIN, 19))
+        self.assertIsNone(tablebase.decode_value(tablebase.INVALID))
+
+
+class Evaluation(unittest.TestCase):
+    def test_piece_square_tables(self):
+        board = Chessboard()
+        self.assertEqual(evaluation.evaluate(board, 'white'), 0)
+        board.push(('g1', 'f3'))
+        # The knight is worth more in the center than on its starting box.
+        self.assertEqual(evaluation.evaluate(board, 'white'), 50)
+        self.assertEqual(evaluation.evaluate(board, 'black'), -50)
+        self.assertEqual(list(evaluation.evaluate_batch([board, Chessboard()], 'black')), [-50, 0])
+
+    def test_incremental_scores(self):
+        for board_class in (Chessboard, BitboardChessboard):
+            board = board_class.from_fen('4k3/8/3p4/4N3/8/8/8/4K3 w - - 0 1')
+            self.assertEqual(board.material, {'white': 320, 'black': 100})
+            for move in [('e5', 'd3'), ('e8', 'd7'), ('d3', 'f4'), ('d6', 'd5'), ('f4', 'd5')]:
+                board.push(move)
+                self.assertEqual(board.evaluate('white'), evaluation.evaluate(board, 'white'))
+            self.assertEqual(board.material_balance, 320)
+            copy = board.copy()
+            while board.undo_stack:
+                board.pop()
+            self.assertEqual(board.material, {'white': 320, 'black': 100})
+            self.assertEqual(board.evaluate('black'), evaluation.evaluate(board, 'black'))
+            self.assertEqual(copy.evaluate('white'), evaluation.evaluate(copy, 'white'))
+
+    def played_positions(self, board_class):
+        # Positions reached by moves (with captures) from the reference positions of perft, and then undone.
+        boards = []
+        for _, fen, _ in REFERENCE_POSITIONS:
+            board = board_class.from_fen(fen)
+            for ply in range(40):
+                moves = board.generate_all_moves(board.side_to_move)
+                if not moves:
+                    break
+                board.push(moves[ply * 7 % len(moves)])
+                boards.append(board.copy())
+            while board.undo_stack:
+                board.pop()
+            boards.append(board)
+        return boards
+
+    def test_piece_codes(self):
+        for board_class in (Chessboard, BitboardChessboard):
+            for board in self.played_positions(board_class):
+                self.assertEqual(list(board.piece_codes), [evaluation.PIECE_BYTES[piece] for piece in board.squares])
+
+    @unittest.skipIf(evaluation.numpy is None, "NumPy is not installed")
+    def test_batch_scores(self):
+        boards = self.played_positions(Chessboard) + self.played_positions(BitboardChessboard)
+        for color in ('white', 'black'):
+            self.assertEqual(list(evaluation.evaluate_batch(boards, color)),
+                             [evaluation.evaluate(board, color) for board in boards])
+
+
+class PieceLists(unittest.TestCase):
+    def test_incremental_boxes(self):
+        for board_class in (Chessboard, BitboardChessboard):
+            board = board_class.from_fen('4k3/8/3p4/4N3/8/8/8/4K3 w - - 0 1')
+            for move in [('e5', 'd3'), ('e8', 'd7'), ('d3', 'f4'), ('d6', 'd5'), ('f4', 'd5')]:
+                board.push(move)
+                for color in ('white', 'black'):
+                    self.assertEqual(sorted(board.pieces(color)),
+                                     [(index, piece) for index, piece in enumerate(board.squares)
+                                      if piece is not None and piece.color == color])
+            self.assertEqual(board.king_position('black'), 'd7')
+            self.assertEqual(board.pieces('black'), [(51, piece.King('black'))])
+            board.remove_piece(51)
+            self.assertFalse(board.color_king_is_on_board('black'))
+            self.assertIsNone(board.king_position('black'))
+            self.assertTrue(board.copy().color_king_is_on_board('white'))
+
+
+class Server(unittest.TestCase):
+    async def play(self):
+        server = await GameServer().start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server, await GameClient.connect(port=port) as white, await GameClient.connect(port=port) as black:
+            game = await white.new_game(time=60, increment=1)
+            self.assertEqual((await black.join_game(game))['active_player'], 'white')
+            with self.assertRaises(ProtocolError):
+                await black.move(game, 'e7', 'e5')
+            # A game number which cannot be a key is refused, without closing the connection.
+            for request in [{'type': 'state', 'game': [1]}, {'type': 'unwatch', 'game': {}}]:
+                await white.send(request)
+                with self.assertRaises(ProtocolError):
+                    await white.wait_for('state')
+            # So is a time control which is not a finite number, such as an integer too big for a float.
+            for time_control in [10 ** 400, float('inf'), float('nan'), True, '300']:
+                with self.assertRaises(ProtocolError):
+                    await white.new_game(time=time_control)
+            for player, source, target in [(white, 'f2', 'f3'), (black, 'e7', 'e5'), (white, 'g2', 'g4')]:
+                pushed = await player.move(game, source, target)
+            self.assertEqual((await black.wait_for('move', target='g4'))['clocks']['white'], pushed['clocks']['white'])
+            with self.assertRaises(ProtocolError):
+                await black.move(game, 'd8', 'a5')
+            await black.move(game, 'd8', 'h4')
+            self.assertEqual((await white.wait_for('end'))['result'], '0-1')
+
+            game = await white.new_game(time=0.2)
+            await black.join_game(game)
+            end = await black.wait_for('end', game=game)
+            self.assertEqual((end['result'], end['reason']), ('0-1', 'time'))
+
+    def test_games(self):
+        asyncio.run(self.play())
+
+    async def watch(self):
+        server = await GameServer().start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server, await GameClient.connect(port=port) as white, await GameClient.connect(port=port) as black, \
+                await GameClient.connect(port=port) as early, await GameClient.connect(port=port) as late:
+            game = await white.new_game()
+            self.assertEqual((await early.watch(game))['ply'], 0)
+            await black.join_game(game)
+            for player, source, target in [(white, 'e2', 'e4'), (black, 'e7', 'e5'), (white, 'g1', 'f3')]:
+                await player.move(game, source, target)
+            # The snapshot of the first spectator is shared, followed by the moves played since.
+            self.assertEqual((await late.watch(game))['ply'], 0)
+            await black.move(game, 'b8', 'c6')
+            self.assertEqual([(await late.wait_for('move'))['target'] for _ in range(4)], ['e4', 'e5', 'f3', 'c6'])
+            self.assertEqual([(await early.wait_for('move'))['ply'] for _ in range(4)], [1, 2, 3, 4])
+            await white.resign(game)
+            self.assertEqual((await late.wait_for('end'))['result'], '0-1')
 
+    def test_spectators(self):
+        asyncio.run(self.watch())
 
+    async def drop(self):
+        class Writer:
+            def __init__(self):
+                self.data = []
+                self.blocked = asyncio.get_running_loop().create_future()
 
+            def is_closing(self):
+                return False
 
+            def write(self, data):
+                self.data.append(data)
 
+            async def drain(self):
+                await self.blocked
 
+        class Connection:
+            def __init__(self):
+                self.writer = Writer()
 
+        broadcast = Broadcast(lambda plies: b'snapshot %d\n' % plies, queue_size=2, snapshot_interval=2)
+        slow = Connection()
+        broadcast.subscribe(slow)
+        await asyncio.sleep(0)
+        self.assertEqual(broadcast.publish(b'move 1\n', move=True), [])
+        self.assertEqual(broadcast.publish(b'move 2\n', move=True), [])
+        self.assertEqual(broadcast.publish(b'move 3\n', move=True), [slow])
+        self.assertEqual(slow.writer.data, [b'snapshot 0\n'])
 
+        # A new snapshot is encoded when the last one is 2 moves old, else it is shared, followed by the moves since.
+        late, later = Connection(), Connection()
+        broadcast.subscribe(late)
+        broadcast.publish(b'move 4\n', move=True)
+        broadcast.subscribe(later)
+        await asyncio.sleep(0)
+        self.assertEqual(late.writer.data, [b'snapshot 3\n'])
+        self.assertEqual(later.writer.data, [b'snapshot 3\nmove 4\n'])
+        self.assertEqual((len(broadcast), broadcast.dropped), (2, 1))
+        broadcast.close()
 
+    def test_slow_spectator(self):
+        asyncio.run(self.drop())
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the TranspositionTable class, a cache of the results of the analysis of positions, indexed by
+the Zobrist key of the positions (Chessboard.hash_key).
+
+Its size is fixed when it is created: the entries are stored in a preallocated array of 64-bit integers, two per
+entry (the key of the position, then the data of the entry packed in a single integer). When two positions fall on
+the same entry, a replacement policy decides which one is kept.
+
+The array can be placed in a memory shared between processes (see the parallel module). The entries are then read
+and written without lock: the key is stored "exclusive or" (^) the data, so that an entry half written by another
+process does not match the key of its position, and is ignored.
+
+"""
+from array import array
+from collections import namedtuple
+
+from pychecs2.echecs.tables import SQUARE_NAMES, SQUARE_INDEX
+
+# Types of bounds of a score: the exact score, or a score which is at least (LOWER_BOUND) or at most (UPPER_BOUND)
+# the real score, when the analysis of the position was cut by alpha-beta.
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+# Replacement policies. With DEPTH_PREFERRED, an entry is kept against a shallower analysis of another position,
+# unless it comes from a previous search (it is older). With ALWAYS_REPLACE, the most recent analysis is kept.
+DEPTH_PREFERRED = 'depth'
+ALWAYS_REPLACE = 'always'
+
+ENTRY_SIZE = 16
+MAX_DEPTH = 255
+MAX_AGE = 255
+
+TableEntry = namedtuple('TableEntry', ['depth', 'score', 'bound', 'best_move'])
+
+
+def encode_move(move):
+    """
+    Encodes a move in 13 bits: 0 for no move, and 1 + 64 * source box + target box otherwise.
+
+    Args:
+        move (tuple or None): The move, as a (source position, target position) tuple, or None.
+
+    Returns:
+        int: The code of the move.
+
+    """
+    if move is None:
+        return 0
+    return 1 + SQUARE_INDEX[move[0]] * 64 + SQUARE_INDEX[move[1]]
+
+
+def decode_move(code):
+    """
+    Decodes a move encoded by encode_move().
+
+    Args:
+        code (int): The code of the move.
+
+    Returns:
+        tuple or None: The move, as a (source position, target position) tuple, or None.
+
+    """
+    if code == 0:
+        return None
+    return SQUARE_NAMES[(code - 1) // 64], SQUARE_NAMES[(code - 1) % 64]
+
+
+def pack_entry(depth, score, bound, best_move, age):
+    """
+    Packs the data of an entry in a 64-bit integer: the move (bits 0 to 12), the bound (13 and 14), the depth (15 to
+    22), the age (23 to 30) and the score, shifted to be positive (32 to 63).
+
+    """
+    return (encode_move(best_move) | bound << 13 | min(depth, MAX_DEPTH) << 15 | age << 23
+            | (score + 2 ** 31) << 32)
+
+
+def unpack_entry(data):
+    """
+    Unpacks the data of an entry packed by pack_entry().
+
+    Returns:
+        TableEntry: The depth, score, bound and best move of the entry.
+
+    """
+    return TableEntry(data >> 15 & 0xff, (data >> 32) - 2 ** 31, data >> 13 & 0x3, decode_move(data & 0x1fff))
+
+
+def table_bytes(size_mb):
+    """
+    Returns the memory used by a table of a given size: the number of entries is rounded down to a power of two, so
+    that the entry of a key is key & mask.
+
+    Args:
+        size_mb (float): The requested memory, in megabytes.
+
+    Returns:
+        int: The memory used by the entries, in bytes.
+
+    """
+    entries = max(1, int(size_mb * 2 ** 20) // ENTRY_SIZE)
+    return ENTRY_SIZE << (entries.bit_length() - 1)
+
+
+class TranspositionTable:
+    """
+    A cache of analyses of positions, with a fixed memory size.
+
+    Attributes:
+        size (int): The number of entries, a power of two.
+        replacement (str): The replacement policy, DEPTH_PREFERRED or ALWAYS_REPLACE.
+        age (int): The number of the current search, incremented by new_search().
+        hits (int): The number of probes which found the position.
+        misses (int): The number of probes which did not find the position.
+        collisions (int): Among the misses, the number of probes whose entry was used by another position.
+        stores (int): The number of analyses stored.
+        rejections (int): The number of analyses not stored because of the replacement policy.
+
+    Args:
+        size_mb (float): The memory to use, in megabytes (16 bytes per entry).
+        replacement (str): The replacement policy, DEPTH_PREFERRED (the default) or ALWAYS_REPLACE.
+        buffer (buffer): A memory of at least table_bytes(size_mb) bytes in which to store the entries, for example
+            the buf of a multiprocessing.shared_memory.SharedMemory, or None to allocate a new one.
+
+    """
+    def __init__(self, size_mb=16, replacement=DEPTH_PREFERRED, buffer=None):
+        if replacement not in (DEPTH_PREFERRED, ALWAYS_REPLACE):
+            raise ValueError("Unknown replacement policy: {}".format(replacement))
+
+        self.size = table_bytes(size_mb) // ENTRY_SIZE
+        self.mask = self.size - 1
+        self.replacement = replacement
+        if buffer is None:
+            self.slots = array('Q', bytes(ENTRY_SIZE * self.size))
+        else:
+            self.slots = memoryview(buffer).cast('B')[:ENTRY_SIZE * self.size].cast('Q')
+        self.age = 0
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        """
+        Resets the counters of hits, misses, collisions, stores and rejections.
+
+        """
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+        self.rejections = 0
+
+    def clear(self):
+        """
+        Empties the table, without freeing its memory.
+
+        """
+        memoryview(self.slots).cast('B')[:] = bytes(ENTRY_SIZE * self.size)
+        self.age = 0
+        self.reset_statistics()
+
+    def new_search(self, age=None):
+        """
+        Indicates that a new search begins: the entries of the previous searches become older, and will be replaced
+        first.
+
+        Args:
+            age (int): The age of the new search, or None for the next one. The tables sharing the same memory in
+                several processes must use the same age, otherwise each one sees the entries of the others as old.
+
+        """
+        self.age = (self.age + 1) % (MAX_AGE + 1) if age is None else age
+
+    def probe(self, key):
+        """
+        Looks for the analysis of a position.
+
+        Args:
+            key (int): The Zobrist key of the position.
+
+        Returns:
+            TableEntry or None: The analysis of the position, and None if it is not in the table.
+
+        """
+        index = (key & self.mask) * 2
+        data = self.slots[index + 1]
+        if data and self.slots[index] ^ data == key:
+            self.hits += 1
+            return unpack_entry(data)
+
+        self.misses += 1
+        if data:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, score, bound, best_move=None):
+        """
+        Stores the analysis of a position, if the replacement policy allows it.
+
+        Args:
+            key (int): The Zobrist key of the position.
+            depth (int): The depth of the analysis, in moves.
+            score (int): The score of the position.
+            bound (int): The type of score: EXACT, LOWER_BOUND or UPPER_BOUND.
+            best_move (tuple): The best move found, as a (source position, target position) tuple, or None.
+
+        Returns:
+            bool: True if the analysis was stored, and False otherwise.
+
+        """
+        index = (key & self.mask) * 2
+        data = self.slots[index + 1]
+        same_position = data and self.slots[index] ^ data == key
+        if (data and self.replacement == DEPTH_PREFERRED and not same_position
+                and data >> 23 & 0xff == self.age and data >> 15 & 0xff > depth):
+            self.rejections += 1
+            return False
+
+        # A new analysis of the same position without a best move keeps the previous best move.
+        if best_move is None and same_position:
+            best_move = decode_move(data & 0x1fff)
+
+        data = pack_entry(depth, score, bound, best_move, self.age)
+        self.slots[index] = key ^ data
+        self.slots[index + 1] = data
+        self.stores += 1
+        return True
+
+    def usage(self):
+        """
+        Returns the proportion of the entries used, estimated on the first thousand entries.
+
+        Returns:
+            float: The proportion of used entries, between 0 and 1.
+
+        """
+        sample = min(self.size, 1000)
+        return sum(1 for index in range(sample) if self.slots[2 * index + 1]) / sample
+
+    def statistics(self):
+        """
+        Returns the statistics of use of the table.
+
+        Returns:
+            dict: The number of hits, misses, collisions, stores and rejections, and the hit rate (between 0 and 1).
+
+        """
+        probes = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'stores': self.stores,
+            'rejections': self.rejections,
+            'hit_rate': self.hits / probes if probes else 0.0,
+        }
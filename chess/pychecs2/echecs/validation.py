@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the validation of game collections: each game is replayed move by move, and its first illegal move
+(if any) and its final position are reported. The games are independent, so they are spread over a pool of
+processes: they are read one chunk at a time and sent to the processes, and only a few chunks are waiting at the same
+time, so that a collection of any size is validated in a bounded memory.
+
+Two formats are read: PGN files (see the pgn module), and lists of moves, one game per line, each move written as its
+source and target positions (e2e4 or e2-e4). It is run from the folder containing the pychecs2 package, e.g.:
+
+    python -m pychecs2.echecs.validation games.pgn --processes 4
+    python -m pychecs2.echecs.validation games.txt --processes 4 --chunk 500 --positions
+
+"""
+import argparse
+import itertools
+import multiprocessing
+import time
+from collections import deque, namedtuple
+
+from pychecs2.echecs.chess_board import Chessboard, MoveException
+from pychecs2.echecs.game import Game, NoPieceInPosition, WrongColorException
+from pychecs2.echecs.perft import BOARD_CLASSES
+from pychecs2.echecs.pgn import PgnError, read_games
+
+# The number of games sent to a process at a time.
+CHUNK_SIZE = 256
+
+# The number of chunks waiting for each process: enough to keep the processes busy, few enough to bound the memory.
+CHUNKS_PER_PROCESS = 2
+
+# The result of the validation of a game: its number in the collection (from 1), the number of moves played, the
+# position in FEN notation after them (the final position, or the one before the illegal move), and the reason why
+# the game is illegal (None if it is legal).
+GameReport = namedtuple('GameReport', ['number', 'moves', 'fen', 'error'])
+
+
+def replay_moves(line, board_class=Chessboard):
+    """
+    Replays a game written as a list of moves, such as 'e2e4 e7e5 g1f3'.
+
+    Args:
+        line (str): The moves, separated by spaces.
+        board_class (type): The class of the chessboard of the game.
+
+    Returns:
+        Game, str: The game after the last legal move, and the reason why the next move is illegal (None if all
+            the moves are legal).
+
+    """
+    game = Game(board_class)
+    for number, move in enumerate(line.split(), 1):
+        source, target = move[:2], move[-2:]
+        try:
+            if len(move) not in (4, 5):
+                raise MoveException("Invalid notation")
+            game.move(source, target)
+        except (NoPieceInPosition, WrongColorException, MoveException) as error:
+            return game, "Half-move {}: {} ({})".format(number, move, error)
+    return game, None
+
+
+def replay_pgn(pgn_game, board_class=Chessboard):
+    """
+    Replays a game read from a PGN file, from the initial position or the position of its FEN tag.
+
+    Args:
+        pgn_game (PgnGame): The game.
+        board_class (type): The class of the chessboard of the game.
+
+    Returns:
+        Game, str: The game after the last legal move, and the reason why the next move is illegal (None if all
+            the moves are legal).
+
+    """
+    try:
+        game = pgn_game.initial_game(board_class)
+    except PgnError as error:
+        return Game(board_class), str(error)
+
+    try:
+        pgn_game.play_moves(game)
+    except PgnError as error:
+        return game, str(error)
+    return game, None
+
+
+def validate_game(number, game, board_class=Chessboard):
+    """
+    Validates a game.
+
+    Args:
+        number (int): The number of the game in the collection.
+        game (PgnGame or str): The game, read from a PGN file, or written as a list of moves.
+        board_class (type): The class of the chessboard to use.
+
+    Returns:
+        GameReport: The result of the validation.
+
+    """
+    if isinstance(game, str):
+        replayed, error = replay_moves(game, board_class)
+    else:
+        replayed, error = replay_pgn(game, board_class)
+    return GameReport(number, len(replayed.chess_board.undo_stack), replayed.to_fen(), error)
+
+
+def validate_chunk(chunk, board_class=Chessboard):
+    """
+    Validates a chunk of games, in a process of the pool.
+
+    Args:
+        chunk (list): The games, as (number, game) tuples.
+        board_class (type): The class of the chessboard to use.
+
+    Returns:
+        list: The GameReport of each game.
+
+    """
+    return [validate_game(number, game, board_class) for number, game in chunk]
+
+
+def read_collection(path):
+    """
+    Reads the games of a collection, one at a time: the games of a PGN file (extension .pgn), or the non-empty
+    lines of a list of moves.
+
+    Yields:
+        PgnGame or str: The games.
+
+    """
+    if path.lower().endswith('.pgn'):
+        yield from read_games(path)
+        return
+
+    with open(path, encoding='utf-8') as moves_file:
+        for line in moves_file:
+            if line.strip():
+                yield line
+
+
+def validate_games(games, processes=None, chunk_size=CHUNK_SIZE, board_class=Chessboard):
+    """
+    Validates games across a pool of processes.
+
+    Args:
+        games (iterable): The games (PgnGame instances or lists of moves), read as the validation goes.
+        processes (int): The number of processes. By default, the number of cores of the machine; with 1, the games
+            are validated in the calling process.
+        chunk_size (int): The number of games sent to a process at a time.
+        board_class (type): The class of the chessboard to use.
+
+    Yields:
+        GameReport: The result of each game, in the order of the games.
+
+    """
+    processes = max(1, processes if processes is not None else multiprocessing.cpu_count())
+    numbered = enumerate(games, 1)
+    chunks = iter(lambda: list(itertools.islice(numbered, chunk_size)), [])
+
+    if processes == 1:
+        for chunk in chunks:
+            yield from validate_chunk(chunk, board_class)
+        return
+
+    with multiprocessing.Pool(processes) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(validate_chunk, (chunk, board_class)))
+            if len(pending) >= processes * CHUNKS_PER_PROCESS:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Replays a collection of games and reports the illegal moves.")
+    parser.add_argument('path', help="PGN file (.pgn), or file with one game per line as moves such as e2e4")
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+                        help="number of processes (default: the number of cores)")
+    parser.add_argument('--chunk', type=int, default=CHUNK_SIZE,
+                        help="number of games sent to a process at a time (default: {})".format(CHUNK_SIZE))
+    parser.add_argument('--board', choices=sorted(BOARD_CLASSES), default='dict',
+                        help="chessboard implementation to use (default: dict)")
+    parser.add_argument('--positions', action='store_true', help="display the final position of each game")
+    args = parser.parse_args(arguments)
+
+    start = time.perf_counter()
+    games = illegal = 0
+    for report in validate_games(read_collection(args.path), args.processes, max(1, args.chunk),
+                                 BOARD_CLASSES[args.board]):
+        games += 1
+        if report.error is not None:
+            illegal += 1
+            print('Game {}: illegal, {}'.format(report.number, report.error))
+        if args.positions:
+            print('Game {}: {}'.format(report.number, report.fen))
+    elapsed = time.perf_counter() - start
+
+    print('Games: {}, illegal: {}'.format(games, illegal))
+    print('Time: {:.3f} s'.format(elapsed))
+    print('Games per second: {:.0f}'.format(games / max(elapsed, 1e-9)))
+    return 0 if illegal == 0 else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
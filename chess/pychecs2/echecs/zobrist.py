@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the random keys of the Zobrist hashing of the positions. The key of a position is the "exclusive
+or" (^) of a key for each piece on its box, and of SIDE_KEY if black has to play. Moving a piece thus only requires
+to "remove" the key of the piece on its source box and to "add" its key on the target box, since x ^ k ^ k == x.
+
+The keys are drawn from a generator with a fixed seed, so that a position has the same key in every process and
+every session (keys can be saved, or shared between processes).
+
+"""
+import random
+
+from pychecs2.echecs.piece import Pawn, Knight, Bishop, Rook, Queen, King
+from pychecs2.echecs.tables import SQUARE_INDEX
+
+_generator = random.Random(20211003)
+
+# PIECE_KEYS[color, type of piece][box]: the key of a piece on a box (see the tables module for the boxes).
+PIECE_KEYS = {(color, piece_type): [_generator.getrandbits(64) for _ in range(64)]
+              for color in ('white', 'black') for piece_type in (Pawn, Knight, Bishop, Rook, Queen, King)}
+
+# The key added when black has to play.
+SIDE_KEY = _generator.getrandbits(64)
+
+
+def piece_keys(piece):
+    """
+    Returns the keys of a piece for the 64 boxes.
+
+    Args:
+        piece (Piece): The piece.
+
+    Returns:
+        list: The 64 keys of the piece, indexed by the number of the box.
+
+    """
+    return PIECE_KEYS[piece.color, piece.__class__]
+
+
+def pieces_key(pieces_dictionary):
+    """
+    Computes from scratch the key of the pieces of a dictionary of pieces, without the side to move.
+
+    Args:
+        pieces_dictionary (dict): A dictionary whose keys are positions ('a1', 'e4', ...) and values are pieces.
+
+    Returns:
+        int: The key, a 64-bit integer.
+
+    """
+    key = 0
+    for position, piece in pieces_dictionary.items():
+        key ^= piece_keys(piece)[SQUARE_INDEX[position]]
+    return key
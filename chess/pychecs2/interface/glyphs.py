@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the GlyphCache class, which draws the pieces as images (PhotoImage) instead of text. Each of the 12
+pieces is drawn once for a size of box, and the same image is then displayed on every box, which is much faster
+for Tk than laying out the characters of a text item at each drawing.
+
+The images are drawn with the Pillow library, which is optional: without it (or without a font containing the chess
+characters), image() returns None and the interface displays the pieces as text.
+
+"""
+from collections import OrderedDict
+
+try:
+    from PIL import Image, ImageDraw, ImageFont, ImageTk
+except ImportError:
+    Image = None
+
+# Fonts containing the chess characters, tried in this order.
+FONT_FILES = ("DejaVuSans.ttf", "Symbola.ttf", "seguisym.ttf", "Arial Unicode.ttf")
+
+# The number of sizes of box whose images are kept: the current size, and the previous one, in case the window
+# goes back to it.
+KEPT_SIZES = 2
+
+
+def find_font_file():
+    """
+    Finds a font containing the chess characters, by loading the fonts of FONT_FILES until one is found.
+
+    Returns:
+        str or None: The font file, and None if Pillow or all the fonts of FONT_FILES are missing.
+
+    """
+    if Image is None:
+        return None
+
+    for font_file in FONT_FILES:
+        try:
+            ImageFont.truetype(font_file, 10)
+        except OSError:
+            continue
+        return font_file
+
+    return None
+
+
+class GlyphCache:
+    """
+    The images of the pieces, for the sizes of box recently displayed.
+
+    Attributes:
+        images (OrderedDict): For each size of box (in pixels), the dictionary of the images of the pieces by
+            character. The most recently used size is at the end.
+        fonts (dict): For each size of box in images, the font used to draw the pieces.
+        font_file (str): The font containing the chess characters, looked for once, or None.
+        available (bool): False if the images cannot be drawn (no Pillow, or no font), in which case the pieces are
+            displayed as text.
+
+    Args:
+        master (Misc): The Tk widget to which the images belong.
+
+    """
+    def __init__(self, master):
+        self.master = master
+        self.images = OrderedDict()
+        self.fonts = {}
+        self.font_file = find_font_file()
+        self.available = self.font_file is not None
+
+    def image(self, piece, size):
+        """
+        Returns the image of a piece for a size of box, drawing it the first time.
+
+        Args:
+            piece (Piece): The piece to draw.
+            size (int): The size of the box, in pixels.
+
+        Returns:
+            PhotoImage or None: The image, and None if images cannot be drawn.
+
+        """
+        if not self.available or size <= 0:
+            return None
+
+        if size not in self.images:
+            # The character takes two thirds of the box, as the text of size n_pixels_per_box // 2 points did.
+            self.images[size] = {}
+            self.fonts[size] = ImageFont.truetype(self.font_file, size * 2 // 3)
+        self.images.move_to_end(size)
+
+        char = str(piece)
+        images = self.images[size]
+        if char not in images:
+            images[char] = self.draw(char, size)
+        return images[char]
+
+    def draw(self, char, size):
+        """
+        Draws a character, centered in a transparent square image.
+
+        Args:
+            char (str): The character of the piece.
+            size (int): The size of the image, in pixels.
+
+        Returns:
+            PhotoImage: The image.
+
+        """
+        picture = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+        ImageDraw.Draw(picture).text(
+            (size / 2, size / 2), char, font=self.fonts[size], fill="black", anchor="mm"
+        )
+        return ImageTk.PhotoImage(picture, master=self.master)
+
+    def evict(self, kept=KEPT_SIZES):
+        """
+        Forgets the images of the sizes which are no longer displayed, keeping the most recently used ones. Tk frees
+        an image when it is no longer referenced, so this method must be called once the canvas items use the
+        images of the current size.
+
+        Args:
+            kept (int): The number of sizes to keep.
+
+        """
+        while len(self.images) > kept:
+            size, _ = self.images.popitem(last=False)
+            del self.fonts[size]
@@ -4,12 +4,17 @@ a chessboard in a Canvas, then determine which box has been selected.
 
 """
 
-import pickle, webbrowser
-from tkinter import NSEW, Canvas, Label, Tk, messagebox, Menu, Button
+import webbrowser
+from tkinter import NSEW, Canvas, Label, Tk, messagebox, filedialog, Menu, Button, font
 
 # Exemple d'importation de la classe Partie.
 from pychecs2.echecs.game import Game, NoPieceInPosition, WrongColorException
-from pychecs2.echecs.chess_board import MoveException
+from pychecs2.echecs.book import OpeningBook
+from pychecs2.echecs.tablebase import Tablebases
+from pychecs2.echecs.chess_board import Chessboard, MoveException
+from pychecs2.echecs.journal import GameJournal, SaveFileError, load_game as load_saved_game
+from pychecs2.echecs.pgn import write_games
+from pychecs2.interface.glyphs import GlyphCache
 
 
 class CanvasChessboard(Canvas):
@@ -28,14 +33,15 @@ class CanvasChessboard(Canvas):
         self.row_numbers = ["1", "2", "3", "4", "5", "6", "7", "8"]
         self.col_letters = ["a", "b", "c", "d", "e", "f", "g", "h"]
 
-        self.boxes_list = []
-
         # Selected Position
         self.selected_position = None
 
         # Game
         self.game = game
 
+        # The save of the game, updated after each move.
+        self.journal = GameJournal(SAVE_FILE, game, start_time)
+
         # Number of pixels per box, variable.
         self.n_pixels_per_box = n_pixels_per_box
 
@@ -47,6 +53,9 @@ class CanvasChessboard(Canvas):
             height=self.n_columns * self.n_pixels_per_box,
         )
 
+        # The images of the pieces, drawn once per size of box.
+        self.glyphs = GlyphCache(self)
+
         # Dictionary containing the pieces.
         self.pieces = {
             "a1": "TB",
@@ -85,6 +94,21 @@ class CanvasChessboard(Canvas):
 
         # Variable that allows to switch between 2 themes via sms()
         self.theme = 0
+
+        # The items of the canvas are kept from one drawing to the next: the rectangle of each box, and the text of
+        # each piece, by position. drawn_pieces and drawn_theme are what is currently displayed, so that only the
+        # boxes whose piece has changed are redrawn.
+        self.box_items = {}
+        self.piece_items = {}
+        self.drawn_pieces = {}
+        self.drawn_theme = None
+
+        # The font of the pieces for each number of pixels per box, created once.
+        self.fonts = {}
+
+        # The size received by the last <Configure> event not yet drawn, and the drawing scheduled for it.
+        self.pending_size = None
+        self.resize_job = None
         # List that will store the performed movements
         self.moves_done = []
 
@@ -94,26 +118,54 @@ class CanvasChessboard(Canvas):
         self.bind("<Configure>", self.resize)
 
     def change_theme(self):
-        if self.theme == 1:
-            theme = 0
-            self.draw_boxes(theme)
-
-        else:
-            theme = 0
-            self.draw_boxes(theme)
+        self.theme = 1 - self.theme
         self.refresh()
 
+    def box_coords(self, position):
+        """
+        Returns the coordinates (left, top, right, bottom) of the box of a position in the canvas.
+        """
+        row = self.n_rows - self.row_numbers.index(position[1]) - 1
+        col = self.col_letters.index(position[0])
+        return (
+            col * self.n_pixels_per_box,
+            row * self.n_pixels_per_box,
+            (col + 1) * self.n_pixels_per_box,
+            (row + 1) * self.n_pixels_per_box,
+        )
+
+    def piece_coords(self, position):
+        """
+        Returns the coordinates of the center of the box of a position, where its piece is drawn.
+        """
+        col_start, row_start = self.box_coords(position)[:2]
+        return (
+            col_start + self.n_pixels_per_box // 2,
+            row_start + self.n_pixels_per_box // 2,
+        )
+
+    def piece_font(self):
+        """
+        Returns the font of the pieces for the current size of the boxes. The fonts are created once per size,
+        so that the size of the window can go back and forth without creating new fonts.
+        """
+        if self.n_pixels_per_box not in self.fonts:
+            self.fonts[self.n_pixels_per_box] = font.Font(
+                family="Deja Vu", size=self.n_pixels_per_box // 2
+            )
+        return self.fonts[self.n_pixels_per_box]
+
     def draw_boxes(self, theme):
         """
-        Method that draws the boxes on the chessboard.
+        Method that draws the boxes on the chessboard. The rectangles are created the first time only; after
+        that, only their color is changed, if the theme has changed.
         """
+        if self.box_items and theme == self.drawn_theme:
+            return
 
         for i in range(self.n_rows):
             for j in range(self.n_columns):
-                row_start = i * self.n_pixels_per_box
-                row_end = row_start + self.n_pixels_per_box
-                col_start = j * self.n_pixels_per_box
-                col_end = col_start + self.n_pixels_per_box
+                position = self.col_letters[j] + self.row_numbers[self.n_rows - i - 1]
                 color = ""
                 # We determine the color.
                 if (i + j) % 2 == 0:
@@ -129,70 +181,107 @@ class CanvasChessboard(Canvas):
 
                 # We draw the rectangle. We use the attribute "tags" to be able to retrieve the elements
                 # afterwards.
-                self.create_rectangle(
-                    col_start, row_start, col_end, row_end, fill=color, tags="box"
-                )
+                if position in self.box_items:
+                    self.itemconfig(self.box_items[position], fill=color)
+                else:
+                    self.box_items[position] = self.create_rectangle(
+                        *self.box_coords(position), fill=color, tags="box"
+                    )
+
+        self.drawn_theme = theme
 
     def draw_pieces(self):
-        # Caractères  représentant les pièces. Vous avez besoin de la police d'écriture DejaVu.
-        piece_chars = {
-            "PB": "\u2659",
-            "PN": "\u265f",
-            "TB": "\u2656",
-            "TN": "\u265c",
-            "CB": "\u2658",
-            "CN": "\u265e",
-            "FB": "\u2657",
-            "FN": "\u265d",
-            "RB": "\u2654",
-            "RN": "\u265a",
-            "DB": "\u2655",
-            "DN": "\u265b",
-        }
+        # Only the positions whose piece differs from the one displayed are redrawn (after a move, the source
+        # and target positions).
+        pieces = dict(self.game.chess_board.pieces_dictionary)
+        for position in list(self.drawn_pieces):
+            if position not in pieces:
+                self.delete(self.piece_items.pop(position))
+                del self.drawn_pieces[position]
+
+        for position, piece in pieces.items():
+            if self.drawn_pieces.get(position) is piece:
+                continue
+
+            self.draw_piece(position, piece)
+            self.drawn_pieces[position] = piece
+
+    def draw_piece(self, position, piece):
+        """
+        Draws a piece in the canvas, in the center of the box of a position, replacing the piece drawn there if
+        any. The piece is an image of the glyph cache, or a text if images are not available.
+        """
+        image = self.glyphs.image(piece, self.n_pixels_per_box)
+        item = self.piece_items.get(position)
+        if item is not None:
+            if image is not None:
+                self.itemconfig(item, image=image)
+            else:
+                self.itemconfig(item, text=piece)
+            return
 
-        # For any pair position, piece:
-        for position, piece in self.game.chess_board.pieces_dictionary.items():
-            # We draw the piece in the canvas, in the center of the box. We use the attribute "tags" to be in
-            # ability to retrieve the elements in the canvas.
-            coordonnee_y = (
-                self.n_rows - self.row_numbers.index(position[1]) - 1
-            ) * self.n_pixels_per_box + self.n_pixels_per_box // 2
-            coordonnee_x = (
-                self.col_letters.index(position[0]) * self.n_pixels_per_box
-                + self.n_pixels_per_box // 2
+        # We use the attribute "tags" to be in ability to retrieve the elements in the canvas.
+        if image is not None:
+            self.piece_items[position] = self.create_image(
+                *self.piece_coords(position), image=image, tags="piece"
             )
-            self.create_text(
-                coordonnee_x,
-                coordonnee_y,
+        else:
+            self.piece_items[position] = self.create_text(
+                *self.piece_coords(position),
                 text=piece,
-                font=("Deja Vu", self.n_pixels_per_box // 2),
+                font=self.piece_font(),
                 tags="piece",
             )
 
     def resize(self, event):
         # We receive in the "event" the new dimension in the attributes width and height. We want a checkerboard
         # box, then only the smaller of these two values is retained.
-        nouvelle_taille = min(event.width, event.height)
+        self.pending_size = min(event.width, event.height)
+
+        # Dragging the edge of the window generates many events: the chessboard is drawn only once Tk has
+        # nothing else to do, at the last size received.
+        if self.resize_job is None:
+            self.resize_job = self.after_idle(self.apply_resize)
+
+    def apply_resize(self):
+        """
+        Draws the chessboard at the last size received by resize().
+        """
+        self.resize_job = None
+        if not self.winfo_exists():
+            return
+
+        nouvelle_taille = self.pending_size
 
         # Calculation of the new dimension of the boxes.
-        self.n_pixels_per_box = nouvelle_taille // self.n_rows
+        n_pixels_per_box = nouvelle_taille // self.n_rows
+        if n_pixels_per_box == self.n_pixels_per_box and self.box_items:
+            return
+        self.n_pixels_per_box = n_pixels_per_box
 
-        # We delete the old boxes and add the new ones.
-        self.delete("box")
-        self.draw_boxes(self.theme)
+        # The existing boxes and pieces are moved and resized, and the missing ones are drawn.
+        for position, item in self.box_items.items():
+            self.coords(item, *self.box_coords(position))
+        for position, item in self.piece_items.items():
+            self.coords(item, *self.piece_coords(position))
+            image = self.glyphs.image(self.drawn_pieces[position], self.n_pixels_per_box)
+            if image is not None:
+                self.itemconfig(item, image=image)
+            else:
+                self.itemconfig(item, font=self.piece_font())
+        self.refresh()
 
-        # We delete the old pieces and add the new ones.
-        self.delete("piece")
-        self.draw_pieces()
+        # The images of the sizes no longer displayed can be freed.
+        self.glyphs.evict()
 
     def refresh(self):
         """
-        Allows you to redraw the window after each call of the function.
+        Allows you to redraw the window after each call of the function. Only what has changed since the last
+        drawing is redrawn, and the outlines of the selected box and of its valid moves are removed.
         """
-        self.delete("box")
+        self.delete("indications")
+        self.delete("boxs_debut")
         self.draw_boxes(self.theme)
-
-        self.delete("piece")
         self.draw_pieces()
 
     def options(self):
@@ -207,6 +296,19 @@ class CanvasChessboard(Canvas):
             label="instructions", command=lambda: self.instructions()
         )
         self.infos.add_command(label="Done moves", command=lambda: self.moves_done())
+        self.infos.add_command(label="Export the game (PGN)", command=lambda: self.export_pgn())
+        self.infos.add_separator()
+        self.infos.add_command(
+            label="Computer plays black",
+            command=lambda: self.master.set_computer_color("black"),
+        )
+        self.infos.add_command(
+            label="Computer plays white",
+            command=lambda: self.master.set_computer_color("white"),
+        )
+        self.infos.add_command(
+            label="Two players", command=lambda: self.master.set_computer_color(None)
+        )
         self.barre_tache.add_cascade(label="Options", menu=self.infos)
 
     def instructions(self):
@@ -227,35 +329,45 @@ class CanvasChessboard(Canvas):
             self.quit()
 
     def save_game(self):
-        # Allows to save_game the dictionary of pieces
-        with open("Save", "wb") as f:
-            pickle.dump(self.game.chess_board.pieces_dictionary, f)
-        with open("Save.txt", "w") as f:
-            f.write(str(self.game.chess_board.pieces_dictionary))
-            f.close()
+        # The save is rewritten with the current position; the next moves are then added to it as they are
+        # played (see the journal module).
+        self.journal.compact()
 
     def load_game(self):
         """
         Function load_game of the menu which allows to recover the last backup.
         Then, update the chessboard and reset the counter to zero.
         """
-        with open("Save", "rb") as f:
-            self.game.chess_board.pieces_dictionary = pickle.load(f)
-        self.game.chess_board.pieces_prises = []
+        try:
+            saved = load_saved_game(SAVE_FILE, self.game.chess_board.__class__)
+        except (OSError, SaveFileError) as e:
+            messagebox.showinfo(
+                title="Resume the previous game",
+                message="The previous game cannot be resumed: {}".format(e),
+            )
+            return
+
+        self.game.chess_board = saved.game.chess_board
+        self.game.redo_stack = saved.game.redo_stack
+        self.journal.start(clocks=saved.clocks)
+        self.selected_position = None
         self.refresh()
-        self.counter_start()
+        self.counter_start(resumed_time(saved))
+        self.master.charge_taken_pieces_to_str()
 
     def restart(self):
         """
-        Exactly the same principle as the load_game function.
-        We don't create a new window, but rather a backup of a starting equipment.
+        Starts a new game in the same window. The save of the previous game is kept until the first move of the
+        new game.
         """
-        with open("NewGameSave", "rb") as f:
-            self.game.chess_board.pieces_dictionary = pickle.load(f)
-        self.game.chess_board.pieces_prises = []
+        self.game.chess_board = self.game.chess_board.__class__()
+        self.game.redo_stack = []
+        self.journal.close()
+        self.selected_position = None
         self.moves_done = []
         self.refresh()
         self.counter_start()
+        self.master.charge_taken_pieces_to_str()
 
     def moves_done(self):
         """
@@ -271,6 +383,22 @@ class CanvasChessboard(Canvas):
         phrase.pack()
         root.mainloop()
 
+    def export_pgn(self):
+        """
+        Writes the moves of the game in a PGN file chosen by the user, which can be opened by other chess programs
+        (or read again with the pgn module).
+        """
+        path = filedialog.asksaveasfilename(
+            title="Export the game", defaultextension=".pgn", filetypes=[("PGN files", "*.pgn")]
+        )
+        if not path:
+            return
+
+        try:
+            write_games(path, [self.game])
+        except OSError as e:
+            messagebox.showinfo(title="Export the game", message="The game cannot be exported: {}".format(e))
+
     def sms(self):
         """
         This dialog box will be called when the window is created.
@@ -290,28 +418,60 @@ class CanvasChessboard(Canvas):
         else:
             self.theme = 0
 
-    def counter_start(self):
-        # Reset the counter to its initial value
+    def counter_start(self, seconds=None):
+        # Reset the counter to its initial value, or to the time left of a resumed game
         global game_time
-        game_time = start_time
+        game_time = start_time if seconds is None else seconds
 
 
 # limit time to play
 start_time = 20
 game_time = start_time
 
+# The file where the game is saved.
+SAVE_FILE = "Save.pcs"
+
+# Maximum thinking time of the computer, in seconds.
+computer_time = 3
+
+# The opening book of the computer, built with: python -m pychecs2.echecs.book build games.pgn
+BOOK_FILE = "book.bin"
+
+# The endgame tables of the computer, generated with: python -m pychecs2.echecs.tablebase generate KQvK KRvK
+TABLEBASE_DIRECTORY = "tablebases"
+
+
+def resumed_time(saved):
+    """
+    Returns the time left to the player who has to play in a loaded game: the time it had left when it played its
+    last move (the clocks of the save alternate between the players), within the time allowed per move of the save.
+    The full time is given if the save does not know it.
+    """
+    allowed = saved.move_clock or start_time
+    if len(saved.clocks) < 2 or saved.clocks[-2] is None:
+        return allowed
+    return max(1, min(saved.clocks[-2], allowed))
+
 
 class Window(Tk):
     position1 = ""
     position2 = ""
 
-    def __init__(self):
+    def __init__(self, board_class=Chessboard, computer_color=None):
         super().__init__()
 
         # Name of the window.
         self.title("Chess Board")
 
-        self.game = Game()
+        # Without a book, the computer searches all its moves.
+        try:
+            book = OpeningBook(BOOK_FILE)
+        except OSError:
+            book = None
+
+        # The class of chessboard (Chessboard or BitboardChessboard) and the color played by the computer
+        # (None for two human players) are chosen when creating the window.
+        self.game = Game(board_class, computer_color, book, Tablebases(TABLEBASE_DIRECTORY))
 
         # Tip for the automatic resizing of the window elements.
         self.grid_columnconfigure(0, weight=1)
@@ -340,7 +500,6 @@ class Window(Tk):
         self.message_timer.grid()
         self.message_timer["foreground"] = "red"
         self.counter()
-        self.boxes()
         self.msg_taken_pieces = Label(self)
         self.msg_taken_pieces.grid()
         self.msg_taken_pieces["foreground"] = "red"
@@ -368,13 +527,11 @@ class Window(Tk):
         )
         self.c_theme.grid(row=4, column=1, padx=10, pady=10)
 
-    def boxes(self):
-        # Creation of all possible positions to use it in the function
-        # box_destination()
-        inverse_row_numbers = self.canvas_board.row_numbers[::-1]
-        for i in self.canvas_board.col_letters:
-            for j in inverse_row_numbers:
-                self.canvas_board.boxes_list.append(i + j)
+        self.undo_button = Button(self, text="Undo", command=self.undo)
+        self.undo_button.grid(row=5, column=1, padx=10, pady=10)
+
+        # If the computer plays white, it makes the first move once the window is displayed.
+        self.after(50, self.computer_move)
 
     def counter(self):
         """
@@ -402,24 +559,22 @@ class Window(Tk):
 
     def charge_taken_pieces_to_str(self):
         """
-        Update of the labels pieces eaten.
+        Update of the labels pieces eaten, with the material of each player, in pawns.
         (We have added the label of the active player)
         """
-        self.msg_taken_pieces["text"] = self.game.chess_board.taken_pieces
+        material = self.game.chess_board.material
+        self.msg_taken_pieces["text"] = "{}\nMaterial: white {:g}, black {:g}".format(
+            self.game.chess_board.taken_pieces, material['white'] / 100, material['black'] / 100)
         self.msg_active_player["text"] = (
             "It's player  " + self.game.active_player.upper() + " turn"
         )
 
     def dest_box(self, source):
         """
-        Using the list of all the positions to pass these positions in a for loop
-        and in the function of the chess class: is_move_valid(). If the move returns
-        True, we add it to a list that we browse to draw the boxes.
+        The chessboard generates the positions where the selected piece can move (generate_moves()),
+        and we browse them to draw the boxes.
         """
-        possible_positions_list = []
-        for i in self.canvas_board.boxes_list:
-            if self.game.chess_board.is_move_valid(source, i) is True:
-                possible_positions_list.append(i)
+        possible_positions_list = self.game.chess_board.generate_moves(source)
         for j in possible_positions_list:
             row = 8 - (int(j[1]))
             col = int(ord(j[0]) - 97)
@@ -453,7 +608,118 @@ class Window(Tk):
             tags="indications",
         )
 
+    def after_move(self, source, target):
+        """
+        Updates the window after a move (of a player or of the computer).
+        """
+        # Creation of the list of the movements performed if a move has taken place (to be displayed from
+        # the Information menu
+        piece = self.game.chess_board.pieces_dictionary[target]
+        self.canvas_board.moves_done += "{} : {} at the position {}.\n".format(
+            piece, source, target
+        )
+
+        # The move is added to the save. The save of the previous game is kept until the first move of a new game:
+        # it is then replaced by the position before this move, so that this move is recorded like the next ones.
+        journal = self.canvas_board.journal
+        if not journal.is_started():
+            before = self.game.chess_board.copy()
+            before.pop()
+            journal.start(before)
+        journal.record_move((source, target), game_time)
+
+        # Since a move has been made, the counter is reset to zero (and then the label is updated).
+        self.canvas_board.counter_start()
+        self.charge_taken_pieces_to_str()
+
+        """
+        The following section (followed by the except) allows you to update the labels according to
+        of the events that took place. 
+        A message is displayed if the function game_over() returns True, then the program 
+        ends. 
+        """
+        self.canvas_board.selected_position = None
+        self.canvas_board.refresh()
+        self.info["foreground"] = "black"
+        self.info["text"] = "The piece has been moved"
+        if self.game.chess_board.is_in_check(self.game.active_player):
+            self.info["foreground"] = "red"
+            self.info["text"] = "Check!"
+        if self.game.game_over():
+            self.message_timer.destroy()
+            self.info["foreground"] = "black"
+            if self.game.is_stalemate():
+                self.info["text"] = "Game Over, stalemate: the game is a draw"
+            else:
+                self.info["text"] = (
+                    "Game Over, the winner is the "
+                    + self.game.determine_winner()
+                    + " player"
+                )
+            messagebox.showinfo(
+                title="Checkmate!",
+                message="Press OK for more details!",
+            )
+            self.canvas_board.destroy()
+
+    def undo(self):
+        """
+        Undoes the last move. Against the computer, its last move is undone too, so that the player can play
+        again.
+        """
+        if not self.canvas_board.winfo_exists() or self.game.undo() is None:
+            return
+        self.record_undo()
+
+        if self.game.is_computer_turn() and self.game.can_undo():
+            self.game.undo()
+            self.record_undo()
+
+        self.canvas_board.selected_position = None
+        self.canvas_board.counter_start()
+        self.charge_taken_pieces_to_str()
+        self.canvas_board.refresh()
+        self.info["foreground"] = "black"
+        self.info["text"] = "The move has been undone"
+
+        # If the computer played the first move, it plays again.
+        self.after(50, self.computer_move)
+
+    def record_undo(self):
+        # The undone move is removed from the save, if the game is being saved.
+        if self.canvas_board.journal.is_started():
+            self.canvas_board.journal.record_undo()
+
+    def set_computer_color(self, color):
+        """
+        Chooses the color played by the computer (None for two human players). If it is the turn of the
+        computer, it plays immediately.
+        """
+        self.game.computer_color = color
+        self.computer_move()
+
+    def computer_move(self):
+        """
+        Makes the computer play, if it is its turn. Its thinking time never exceeds the time left on the
+        clock of the move (game_time), so the move is always played before the end of the counter.
+        """
+        if not self.canvas_board.winfo_exists() or not self.game.is_computer_turn() or self.game.game_over():
+            return
+
+        self.info["foreground"] = "black"
+        self.info["text"] = "The computer is thinking..."
+        self.update_idletasks()
+        move = self.game.play_computer_move(
+            max_time=max(0.1, min(computer_time, game_time - 1))
+        )
+        if move is not None:
+            self.after_move(*move)
+
     def select(self, event):
+        # The clicks are ignored while the computer is thinking.
+        if self.game.is_computer_turn():
+            return
+
         # The row/column number is found by dividing the y/x positions by the number of pixels per box
         row = event.y // self.canvas_board.n_pixels_per_box
         col = event.x // self.canvas_board.n_pixels_per_box
@@ -471,42 +737,13 @@ class Window(Tk):
                 self.dest_box(self.canvas_board.selected_position)
             else:
 
-                self.game.move(self.canvas_board.selected_position, position)
-
-                # Creation of the list of the movements performed if a move has taken place (to be displayed from
-                # the Information menu
-                piece = self.game.chess_board.pieces_dictionary[position]
-                self.canvas_board.moves_done += "{} : {} at the position {}.\n".format(
-                    piece, self.canvas_board.selected_position, position
-                )
+                source = self.canvas_board.selected_position
+                self.game.move(source, position)
+                self.after_move(source, position)
 
-                # Since a move has been made, the counter is reset to zero (and then the label is updated).
-                self.canvas_board.counter_start()
-                self.charge_taken_pieces_to_str()
-
-                """
-                The following section (followed by the except) allows you to update the labels according to
-                of the events that took place. 
-                A message is displayed if the function game_over() returns True, then the program 
-                ends. 
-                """
-                self.canvas_board.selected_position = None
-                self.canvas_board.refresh()
-                self.info["foreground"] = "black"
-                self.info["text"] = "The piece has been moved"
-                if self.game.game_over():
-                    self.message_timer.destroy()
-                    self.info["foreground"] = "black"
-                    self.info["text"] = (
-                        "Game Over, the winner is the"
-                        + self.game.determine_winner()
-                        + "player"
-                    )
-                    messagebox.showinfo(
-                        title="Checkmate!",
-                        message="Press OK for more details!",
-                    )
-                    self.canvas_board.destroy()
+                # If the computer plays the next move, it is searched once the chessboard has been redrawn.
+                if self.game.is_computer_turn():
+                    self.after(50, self.computer_move)
 
         except (NoPieceInPosition, WrongColorException, MoveException) as e:
             self.info["foreground"] = "red"
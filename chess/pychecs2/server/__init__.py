@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""
+The server package hosts games without the graphical interface: many games at the same time in one process, played
+by clients connected through the network (see the server and client modules).
+
+"""
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the broadcast of a hosted game to its spectators. A popular game can be watched by thousands of
+clients, so nothing is encoded for each spectator: each move is encoded once, as a small message (the move and the
+clocks, see the server module), and the same bytes are queued for every spectator.
+
+Each spectator has its own queue, written to its connection by its own task. The queue is bounded: a spectator
+which does not read fast enough fills it, and is dropped instead of making the server keep an unbounded backlog (it
+can watch the game again). A spectator arriving during the game receives a snapshot of the position, then the
+moves played since the snapshot (catch-up), then the next moves. The snapshot is shared too: a new one is only
+encoded when the last one is more than SNAPSHOT_INTERVAL moves old, so that the catch-up stays short.
+
+"""
+import asyncio
+
+# The number of messages waiting for a spectator before it is dropped.
+QUEUE_SIZE = 64
+
+# The number of half-moves after which a new snapshot is encoded for the next spectator.
+SNAPSHOT_INTERVAL = 16
+
+
+class Subscriber:
+    """
+    A spectator of a game: the messages waiting to be written to its connection, and the task writing them.
+
+    Attributes:
+        connection (Connection): The connection of the spectator (see the server module).
+        queue (Queue): The messages (bytes) waiting to be written, None ending the task.
+        task (Task): The task writing the messages.
+
+    Args:
+        connection (Connection): The connection of the spectator.
+        queue_size (int): The number of messages which can wait.
+
+    """
+    def __init__(self, connection, queue_size=QUEUE_SIZE):
+        self.connection = connection
+        self.queue = asyncio.Queue(queue_size)
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        writer = self.connection.writer
+        try:
+            while True:
+                data = await self.queue.get()
+                if data is None or writer.is_closing():
+                    return
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+
+    def push(self, data):
+        """
+        Queues a message.
+
+        Returns:
+            bool: False if the queue is full, and True otherwise.
+
+        """
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def close(self):
+        """
+        Ends the task once the queued messages are written, or at once if the queue is full.
+
+        """
+        if not self.push(None):
+            self.task.cancel()
+
+
+class Broadcast:
+    """
+    The broadcast of a game to its spectators.
+
+    Attributes:
+        deltas (list): The encoded message of each move, the move of the half-move n at the index n - 1.
+        snapshot (tuple): The last snapshot, as a (number of half-moves, encoded message) tuple, or None.
+        subscribers (dict): The Subscriber of each spectator, by connection.
+        dropped (int): The number of spectators dropped for being too slow.
+
+    Args:
+        encode_snapshot (function): Encodes a snapshot of the current position of the game, given its number of
+            half-moves.
+        queue_size (int): The number of messages which can wait for each spectator.
+        snapshot_interval (int): The number of half-moves after which a new snapshot is encoded.
+
+    """
+    def __init__(self, encode_snapshot, queue_size=QUEUE_SIZE, snapshot_interval=SNAPSHOT_INTERVAL):
+        self.encode_snapshot = encode_snapshot
+        self.queue_size = queue_size
+        self.snapshot_interval = snapshot_interval
+        self.deltas = []
+        self.snapshot = None
+        self.subscribers = {}
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.subscribers)
+
+    def subscribe(self, connection):
+        """
+        Adds a spectator, which first receives the last snapshot and the moves played since.
+
+        Args:
+            connection (Connection): The connection of the spectator.
+
+        """
+        if connection in self.subscribers:
+            return
+
+        plies = len(self.deltas)
+        if self.snapshot is None or plies - self.snapshot[0] >= self.snapshot_interval:
+            self.snapshot = (plies, self.encode_snapshot(plies))
+        snapshot_plies, snapshot = self.snapshot
+
+        subscriber = Subscriber(connection, self.queue_size)
+        subscriber.push(b''.join([snapshot] + self.deltas[snapshot_plies:]))
+        self.subscribers[connection] = subscriber
+
+    def unsubscribe(self, connection):
+        subscriber = self.subscribers.pop(connection, None)
+        if subscriber is not None:
+            subscriber.close()
+
+    def publish(self, data, move=False):
+        """
+        Queues a message for all the spectators. The spectators whose queue is full are dropped.
+
+        Args:
+            data (bytes): The encoded message.
+            move (bool): True if the message is a move, kept for the catch-up of the next spectators.
+
+        Returns:
+            list: The connections of the dropped spectators.
+
+        """
+        if move:
+            self.deltas.append(data)
+
+        dropped = [connection for connection, subscriber in self.subscribers.items() if not subscriber.push(data)]
+        for connection in dropped:
+            self.subscribers.pop(connection).task.cancel()
+        self.dropped += len(dropped)
+        return dropped
+
+    def close(self):
+        """
+        Ends the broadcast, once the queued messages are written.
+
+        Returns:
+            list: The connections of the spectators.
+
+        """
+        connections = list(self.subscribers)
+        for subscriber in self.subscribers.values():
+            subscriber.close()
+        self.subscribers = {}
+        return connections
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a client of the game server (see the server module), used by the tests and by the programs
+playing on a server. The messages pushed by the server (moves of the opponent, end of the game...) are read with
+receive() or wait_for().
+
+"""
+import asyncio
+
+from pychecs2.server.server import DEFAULT_HOST, DEFAULT_PORT, DEFAULT_TIME, DEFAULT_INCREMENT, MAX_MESSAGE_SIZE, \
+    ProtocolError, encode_message, decode_message
+
+# The time to wait for a message of the server, in seconds.
+RECEIVE_TIMEOUT = 10.0
+
+
+class GameClient:
+    """
+    A connection to a game server.
+
+    Attributes:
+        pending (list): The messages received while waiting for a message of another type, read first by receive().
+
+    Args:
+        reader (StreamReader): The stream from the server.
+        writer (StreamWriter): The stream to the server.
+
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = []
+
+    @classmethod
+    async def connect(cls, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        reader, writer = await asyncio.open_connection(host, port, limit=MAX_MESSAGE_SIZE)
+        return cls(reader, writer)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exception):
+        await self.close()
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    async def send(self, message):
+        self.writer.write(encode_message(message))
+        await self.writer.drain()
+
+    async def receive(self, timeout=RECEIVE_TIMEOUT):
+        """
+        Reads the next message of the server.
+
+        Args:
+            timeout (float): The time to wait, in seconds, or None to wait forever.
+
+        Returns:
+            dict: The message.
+
+        Raises:
+            ConnectionError: If the server closed the connection.
+            TimeoutError: If no message arrived in time.
+
+        """
+        if self.pending:
+            return self.pending.pop(0)
+
+        line = await asyncio.wait_for(self.reader.readline(), timeout)
+        if not line:
+            raise ConnectionError("The server closed the connection")
+        return decode_message(line)
+
+    async def wait_for(self, message_type, timeout=RECEIVE_TIMEOUT, **fields):
+        """
+        Reads the messages of the server until one of a type, or an error. The other messages are kept for
+        receive().
+
+        Args:
+            message_type (str): The type of the message, such as 'move' or 'end'.
+            timeout (float): The time to wait for each message, in seconds.
+            fields: The values of the other fields of the message, such as game='1'.
+
+        Returns:
+            dict: The message.
+
+        Raises:
+            ProtocolError: If the server answered with an error.
+
+        """
+        skipped = []
+        try:
+            while True:
+                message = await self.receive(timeout)
+                if message['type'] == message_type and all(message.get(name) == value
+                                                            for name, value in fields.items()):
+                    return message
+                if message['type'] == 'error':
+                    raise ProtocolError(message.get('message'))
+                skipped.append(message)
+        finally:
+            self.pending[:0] = skipped
+
+    async def new_game(self, time=DEFAULT_TIME, increment=DEFAULT_INCREMENT):
+        """
+        Creates a game, played as white.
+
+        Returns:
+            str: The number of the game.
+
+        """
+        await self.send({'type': 'new', 'time': time, 'increment': increment})
+        return (await self.wait_for('created'))['game']
+
+    async def join_game(self, game):
+        """
+        Joins a game as black, and waits for its start.
+
+        Returns:
+            dict: The 'start' message, with the position and the clocks.
+
+        """
+        await self.send({'type': 'join', 'game': game})
+        return await self.wait_for('start', game=game)
+
+    async def move(self, game, source, target):
+        """
+        Plays a move, and waits for the server to push it.
+
+        Returns:
+            dict: The 'move' message, with the active player and the clocks.
+
+        """
+        await self.send({'type': 'move', 'game': game, 'source': source, 'target': target})
+        return await self.wait_for('move', game=game, source=source, target=target)
+
+    async def resign(self, game):
+        await self.send({'type': 'resign', 'game': game})
+        return await self.wait_for('end', game=game)
+
+    async def state(self, game):
+        await self.send({'type': 'state', 'game': game})
+        return await self.wait_for('state', game=game)
+
+    async def watch(self, game):
+        """
+        Watches a game as a spectator.
+
+        Returns:
+            dict: The 'snapshot' message, with the position, the clocks and the number of half-moves played. The
+                moves played since the snapshot are the next messages.
+
+        """
+        await self.send({'type': 'watch', 'game': game})
+        return await self.wait_for('snapshot', game=game)
+
+    async def unwatch(self, game):
+        await self.send({'type': 'unwatch', 'game': game})
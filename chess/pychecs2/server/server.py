@@ -0,0 +1,569 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the game server: an asyncio TCP service hosting many games at the same time, each one a Game
+of the echecs package played by two clients. A single thread serves all the connections, and a game only uses
+memory and time when one of its players sends a move, so that thousands of games can be hosted by one process.
+
+The messages are JSON objects, one per line (UTF-8), each with a 'type'. A client sends:
+
+    {"type": "new", "time": 300, "increment": 2}          creates a game and plays white in it
+    {"type": "join", "game": "1"}                         plays black in a game waiting for its opponent
+    {"type": "move", "game": "1", "source": "e2", "target": "e4"}
+    {"type": "resign", "game": "1"}
+    {"type": "state", "game": "1"}                        asks for the position and the clocks
+    {"type": "watch", "game": "1"}                        watches a game as a spectator
+    {"type": "unwatch", "game": "1"}
+
+The server answers "created" (with the number of the game) and "error" (with a message) to the client which sent
+the request, and pushes to both players: "start" when the second player joins, "move" after each move (with the
+active player and the clocks), and "end" when the game is over (by checkmate, stalemate, time, resignation or
+abandon), with its result in PGN notation ('1-0', '0-1' or '1/2-1/2'). The clocks are in seconds: the clock of the
+active player runs from the end of the previous move, and a player whose time is exhausted loses the game.
+
+A spectator receives a "snapshot" of the game (as the answer to "state", with the number of half-moves played, ply),
+the "move" messages played since the snapshot, then the same messages as the players (see the broadcast module). A
+spectator which does not read its messages fast enough receives "dropped", and no longer receives the game.
+
+The server is run from the folder containing the pychecs2 package, with:
+
+    python -m pychecs2.server.server --host 127.0.0.1 --port 8765
+
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+
+from pychecs2.echecs.chess_board import Chessboard, MoveException, other_color
+from pychecs2.echecs.game import Game, NoPieceInPosition, WrongColorException
+from pychecs2.echecs.perft import BOARD_CLASSES
+from pychecs2.echecs.pgn import game_result
+from pychecs2.server.broadcast import Broadcast
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# The time of each player, and the time added after each of its moves, in seconds.
+DEFAULT_TIME = 300.0
+DEFAULT_INCREMENT = 0.0
+
+# The longest message accepted, in bytes.
+MAX_MESSAGE_SIZE = 4096
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_message(message):
+    """
+    Encodes a message as a line of JSON.
+
+    Args:
+        message (dict): The message.
+
+    Returns:
+        bytes: The line, ending with a newline.
+
+    """
+    return (json.dumps(message, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def decode_message(line):
+    """
+    Decodes a line of JSON received from a client.
+
+    Args:
+        line (bytes): The line.
+
+    Returns:
+        dict: The message, which has a 'type'.
+
+    Raises:
+        ProtocolError: If the line is not a JSON object with a 'type'.
+
+    """
+    try:
+        message = json.loads(line)
+    except (UnicodeDecodeError, ValueError):
+        raise ProtocolError("Invalid JSON message")
+    if not isinstance(message, dict) or not isinstance(message.get('type'), str):
+        raise ProtocolError("A message must be an object with a type")
+    return message
+
+
+class Clock:
+    """
+    The clocks of the two players of a game. Only the clock of the active player runs; the time is read from a
+    monotonic clock given to each method (now), such as the time of the event loop.
+
+    Attributes:
+        remaining (dict): The time left to each player ('white' and 'black') when its clock was last stopped.
+        increment (float): The time added to a player after each of its moves.
+        running (str): The color of the player whose clock runs, or None if the clocks are stopped.
+        started (float): The time at which the running clock was started.
+
+    Args:
+        time (float): The initial time of each player, in seconds.
+        increment (float): The time added after each move, in seconds.
+
+    """
+    def __init__(self, time=DEFAULT_TIME, increment=DEFAULT_INCREMENT):
+        self.remaining = {'white': float(time), 'black': float(time)}
+        self.increment = float(increment)
+        self.running = None
+        self.started = 0.0
+
+    def start(self, color, now):
+        """
+        Starts the clock of a player.
+
+        """
+        self.running = color
+        self.started = now
+
+    def stop(self, now):
+        """
+        Stops the running clock, if any, and charges the time elapsed to its player.
+
+        """
+        if self.running is not None:
+            self.remaining[self.running] -= now - self.started
+            self.running = None
+
+    def time_left(self, color, now):
+        """
+        Returns the time left to a player, which is negative if it is exhausted.
+
+        """
+        if color == self.running:
+            return self.remaining[color] - (now - self.started)
+        return self.remaining[color]
+
+    def press(self, now):
+        """
+        Ends the turn of the player whose clock runs: its time is charged, the increment is added, and the clock of
+        its opponent starts.
+
+        """
+        color = self.running
+        self.stop(now)
+        self.remaining[color] += self.increment
+        self.start(other_color(color), now)
+
+    def state(self, now):
+        """
+        Returns the time left to each player, rounded to the millisecond, for the messages sent to the clients.
+
+        """
+        return {color: round(max(self.time_left(color, now), 0.0), 3) for color in ('white', 'black')}
+
+
+class HostedGame:
+    """
+    A game hosted by the server.
+
+    Attributes:
+        number (str): The number of the game, which identifies it in the messages.
+        game (Game): The game.
+        clock (Clock): The clocks of the players.
+        players (dict): The Connection of each player ('white' and 'black'), None until the player joins.
+        result (str): The result of the game in PGN notation, or None while it is in progress.
+        reason (str): Why the game is over, or None while it is in progress.
+        flag_timer (TimerHandle): The timer which ends the game when the time of the active player is exhausted.
+        broadcast (Broadcast): The broadcast of the game to its spectators.
+
+    """
+    def __init__(self, number, game, clock):
+        self.number = number
+        self.game = game
+        self.clock = clock
+        self.players = {'white': None, 'black': None}
+        self.result = None
+        self.reason = None
+        self.flag_timer = None
+        self.broadcast = Broadcast(self.encode_snapshot)
+
+    def encode_snapshot(self, plies):
+        now = asyncio.get_running_loop().time()
+        return encode_message(dict(self.state(now), type='snapshot', ply=plies))
+
+    def color_of(self, connection):
+        """
+        Returns the color played by a connection in this game, or None if it does not play in it.
+
+        """
+        for color, player in self.players.items():
+            if player is connection:
+                return color
+        return None
+
+    def is_started(self):
+        return self.players['black'] is not None
+
+    def is_over(self):
+        return self.result is not None
+
+    def state(self, now):
+        return {'game': self.number, 'fen': self.game.to_fen(), 'active_player': self.game.active_player,
+                'clocks': self.clock.state(now), 'result': self.result, 'reason': self.reason}
+
+
+class Connection:
+    """
+    A client connected to the server.
+
+    Attributes:
+        writer (StreamWriter): The stream to the client.
+        games (dict): The HostedGame instances in which the client plays, by number.
+        watched (dict): The HostedGame instances which the client watches, by number.
+
+    """
+    def __init__(self, writer):
+        self.writer = writer
+        self.games = {}
+        self.watched = {}
+
+    def send(self, message):
+        """
+        Sends a message to the client. The message is buffered by the stream, so that a game never waits for the
+        network; the handler of the connection waits for the buffer to drain between two requests.
+
+        """
+        self.send_data(encode_message(message))
+
+    def send_data(self, data):
+        """
+        Sends a message already encoded, such as a message sent to several clients.
+
+        """
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+
+class GameServer:
+    """
+    The server, hosting the games of its connected clients.
+
+    Attributes:
+        games (dict): The HostedGame instances in progress or waiting for their second player, by number.
+        board_class (type): The class of the chessboards of the games.
+
+    Args:
+        board_class (type): The class of the chessboards of the games, Chessboard (the default) or a class offering
+            the same methods, such as BitboardChessboard.
+
+    """
+    def __init__(self, board_class=Chessboard):
+        self.games = {}
+        self.board_class = board_class
+        self.numbers = itertools.count(1)
+        self.handlers = {'new': self.new_game, 'join': self.join_game, 'move': self.play_move,
+                         'resign': self.resign, 'state': self.send_state, 'watch': self.watch,
+                         'unwatch': self.unwatch}
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """
+        Starts listening for clients.
+
+        Args:
+            host (str): The address to listen on.
+            port (int): The port to listen on, or 0 for any free port.
+
+        Returns:
+            Server: The asyncio server, whose sockets give the port (server.sockets[0].getsockname()[1]).
+
+        """
+        return await asyncio.start_server(self.handle_connection, host, port, limit=MAX_MESSAGE_SIZE)
+
+    def now(self):
+        return asyncio.get_running_loop().time()
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves a client until it disconnects: each line received is a request.
+
+        """
+        connection = Connection(writer)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    connection.send({'type': 'error', 'message': "Message too long"})
+                    break
+                if not line:
+                    break
+
+                try:
+                    message = decode_message(line)
+                    handler = self.handlers.get(message['type'])
+                    if handler is None:
+                        raise ProtocolError("Unknown message type: {}".format(message['type']))
+                    handler(connection, message)
+                except ProtocolError as error:
+                    connection.send({'type': 'error', 'message': str(error)})
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.disconnect(connection)
+            writer.close()
+
+    def disconnect(self, connection):
+        """
+        Ends the games of a client which disconnected: a game waiting for its opponent is removed, and a game in
+        progress is lost by the client.
+
+        """
+        for hosted in list(connection.watched.values()):
+            self.unwatch(connection, {'game': hosted.number})
+        for hosted in list(connection.games.values()):
+            if not hosted.is_started():
+                self.remove_game(hosted)
+            else:
+                color = hosted.color_of(connection)
+                self.finish(hosted, other_color(color), 'abandon')
+
+    def find_game(self, connection, message, player=True):
+        """
+        Returns the game of a request.
+
+        Args:
+            connection (Connection): The client which sent the request.
+            message (dict): The request, whose 'game' is the number of the game.
+            player (bool): True if the client must be a player of the game.
+
+        Returns:
+            HostedGame: The game.
+
+        Raises:
+            ProtocolError: If the game does not exist, or if the client does not play in it.
+
+        """
+        number = self.game_number(message)
+        hosted = connection.games.get(number) if player else self.games.get(number)
+        if hosted is None:
+            raise ProtocolError("Unknown game: {}".format(number))
+        return hosted
+
+    @staticmethod
+    def game_number(message):
+        """
+        Returns the number of the game of a request. The number is used as a key of dictionaries, so anything but a
+        string (a list or an object, which cannot be hashed) is refused.
+
+        Args:
+            message (dict): The request.
+
+        Returns:
+            str: The number of the game.
+
+        Raises:
+            ProtocolError: If the request has no game number.
+
+        """
+        number = message.get('game')
+        if not isinstance(number, str):
+            raise ProtocolError("A request needs the number of a game")
+        return number
+
+    @staticmethod
+    def time_control(message, name, default):
+        """
+        Returns a time of the time control of a request. Only JSON numbers are accepted, and a huge integer, which
+        cannot be converted to a float, is refused as an infinite one.
+
+        Args:
+            message (dict): The request.
+            name (str): The name of the time, 'time' or 'increment'.
+            default (float): The time if the request does not give it.
+
+        Returns:
+            float: The time, in seconds.
+
+        Raises:
+            ProtocolError: If the time is not a finite number of seconds, at least 0.
+
+        """
+        value = message.get(name, default)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ProtocolError("Invalid time control")
+        try:
+            value = float(value)
+        except OverflowError:
+            raise ProtocolError("Invalid time control")
+        if not math.isfinite(value) or value < 0:
+            raise ProtocolError("Invalid time control")
+        return value
+
+    def new_game(self, connection, message):
+        time = self.time_control(message, 'time', DEFAULT_TIME)
+        increment = self.time_control(message, 'increment', DEFAULT_INCREMENT)
+        if not time > 0:
+            raise ProtocolError("Invalid time control")
+        clock = Clock(time, increment)
+
+        hosted = HostedGame(str(next(self.numbers)), Game(self.board_class), clock)
+        hosted.players['white'] = connection
+        self.games[hosted.number] = hosted
+        connection.games[hosted.number] = hosted
+        connection.send({'type': 'created', 'game': hosted.number, 'color': 'white'})
+
+    def join_game(self, connection, message):
+        hosted = self.find_game(connection, message, player=False)
+        if hosted.is_started():
+            raise ProtocolError("The game already has two players")
+        if hosted.players['white'] is connection:
+            raise ProtocolError("A client cannot play against itself")
+
+        hosted.players['black'] = connection
+        connection.games[hosted.number] = hosted
+        now = self.now()
+        hosted.clock.start('white', now)
+        self.schedule_flag(hosted)
+        self.notify(hosted, dict(hosted.state(now), type='start'))
+
+    def play_move(self, connection, message):
+        hosted = self.find_game(connection, message)
+        if not hosted.is_started():
+            raise ProtocolError("The game has not started")
+        if hosted.color_of(connection) != hosted.game.active_player:
+            raise ProtocolError("It is not your turn")
+
+        source, target = message.get('source'), message.get('target')
+        if not isinstance(source, str) or not isinstance(target, str):
+            raise ProtocolError("A move needs a source and a target position")
+
+        # A move arriving after the time of the player is exhausted (before the timer fired) loses the game.
+        now = self.now()
+        if hosted.clock.time_left(hosted.game.active_player, now) <= 0:
+            self.flag(hosted)
+            return
+
+        try:
+            hosted.game.move(source, target)
+        except (NoPieceInPosition, WrongColorException, MoveException) as error:
+            raise ProtocolError(str(error))
+
+        hosted.clock.press(now)
+        self.notify(hosted, {'type': 'move', 'game': hosted.number, 'ply': len(hosted.game.chess_board.undo_stack),
+                             'source': source, 'target': target, 'active_player': hosted.game.active_player,
+                             'clocks': hosted.clock.state(now)})
+        if hosted.game.game_over():
+            self.finish(hosted, None, 'stalemate' if hosted.game.is_stalemate() else 'checkmate')
+        else:
+            self.schedule_flag(hosted)
+
+    def resign(self, connection, message):
+        hosted = self.find_game(connection, message)
+        if not hosted.is_started():
+            self.notify(hosted, {'type': 'end', 'game': hosted.number, 'result': None, 'reason': 'cancelled'})
+            self.remove_game(hosted)
+            return
+        self.finish(hosted, other_color(hosted.color_of(connection)), 'resignation')
+
+    def send_state(self, connection, message):
+        hosted = self.find_game(connection, message, player=False)
+        connection.send(dict(hosted.state(self.now()), type='state'))
+
+    def watch(self, connection, message):
+        hosted = self.find_game(connection, message, player=False)
+        hosted.broadcast.subscribe(connection)
+        connection.watched[hosted.number] = hosted
+
+    def unwatch(self, connection, message):
+        hosted = connection.watched.pop(self.game_number(message), None)
+        if hosted is not None:
+            hosted.broadcast.unsubscribe(connection)
+
+    def schedule_flag(self, hosted):
+        """
+        Schedules the end of a game for the moment when the time of its active player is exhausted.
+
+        """
+        if hosted.flag_timer is not None:
+            hosted.flag_timer.cancel()
+        delay = hosted.clock.time_left(hosted.clock.running, self.now())
+        hosted.flag_timer = asyncio.get_running_loop().call_later(max(delay, 0.0), self.flag, hosted)
+
+    def flag(self, hosted):
+        """
+        Ends a game lost on time by its active player, unless it was woken up early.
+
+        """
+        if hosted.is_over():
+            return
+        color = hosted.clock.running or hosted.game.active_player
+        if hosted.clock.time_left(color, self.now()) > 0:
+            self.schedule_flag(hosted)
+            return
+        self.finish(hosted, other_color(color), 'time')
+
+    def finish(self, hosted, winner, reason):
+        """
+        Ends a game and notifies its players and its spectators.
+
+        Args:
+            hosted (HostedGame): The game.
+            winner (str): The color of the winner, or None to take the result of the position (see game_result()).
+            reason (str): Why the game is over.
+
+        """
+        hosted.clock.stop(self.now())
+        hosted.result = {'white': '1-0', 'black': '0-1'}[winner] if winner else game_result(hosted.game)
+        hosted.reason = reason
+        self.notify(hosted, {'type': 'end', 'game': hosted.number, 'result': hosted.result, 'reason': reason})
+        self.remove_game(hosted)
+
+    def remove_game(self, hosted):
+        if hosted.flag_timer is not None:
+            hosted.flag_timer.cancel()
+            hosted.flag_timer = None
+        self.games.pop(hosted.number, None)
+        for player in hosted.players.values():
+            if player is not None:
+                player.games.pop(hosted.number, None)
+        for spectator in hosted.broadcast.close():
+            spectator.watched.pop(hosted.number, None)
+
+    def notify(self, hosted, message):
+        """
+        Pushes a message to the players and the spectators of a game. It is encoded once for all of them.
+
+        """
+        data = encode_message(message)
+        for player in hosted.players.values():
+            if player is not None:
+                player.send_data(data)
+
+        for spectator in hosted.broadcast.publish(data, move=message['type'] == 'move'):
+            spectator.watched.pop(hosted.number, None)
+            spectator.send({'type': 'dropped', 'game': hosted.number})
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, board_class=Chessboard):
+    server = await GameServer(board_class).start(host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Hosts games played by clients connected through the network.")
+    parser.add_argument('--host', default=DEFAULT_HOST, help="address to listen on (default: {})".format(DEFAULT_HOST))
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help="port to listen on (default: {})".format(DEFAULT_PORT))
+    parser.add_argument('--board', choices=sorted(BOARD_CLASSES), default='dict',
+                        help="chessboard implementation to use (default: dict)")
+    args = parser.parse_args(arguments)
+
+    try:
+        asyncio.run(serve(args.host, args.port, BOARD_CLASSES[args.board]))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())